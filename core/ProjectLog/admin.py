@@ -2,8 +2,16 @@
 Admin configuration for ProjectLog models
 """
 
+import json
+
 from django.contrib import admin
+from django.contrib.auth.models import User
 from django.contrib.contenttypes.admin import GenericTabularInline
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
+from core.pagination import KeysetPaginationAdminMixin
+from . import archive
 from .models import AuditLog
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
@@ -14,7 +22,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 @admin.register(AuditLog)
-class AuditLogAdmin(admin.ModelAdmin):
+class AuditLogAdmin(KeysetPaginationAdminMixin, admin.ModelAdmin):
     """
     Admin interface for AuditLog model
     """
@@ -76,8 +84,19 @@ class AuditLogAdmin(admin.ModelAdmin):
     # Date hierarchy for easy navigation
     date_hierarchy = 'created_at'
     
-    # Ordering
-    ordering = ('-created_at',)
+    # Ordering (keyset pagination: no OFFSET and no full COUNT on large tables)
+    ordering = ('-created_at', '-id')
+    keyset_ordering = ('-created_at', '-id')
+    
+    # Archive search (rows moved out by ProjectLog.archive)
+    archive_result_limit = 500
+
+    # Archive record keys behind each search field, per kind of source
+    ARCHIVE_FIELDS = {
+        'auditlog': {'date': 'created_at', 'user': 'user_id', 'action': 'action', 'object_id': 'object_id'},
+        'history': {'date': 'history_date', 'user': 'history_user_id', 'action': 'history_type', 'object_id': 'id'},
+    }
+    HISTORY_TYPES = {'create': '+', 'update': '~', 'delete': '-'}
     
     # Don't allow adding new audit logs through admin
     def has_add_permission(self, request):
@@ -218,6 +237,84 @@ class AuditLogAdmin(admin.ModelAdmin):
         return mark_safe(''.join(html))
     changed_data_display.short_description = _('Changes')
     
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('archive/', self.admin_site.admin_view(self.archive_view), name='ProjectLog_auditlog_archive'),
+        ]
+        return custom_urls + urls
+    
+    def archive_view(self, request):
+        """
+        Search one month of archived audit or history rows
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        
+        sources = archive.list_sources()
+        source = request.GET.get('source') or (archive.AUDIT_SOURCE if archive.AUDIT_SOURCE in sources else '')
+        if source not in sources:
+            source = sources[0] if sources else ''
+        months = archive.list_months(source) if source else []
+        month = request.GET.get('month')
+        if month not in months:
+            month = months[0] if months else ''
+        
+        kind = 'auditlog' if source == archive.AUDIT_SOURCE else 'history'
+        keys = self.ARCHIVE_FIELDS[kind]
+        params = {name: request.GET.get(name, '').strip() for name in ('user', 'action', 'object_id', 'q')}
+        
+        filters = {keys['object_id']: params['object_id']}
+        if params['action']:
+            filters[keys['action']] = (
+                self.HISTORY_TYPES.get(params['action'], params['action']) if kind == 'history' else params['action']
+            )
+        if params['user']:
+            user_id = params['user'] if params['user'].isdigit() else (
+                User.objects.filter(username=params['user']).values_list('pk', flat=True).first() or -1
+            )
+            filters[keys['user']] = user_id
+        
+        records, truncated = [], False
+        if source and month:
+            records, truncated = archive.search_archive(
+                source, month, filters=filters, text=params['q'], limit=self.archive_result_limit
+            )
+        
+        usernames = dict(
+            User.objects.filter(pk__in={r.get(keys['user']) for r in records} - {None}).values_list('pk', 'username')
+        )
+        rows = [
+            {
+                'date': record.get(keys['date']),
+                'user': usernames.get(record.get(keys['user']), record.get(keys['user']) or '-'),
+                'action': record.get(keys['action']),
+                'object_id': record.get(keys['object_id']),
+                'object_repr': record.get('object_repr', ''),
+                'data': json.dumps(
+                    record.get('changed_data') if kind == 'auditlog' else record,
+                    ensure_ascii=False, indent=2,
+                ),
+            }
+            for record in records
+        ]
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': _('Audit archive'),
+            'sources': sources,
+            'source': source,
+            'months': months,
+            'month': month,
+            'params': params,
+            'action_choices': AuditLog.ACTION_CHOICES,
+            'rows': rows,
+            'truncated': truncated,
+            'result_limit': self.archive_result_limit,
+        }
+        return TemplateResponse(request, 'admin/ProjectLog/auditlog/archive.html', context)
+    
     def get_queryset(self, request):
         """
         Optimize queryset for performance
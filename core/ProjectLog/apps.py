@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class ProjectlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ProjectLog'
-    
\ No newline at end of file
+
+    def ready(self):
+        from .signals import connect_audit_signals
+        connect_audit_signals()
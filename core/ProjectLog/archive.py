@@ -0,0 +1,290 @@
+"""
+Retention and archival of audit and history rows
+
+Rows older than the retention window are moved out of the hot tables into
+compressed monthly JSON-lines files and deleted in batches:
+
+    <AUDIT_ARCHIVE_ROOT>/<source>/<YYYY-MM>.jsonl.gz
+
+AUDIT_ARCHIVE_ROOT defaults to BASE_DIR/audit_archive and may not point into
+MEDIA_ROOT or STATIC_ROOT, which are served without permission checks.
+
+- source is 'auditlog' for ProjectLog.AuditLog and 'history.<app>.<model>'
+  for each simple_history historical table
+- each batch is appended as its own gzip member (gzip readers see one stream)
+  and fsynced before the same rows are deleted, so a crash can only repeat
+  rows in the archive (readers skip repeated ids), never lose them
+- retention: AUDIT_LOG_RETENTION_DAYS (default 180) for the audit log and
+  HISTORY_RETENTION_DAYS (default 365, None keeps history in the database)
+- run_archive() is the scheduler hook; the archive_audit_logs management
+  command calls it (e.g. nightly from cron)
+- search_archive() reads one month back for the admin archive view
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from uuid import UUID
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.private_files import ensure_private
+
+logger = logging.getLogger(__name__)
+
+AUDIT_SOURCE = 'auditlog'
+HISTORY_PREFIX = 'history.'
+SUFFIX = '.jsonl.gz'
+
+# A lock older than this is considered left over from a killed run
+LOCK_STALE_SECONDS = 6 * 60 * 60
+
+
+class ArchiveLocked(RuntimeError):
+    pass
+
+
+def archive_root():
+    """
+    Directory of the archive files (AUDIT_ARCHIVE_ROOT, default BASE_DIR/audit_archive)
+
+    The archive is read only through the admin archive view, so it must not
+    live under a directory served as files (MEDIA_ROOT / STATIC_ROOT).
+    """
+    root = getattr(settings, 'AUDIT_ARCHIVE_ROOT', None)
+    root = Path(root) if root else Path(settings.BASE_DIR) / 'audit_archive'
+    return ensure_private(root, 'AUDIT_ARCHIVE_ROOT')
+
+
+def _batch_size():
+    return getattr(settings, 'AUDIT_ARCHIVE_BATCH_SIZE', 1000)
+
+
+def audit_retention_days():
+    return getattr(settings, 'AUDIT_LOG_RETENTION_DAYS', 180)
+
+
+def history_retention_days():
+    return getattr(settings, 'HISTORY_RETENTION_DAYS', 365)
+
+
+def _json_default(value):
+    # Full precision for dates (DjangoJSONEncoder cuts to milliseconds)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# ---------- sources ----------
+
+def history_models():
+    """Historical models created by simple_history"""
+    return [
+        model for model in apps.get_models()
+        if hasattr(model, 'instance_type') and any(f.name == 'history_date' for f in model._meta.fields)
+    ]
+
+
+def source_for(model):
+    if model._meta.label == 'ProjectLog.AuditLog':
+        return AUDIT_SOURCE
+    return f"{HISTORY_PREFIX}{model._meta.app_label}.{model._meta.model_name}"
+
+
+def _sources():
+    """{source: (model, date field)} for every archivable table"""
+    sources = {AUDIT_SOURCE: (apps.get_model('ProjectLog', 'AuditLog'), 'created_at')}
+    for model in history_models():
+        sources[source_for(model)] = (model, 'history_date')
+    return sources
+
+
+def _pk_name(source):
+    model, _ = _sources()[source]
+    return model._meta.pk.attname
+
+
+# ---------- writing ----------
+
+def _month_of(value):
+    return value.strftime('%Y-%m')
+
+
+def _month_path(source, month):
+    return archive_root() / source / f"{month}{SUFFIX}"
+
+
+def _append(source, month, records):
+    path = _month_path(source, month)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as stream:
+            for record in records:
+                line = json.dumps(record, default=_json_default, ensure_ascii=False)
+                stream.write(line.encode('utf-8') + b'\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def archive_model(model, date_field, cutoff, batch_size=None, dry_run=False):
+    """
+    Move rows of model older than cutoff into the archive
+    Returns the number of rows archived (or that would be archived on dry run)
+    """
+    batch_size = batch_size or _batch_size()
+    source = source_for(model)
+    pk_name = model._meta.pk.attname
+    field_names = [field.attname for field in model._meta.concrete_fields]
+    queryset = model._base_manager.filter(**{f'{date_field}__lt': cutoff})
+
+    if dry_run:
+        return queryset.count()
+
+    archived = 0
+    while True:
+        rows = list(queryset.order_by(date_field, pk_name).values(*field_names)[:batch_size])
+        if not rows:
+            break
+
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(_month_of(row[date_field]), []).append(row)
+        for month, records in by_month.items():
+            _append(source, month, records)
+
+        with transaction.atomic(using=queryset.db):
+            model._base_manager.filter(pk__in=[row[pk_name] for row in rows]).delete()
+
+        archived += len(rows)
+        logger.debug(f"Archived {len(rows)} rows of {source}")
+
+    return archived
+
+
+@contextmanager
+def _run_lock():
+    root = archive_root()
+    root.mkdir(parents=True, exist_ok=True)
+    lock = root / '.lock'
+    try:
+        if time.time() - lock.stat().st_mtime > LOCK_STALE_SECONDS:
+            lock.unlink()
+    except FileNotFoundError:
+        pass
+
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        raise ArchiveLocked(f"Another archive run holds {lock}")
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        try:
+            lock.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def run_archive(audit_days=None, history_days=None, batch_size=None, dry_run=False, include_history=True):
+    """
+    Scheduler hook: archive everything past its retention window
+    Returns {source: row count}; raises ArchiveLocked if another run is active
+    """
+    audit_days = audit_retention_days() if audit_days is None else audit_days
+    history_days = history_retention_days() if history_days is None else history_days
+    now = timezone.now()
+
+    targets = []
+    if audit_days is not None:
+        targets.append((apps.get_model('ProjectLog', 'AuditLog'), 'created_at', now - timedelta(days=audit_days)))
+    if include_history and history_days is not None:
+        cutoff = now - timedelta(days=history_days)
+        targets.extend((model, 'history_date', cutoff) for model in history_models())
+
+    results = {}
+    with _run_lock():
+        for model, date_field, cutoff in targets:
+            count = archive_model(model, date_field, cutoff, batch_size=batch_size, dry_run=dry_run)
+            if count:
+                results[source_for(model)] = count
+                if not dry_run:
+                    logger.info(f"Archived {count} rows of {source_for(model)} older than {cutoff:%Y-%m-%d}")
+    return results
+
+
+# ---------- reading ----------
+
+def list_sources():
+    """Sources that have at least one archived month"""
+    root = archive_root()
+    if not root.exists():
+        return []
+    return sorted(
+        path.name for path in root.iterdir()
+        if path.is_dir() and any(path.glob(f'*{SUFFIX}'))
+    )
+
+
+def list_months(source):
+    """Archived months of a source, newest first"""
+    if source not in list_sources():
+        return []
+    directory = archive_root() / source
+    return sorted((path.name[:-len(SUFFIX)] for path in directory.glob(f'*{SUFFIX}')), reverse=True)
+
+
+def iter_archive(source, month):
+    """Records of one archived month in archive order, without repeated ids"""
+    # Only names listed from disk are opened (both come from request parameters)
+    if month not in list_months(source):
+        return
+
+    path = _month_path(source, month)
+    pk_name = _pk_name(source) if source in _sources() else 'id'
+    seen = set()
+    with gzip.open(path, 'rt', encoding='utf-8') as stream:
+        for line in stream:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            key = record.get(pk_name)
+            if key in seen:
+                continue
+            seen.add(key)
+            yield record
+
+
+def search_archive(source, month, filters=None, text=None, limit=500):
+    """
+    Records of one month matching every filters item (compared as strings) and
+    containing text anywhere in the record; newest first, at most limit
+    Returns (records, truncated)
+    """
+    filters = {key: str(value) for key, value in (filters or {}).items() if value not in (None, '')}
+    text = (text or '').strip().lower()
+
+    matches = deque(maxlen=limit)
+    total = 0
+    for record in iter_archive(source, month):
+        if any(str(record.get(key)) != value for key, value in filters.items()):
+            continue
+        if text and text not in json.dumps(record, ensure_ascii=False).lower():
+            continue
+        matches.append(record)
+        total += 1
+
+    return list(reversed(matches)), total > limit
@@ -0,0 +1,141 @@
+"""
+Buffered audit log writer
+
+Audit entries are collected in memory and written with a single bulk_create
+instead of one INSERT per saved instance:
+
+- an entry is kept only if its transaction commits (transaction.on_commit)
+- inside a buffered() scope (one per request, see AuditFlushMiddleware)
+  committed entries are flushed together when the scope ends
+- outside any scope committed entries are written right away
+- with AUDIT_LOG_ASYNC the flush hands the batch to a background writer
+  thread through a bounded queue; when the queue is full the caller waits
+  up to AUDIT_LOG_QUEUE_TIMEOUT seconds and then writes the batch itself
+  (backpressure without dropping entries)
+"""
+import atexit
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+_queue = None
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _state():
+    if not hasattr(_local, 'entries'):
+        _local.entries = []
+        _local.depth = 0
+    return _local
+
+
+def _batch_size():
+    return getattr(settings, 'AUDIT_LOG_BATCH_SIZE', 500)
+
+
+@contextmanager
+def buffered():
+    """Collect committed audit entries and write them once when the scope ends"""
+    state = _state()
+    state.depth += 1
+    try:
+        yield
+    finally:
+        state.depth -= 1
+        if state.depth == 0:
+            flush()
+
+
+def record(entry):
+    """
+    Queue an unsaved AuditLog entry
+    The entry is dropped if the surrounding transaction rolls back.
+    """
+    transaction.on_commit(partial(_committed, entry))
+
+
+def _committed(entry):
+    state = _state()
+    state.entries.append(entry)
+    if state.depth == 0 or len(state.entries) >= _batch_size():
+        flush()
+
+
+def flush():
+    """Write (or hand off) all committed entries of the current thread"""
+    state = _state()
+    entries, state.entries = state.entries, []
+    if not entries:
+        return
+
+    if getattr(settings, 'AUDIT_LOG_ASYNC', False):
+        _enqueue(entries)
+    else:
+        _write(entries)
+
+
+def _write(entries):
+    from .models import AuditLog
+
+    try:
+        AuditLog.objects.bulk_create(entries, batch_size=_batch_size())
+    except Exception as e:
+        logger.error(f"Failed to write {len(entries)} audit log entries: {e}")
+
+
+def _get_queue():
+    global _queue, _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _queue = queue.Queue(maxsize=getattr(settings, 'AUDIT_LOG_QUEUE_SIZE', 100))
+            _writer = threading.Thread(target=_writer_loop, args=(_queue,), name='audit-log-writer', daemon=True)
+            _writer.start()
+    return _queue
+
+
+def _enqueue(entries):
+    try:
+        _get_queue().put(entries, timeout=getattr(settings, 'AUDIT_LOG_QUEUE_TIMEOUT', 2))
+    except queue.Full:
+        logger.warning(f"Audit log queue is full, writing {len(entries)} entries synchronously")
+        _write(entries)
+
+
+def _writer_loop(pending):
+    while True:
+        batch = pending.get()
+        taken = 1
+        # Coalesce batches that piled up while the previous write was running
+        while len(batch) < _batch_size():
+            try:
+                batch = batch + pending.get_nowait()
+                taken += 1
+            except queue.Empty:
+                break
+
+        try:
+            _write(batch)
+        finally:
+            close_old_connections()
+            for _ in range(taken):
+                pending.task_done()
+
+
+def drain():
+    """Block until the background writer has written everything queued so far"""
+    flush()
+    if _queue is not None and _writer is not None and _writer.is_alive():
+        _queue.join()
+
+
+atexit.register(drain)
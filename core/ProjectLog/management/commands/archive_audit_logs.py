@@ -0,0 +1,43 @@
+# ProjectLog/management/commands/archive_audit_logs.py
+from django.core.management.base import BaseCommand, CommandError
+
+from ProjectLog.archive import ArchiveLocked, archive_root, run_archive
+
+
+class Command(BaseCommand):
+    help = (
+        'انتقال لاگ‌های ممیزی و رکوردهای تاریخچه قدیمی‌تر از مدت نگهداری به بایگانی ماهانه فشرده '
+        '(AUDIT_LOG_RETENTION_DAYS و HISTORY_RETENTION_DAYS)؛ برای اجرای شبانه با cron'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='مدت نگهداری لاگ ممیزی (روز)')
+        parser.add_argument('--history-days', type=int, help='مدت نگهداری جدول‌های تاریخچه (روز)')
+        parser.add_argument('--no-history', action='store_true', help='فقط لاگ ممیزی بایگانی شود')
+        parser.add_argument('--batch-size', type=int, help='تعداد ردیف در هر دسته حذف')
+        parser.add_argument('--dry-run', action='store_true', help='فقط شمارش، بدون بایگانی و حذف')
+
+    def handle(self, *args, **options):
+        try:
+            results = run_archive(
+                audit_days=options['days'],
+                history_days=options['history_days'],
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+                include_history=not options['no_history'],
+            )
+        except ArchiveLocked as e:
+            raise CommandError(str(e))
+
+        if not results:
+            self.stdout.write('ردیفی برای بایگانی وجود ندارد')
+            return
+
+        for source, count in results.items():
+            self.stdout.write(f'{source}: {count}')
+
+        total = sum(results.values())
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{total} ردیف بایگانی می‌شود (اجرای آزمایشی)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{total} ردیف در {archive_root()} بایگانی و حذف شد'))
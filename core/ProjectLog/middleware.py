@@ -0,0 +1,18 @@
+"""
+Middleware that writes the audit entries of a request in one batch
+"""
+from .buffer import buffered
+
+
+class AuditFlushMiddleware:
+    """
+    Buffer audit entries for the whole request and flush them with a single
+    bulk_create when the response is ready
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with buffered():
+            return self.get_response(request)
@@ -52,7 +52,37 @@ class AuditLog(models.Model):
     
     def __str__(self):
         return f"{self.action} - {self.model_app_label}.{self.model_name} ({self.object_repr})"
-    
+
+    @classmethod
+    def build_entry(cls, instance, action, user=None, changed_data=None):
+        """Build an unsaved audit entry for a model instance"""
+        model = instance.__class__
+        return cls(
+            user=user,
+            action=action,
+            model_name=model.__name__,
+            model_app_label=model._meta.app_label,
+            object_id=instance.pk,
+            object_repr=str(instance)[:200],
+            changed_data=changed_data,
+            content_type=ContentType.objects.get_for_model(model),
+        )
+
+    @classmethod
+    def log_bulk(cls, instances, action, user=None, changed_data=None, batch_size=500):
+        """
+        Write audit entries for many instances with a single bulk insert
+        (used by bulk operations that bypass the per-instance signals)
+        """
+        entries = [
+            cls.build_entry(instance, action, user=user, changed_data=changed_data)
+            for instance in instances
+            if instance.pk is not None
+        ]
+        if not entries:
+            return []
+        return cls.objects.bulk_create(entries, batch_size=batch_size)
+
     def get_changes_display(self):
         """Format changes for display"""
         if not self.changed_data:
@@ -0,0 +1,198 @@
+"""
+Audit logging for an explicit allow-list of models (settings.AUDIT_LOG_MODELS)
+- Receivers are connected per audited model, other models pay nothing
+- Proper validation for primary keys
+- Entries are written in batches through ProjectLog.buffer
+- Change detection diffs against the values kept when the row was loaded
+  (core.loaded_state), so no extra query is needed before save
+"""
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models.signals import post_save, pre_delete
+import logging
+
+from core import loaded_state
+from core.middleware import get_current_user
+from . import buffer
+
+logger = logging.getLogger(__name__)
+
+# Models audited when settings.AUDIT_LOG_MODELS is not set
+DEFAULT_AUDITED_MODELS = [
+    'accounts.UserRole',
+    'accounts.ProjectRole',
+    'accounts.ProjectUser',
+    'project.Project',
+    'project.StatusReport',
+    'fehrestbaha.PriceList',
+    'fehrestbaha.PriceListItem',
+    'sooratvaziat.MeasurementSession',
+    'sooratvaziat.MeasurementSessionItem',
+    'sooratvaziat.MeasurementRevision',
+]
+
+# Global flag to turn audit logging off (e.g. during data migrations)
+_audit_logging_active = True
+
+# Receivers connected by connect_audit_signals: (signal, receiver, sender, dispatch_uid)
+_audit_receivers = []
+
+
+def get_changes(instance, update_fields=None):
+    """
+    Extract changes between the loaded values (core.loaded_state) and current state safely
+    """
+    if not hasattr(instance, '_meta'):
+        return None
+
+    try:
+        previous_state = loaded_state.changed_fields(instance, update_fields)
+        if not previous_state:
+            return None
+
+        changes = {}
+        values = instance.__dict__
+
+        for field in instance._meta.concrete_fields:
+            if field.auto_created or field.attname not in previous_state:
+                continue
+
+            current_value = values[field.attname]
+            previous_value = previous_state[field.attname]
+            changes[field.name] = {
+                'old': str(previous_value) if previous_value is not None else None,
+                'new': str(current_value) if current_value is not None else None
+            }
+
+        return changes if changes else None
+    except Exception as e:
+        logger.debug(f"Error getting changes for {instance.__class__.__name__}: {e}")
+        return None
+
+
+def audited_models():
+    """Model classes listed in settings.AUDIT_LOG_MODELS ('app_label.Model')"""
+    models = []
+    for label in getattr(settings, 'AUDIT_LOG_MODELS', DEFAULT_AUDITED_MODELS):
+        try:
+            models.append(apps.get_model(label))
+        except (LookupError, ValueError):
+            logger.warning(f"AUDIT_LOG_MODELS: unknown model {label!r} is not audited")
+    return models
+
+
+def should_log_model(sender):
+    """
+    Determine if we should log this model
+    (receivers are only connected for audited models)
+    """
+    return _audit_logging_active
+
+
+def get_user_id(instance):
+    """
+    Id of the user responsible for the change, without extra queries
+    (instance user fields first, then the current request user)
+    """
+    for field_name in ('modified_by_id', 'user_id', 'created_by_id'):
+        user_id = getattr(instance, field_name, None)
+        if user_id:
+            return user_id
+
+    try:
+        user = get_current_user()
+        if user is not None and user.is_authenticated:
+            return user.pk
+    except Exception as e:
+        logger.debug(f"Error getting user for audit log: {e}")
+
+    return None
+
+
+def record_entry(sender, instance, action, changed_data=None):
+    """Build an audit entry and hand it to the buffered writer"""
+    from .models import AuditLog  # Import here to avoid circular imports
+
+    entry = AuditLog.build_entry(instance, action, changed_data=changed_data)
+    entry.user_id = get_user_id(instance)
+    buffer.record(entry)
+
+
+def log_save(sender, instance, created, **kwargs):
+    """
+    Audit log for create/update operations
+    """
+    try:
+        # Skip if we shouldn't log this model
+        if not should_log_model(sender):
+            return
+
+        # Ensure instance has a primary key
+        if not hasattr(instance, 'pk') or instance.pk is None:
+            logger.debug(f"Skipping audit log for {sender.__name__} - no primary key")
+            return
+
+        changes = None
+        if not created:
+            changes = get_changes(instance, kwargs.get('update_fields'))
+
+        record_entry(sender, instance, 'create' if created else 'update', changes)
+
+    except Exception as e:
+        logger.error(f"Error in audit log post_save for {sender.__name__}: {e}", exc_info=True)
+
+
+def log_delete(sender, instance, **kwargs):
+    """
+    Audit log for delete operations
+    """
+    try:
+        # Skip if we shouldn't log this model
+        if not should_log_model(sender):
+            return
+
+        # Ensure instance has a primary key
+        if not hasattr(instance, 'pk') or instance.pk is None:
+            logger.debug(f"Skipping audit delete log for {sender.__name__} - no primary key")
+            return
+
+        record_entry(sender, instance, 'delete', {'note': 'Object deleted'})
+
+    except Exception as e:
+        logger.error(f"Error in audit log pre_delete for {sender.__name__}: {e}", exc_info=True)
+
+
+# Connect signals safely
+def connect_audit_signals():
+    """
+    Connect audit signals for the models in settings.AUDIT_LOG_MODELS
+    Audited models keep their loaded values (core.loaded_state) for get_changes;
+    they are tracked after log_save is connected so it still sees the previous values.
+    """
+    try:
+        for model in audited_models():
+            label = model._meta.label
+            for signal, handler in ((post_save, log_save), (pre_delete, log_delete)):
+                dispatch_uid = f'audit_{handler.__name__}_{label}'
+                signal.connect(handler, sender=model, dispatch_uid=dispatch_uid)
+                _audit_receivers.append((signal, handler, model, dispatch_uid))
+            loaded_state.track(model)
+        logger.info("Audit logging signals connected successfully")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to connect audit signals: {e}")
+        return False
+
+
+def disconnect_audit_signals():
+    """
+    Disconnect audit signals safely
+    """
+    for signal, handler, sender, dispatch_uid in _audit_receivers:
+        try:
+            signal.disconnect(handler, sender=sender, dispatch_uid=dispatch_uid)
+        except Exception as e:
+            logger.debug(f"Could not disconnect signal: {e}")
+
+    _audit_receivers.clear()
@@ -1,3 +1,166 @@
-from django.test import TestCase
+import queue
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import archive, buffer
+from .models import AuditLog
+
+
+class ArchiveRootTests(SimpleTestCase):
+
+    @override_settings(AUDIT_ARCHIVE_ROOT=None)
+    def test_default_is_not_served(self):
+        root = archive.archive_root()
+        self.assertEqual(root, Path(settings.BASE_DIR) / 'audit_archive')
+        self.assertFalse(root.is_relative_to(settings.MEDIA_ROOT))
+
+    def test_refuses_served_directories(self):
+        for served in (settings.MEDIA_ROOT, settings.STATIC_ROOT):
+            with self.subTest(served=served), override_settings(AUDIT_ARCHIVE_ROOT=Path(served) / 'audit_archive'):
+                with self.assertRaises(ImproperlyConfigured):
+                    archive.archive_root()
+
+
+@override_settings(AUDIT_LOG_ASYNC=False)
+class AuditBufferTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('auditor')
+
+    def record(self, action='update'):
+        buffer.record(AuditLog.build_entry(self.user, action, user=self.user))
+
+    def test_entries_are_written_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.record()
+            self.assertFalse(AuditLog.objects.exists())
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(AuditLog.objects.get().object_id, self.user.pk)
+
+    def test_entries_are_dropped_on_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.record()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            self.record('create')
+
+        self.assertEqual(list(AuditLog.objects.values_list('action', flat=True)), ['create'])
+
+    def test_buffered_scope_writes_once_at_the_end(self):
+        with mock.patch.object(buffer, '_write', wraps=buffer._write) as write:
+            with buffer.buffered():
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.record()
+                    self.record()
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.record()
+                self.assertFalse(AuditLog.objects.exists())
+
+        write.assert_called_once()
+        self.assertEqual(AuditLog.objects.count(), 3)
+
+    @override_settings(AUDIT_LOG_ASYNC=True, AUDIT_LOG_QUEUE_TIMEOUT=0.01)
+    def test_full_queue_falls_back_to_a_synchronous_write(self):
+        full = queue.Queue(maxsize=1)
+        full.put([])
+        with mock.patch.object(buffer, '_get_queue', return_value=full):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.record()
+
+        self.assertEqual(AuditLog.objects.count(), 1)
+        self.assertEqual(full.qsize(), 1)
+
+
+@override_settings(AUDIT_LOG_ASYNC=False)
+class AuditedModelsTests(TestCase):
+
+    def test_only_listed_models_are_logged(self):
+        from fehrestbaha.models import DisciplineChoices, PriceList
+
+        self.assertIn('fehrestbaha.PriceList', settings.AUDIT_LOG_MODELS)
+        self.assertNotIn('auth.User', settings.AUDIT_LOG_MODELS)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user('not-audited')
+            PriceList.objects.create(discipline_choice=DisciplineChoices.ABANIE, discipline='ابنیه', year=1403)
+
+        self.assertEqual(
+            list(AuditLog.objects.values_list('model_app_label', 'model_name', 'action')),
+            [('fehrestbaha', 'PriceList', 'create')],
+        )
+
+
+class ArchiveModelTests(TestCase):
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(AUDIT_ARCHIVE_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = User.objects.create_user('auditor')
+        self.old_ids = []
+        for created_at in (datetime(2024, 1, 5), datetime(2024, 1, 20), datetime(2024, 2, 3)):
+            entry = AuditLog.build_entry(user, 'update', user=user)
+            entry.save()
+            AuditLog.objects.filter(pk=entry.pk).update(created_at=timezone.make_aware(created_at))
+            self.old_ids.append(entry.pk)
+        self.recent = AuditLog.build_entry(user, 'create', user=user)
+        self.recent.save()
+        self.cutoff = timezone.make_aware(datetime(2024, 3, 1))
+
+    def archive(self):
+        return archive.archive_model(AuditLog, 'created_at', self.cutoff, batch_size=2)
+
+    def archived_ids(self, month):
+        return [record['id'] for record in archive.iter_archive(archive.AUDIT_SOURCE, month)]
+
+    def test_rows_are_written_before_they_are_deleted(self):
+        append = archive._append
+
+        def append_while_stored(source, month, records):
+            # The rows are still in the table while they are archived
+            self.assertEqual(AuditLog.objects.filter(pk__in=[r['id'] for r in records]).count(), len(records))
+            append(source, month, records)
+
+        with mock.patch.object(archive, '_append', side_effect=append_while_stored) as written:
+            self.assertEqual(self.archive(), 3)
+
+        # one append per month of each batch: [Jan, Jan], [Feb]
+        self.assertEqual(written.call_count, 2)
+        self.assertEqual(list(AuditLog.objects.values_list('pk', flat=True)), [self.recent.pk])
+        self.assertEqual(archive.list_months(archive.AUDIT_SOURCE), ['2024-02', '2024-01'])
+        self.assertEqual(self.archived_ids('2024-01'), self.old_ids[:2])
+        self.assertEqual(self.archived_ids('2024-02'), self.old_ids[2:])
+
+    def test_rows_repeated_by_an_interrupted_run_are_read_once(self):
+        with mock.patch.object(archive.transaction, 'atomic', side_effect=RuntimeError('crash')):
+            with self.assertRaises(RuntimeError):
+                self.archive()
+        self.assertEqual(AuditLog.objects.count(), 4)
+
+        self.assertEqual(self.archive(), 3)
+
+        self.assertEqual(self.archived_ids('2024-01'), self.old_ids[:2])
+        records, truncated = archive.search_archive(archive.AUDIT_SOURCE, '2024-01', filters={'action': 'update'})
+        self.assertEqual(([record['id'] for record in records], truncated), (self.old_ids[1::-1], False))
+
+    def test_dry_run_keeps_rows(self):
+        self.assertEqual(archive.archive_model(AuditLog, 'created_at', self.cutoff, dry_run=True), 3)
+        self.assertEqual(AuditLog.objects.count(), 4)
+        self.assertEqual(archive.list_sources(), [])
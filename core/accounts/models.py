@@ -175,7 +175,7 @@ class ProjectRole(models.Model):
         verbose_name_plural = _('نقش‌های کاربران')
     
     def __str__(self):
-        return f"{self.user.username} - {self.get_role_display()}"
+        return self.get_name_display()
 
 class ProjectUser(models.Model):
     """
@@ -240,7 +240,7 @@ class ProjectUser(models.Model):
         ordering = ['-is_primary', 'role']
     
     def __str__(self):
-        return f"{self.user.username} - {self.get_name_display()} - {self.project.project_name}"
+        return f"{self.user.username} - {self.get_role_display()} - {self.project.project_name}"
 
     def save(self, *args, **kwargs):
         user = kwargs.pop('user', None)
@@ -0,0 +1,268 @@
+# accounts/permissions.py
+"""
+بررسی دسترسی کاربران با یک بار خواندن نقش‌ها در هر درخواست
+
+PermissionResolver نقش‌های سیستمی (UserRole) و انتساب‌های پروژه (ProjectUser)
+کاربر را یک بار می‌خواند و همه بررسی‌ها (has_access، can_edit، فیلترهای قالب
+و ...) از حافظه پاسخ داده می‌شوند. permissions_for(user) نمونه را روی خود
+شیء کاربر نگه می‌دارد، پس request.user در طول یک درخواست فقط یک بار بارگذاری می‌شود.
+
+کش بین درخواست‌ها (اختیاری):
+- PERMISSION_CACHE_TIMEOUT: مدت نگهداری نقش‌ها در کش جنگو به ثانیه (0 یعنی غیرفعال)
+- با ذخیره/حذف UserRole و ProjectUser کش همان کاربر و با تغییر ProjectRole
+  کش همه کاربران باطل می‌شود (accounts.signals)
+- نسخه کش یک توکن تصادفی است؛ اگر توکن در کش نباشد (مثلاً پس از خالی شدن کش)
+  توکن تازه ساخته می‌شود و هرگز با نسخه‌های قبلی برابر نیست
+"""
+import logging
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# نقش‌های پیش‌فرض دسترسی به پروژه (مانند Project.has_access)
+DEFAULT_PROJECT_ROLES = ('contractor', 'project_manager', 'employer', 'supervisor')
+
+# نقش‌های پروژه که اجازه ویرایش پروژه دارند
+PROJECT_EDIT_ROLES = ('contractor', 'project_manager')
+
+_CACHE_PREFIX = 'accounts:permissions'
+
+# شمارنده تغییرات نقش‌ها در این پردازه؛ نمونه‌های قدیمی‌تر دوباره بارگذاری می‌شوند
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def _cache_timeout():
+    return getattr(settings, 'PERMISSION_CACHE_TIMEOUT', 0)
+
+
+def _version_token(key):
+    """توکن نسخه؛ اگر در کش نباشد توکن تصادفی تازه (هرگز برابر توکن‌های قبلی) ساخته می‌شود"""
+    token = cache.get(key)
+    if token is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        token = cache.get(key)
+    return token
+
+
+def _cache_version():
+    return _version_token(f'{_CACHE_PREFIX}:version')
+
+
+def _cache_key(user_id):
+    return f'{_CACHE_PREFIX}:{_cache_version()}:user:{user_id}'
+
+
+class PermissionResolver:
+    """
+    نقش‌ها و انتساب‌های پروژه یک کاربر، بارگذاری‌شده در اولین بررسی
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._data = None
+        self._generation = None
+
+    # ---------- بارگذاری ----------
+
+    def _load(self):
+        if self._data is not None and self._generation == _generation:
+            return self._data
+
+        self._generation = _generation
+        self._data = self._read_cache()
+        if self._data is None:
+            self._data = self._query()
+            self._write_cache(self._data)
+        return self._data
+
+    def _query(self):
+        from .models import ProjectRole, ProjectUser, UserRole
+
+        roles = set(
+            UserRole.objects.filter(user_id=self.user.pk, is_active=True).values_list('role', flat=True)
+        )
+
+        projects = {}
+        for project_id, role in ProjectUser.objects.filter(
+            user_id=self.user.pk, is_active=True
+        ).values_list('project_id', 'role'):
+            projects.setdefault(project_id, set()).add(role)
+
+        # مجوز ویرایش متره بر اساس تعریف نقش در ProjectRole
+        measurement_roles = set()
+        if projects:
+            measurement_roles = set(
+                ProjectRole.objects.filter(is_active=True, can_edit_measurements=True).values_list('name', flat=True)
+            )
+
+        return {
+            'roles': roles,
+            'projects': projects,
+            'measurement_roles': measurement_roles,
+        }
+
+    def _read_cache(self):
+        if _cache_timeout() <= 0:
+            return None
+        try:
+            return cache.get(_cache_key(self.user.pk))
+        except Exception as e:
+            logger.warning(f"Permission cache read failed for user {self.user.pk}: {e}")
+            return None
+
+    def _write_cache(self, data):
+        if _cache_timeout() <= 0:
+            return
+        try:
+            cache.set(_cache_key(self.user.pk), data, _cache_timeout())
+        except Exception as e:
+            logger.warning(f"Permission cache write failed for user {self.user.pk}: {e}")
+
+    # ---------- نقش‌های سیستمی ----------
+
+    @property
+    def is_authenticated(self):
+        return bool(self.user is not None and self.user.is_authenticated)
+
+    @property
+    def is_superuser(self):
+        return self.is_authenticated and self.user.is_superuser
+
+    @property
+    def roles(self):
+        """مجموعه نقش‌های فعال کاربر (UserRole)"""
+        if not self.is_authenticated:
+            return frozenset()
+        return frozenset(self._load()['roles'])
+
+    def has_role(self, role_names):
+        """آیا کاربر یکی از نقش‌های سیستمی داده‌شده را دارد؟ (سوپریوزر همیشه دارد)"""
+        if isinstance(role_names, str):
+            role_names = [role_names]
+        if self.is_superuser:
+            return True
+        return any(role in self.roles for role in role_names)
+
+    @property
+    def is_admin(self):
+        """سوپریوزر یا دارای نقش ادمین"""
+        return self.is_superuser or 'admin' in self.roles
+
+    # ---------- نقش‌های پروژه ----------
+
+    def project_roles(self, project):
+        """نقش‌های فعال کاربر در پروژه (project یا شناسه آن)"""
+        if not self.is_authenticated:
+            return frozenset()
+        project_id = getattr(project, 'pk', project)
+        return frozenset(self._load()['projects'].get(project_id, ()))
+
+    def has_any_project_role(self, roles=None):
+        """آیا کاربر در هر پروژه‌ای (با یکی از نقش‌های داده‌شده) انتساب فعال دارد؟"""
+        if not self.is_authenticated:
+            return False
+        assignments = self._load()['projects'].values()
+        if roles is None:
+            return any(assignments)
+        return any(set(roles) & project_roles for project_roles in assignments)
+
+    def has_project_role(self, project, roles=None):
+        """آیا کاربر در پروژه یکی از نقش‌های داده‌شده (یا هر نقشی) را دارد؟"""
+        project_roles = self.project_roles(project)
+        if roles is None:
+            return bool(project_roles)
+        if isinstance(roles, str):
+            roles = [roles]
+        return any(role in project_roles for role in roles)
+
+    def is_project_creator(self, project):
+        return self.is_authenticated and project.created_by_id == self.user.pk
+
+    def can_access_project(self, project):
+        """دسترسی مشاهده پروژه: سوپریوزر، ادمین، ایجادکننده یا کاربر پروژه"""
+        return self.is_admin or self.is_project_creator(project) or self.has_project_role(project)
+
+    def has_project_access(self, project, required_roles=None):
+        """معادل Project.has_access"""
+        if self.is_superuser:
+            return True
+        if required_roles is None:
+            required_roles = DEFAULT_PROJECT_ROLES
+        return self.has_project_role(project, required_roles)
+
+    def can_edit_project(self, project):
+        """پیمانکار و مدیر طرح می‌توانند پروژه را ویرایش کنند"""
+        return self.is_superuser or self.has_project_role(project, PROJECT_EDIT_ROLES)
+
+    def can_edit_measurements(self, project):
+        """آیا یکی از نقش‌های کاربر در پروژه اجازه ویرایش متره دارد؟"""
+        if self.is_superuser:
+            return True
+        project_roles = self.project_roles(project)
+        return bool(project_roles and project_roles & self._load()['measurement_roles'])
+
+    def project_role(self, project):
+        """
+        نقش موثر کاربر در پروژه (مانند sooratvaziat.utils.get_user_project_role)
+        superuser، admin، creator، نقش پروژه یا None
+        """
+        if self.is_superuser:
+            return 'superuser'
+        if 'admin' in self.roles:
+            return 'admin'
+        if self.is_project_creator(project):
+            return 'creator'
+        project_roles = self.project_roles(project)
+        # در صورت چند نقش، انتخاب ثابت (به ترتیب الفبا)
+        return min(project_roles) if project_roles else None
+
+
+def permissions_for(user):
+    """
+    PermissionResolver کاربر؛ روی خود شیء کاربر نگه داشته می‌شود
+    (برای request.user یعنی یک نمونه در هر درخواست)
+    """
+    if user is None:
+        return PermissionResolver(None)
+
+    resolver = getattr(user, '_permission_resolver', None)
+    if resolver is None:
+        resolver = PermissionResolver(user)
+        try:
+            user._permission_resolver = resolver
+        except AttributeError:
+            pass
+    return resolver
+
+
+def invalidate_user(user_id):
+    """باطل کردن نقش‌های بارگذاری‌شده یک کاربر (در این پردازه و کش مشترک)"""
+    _bump_generation()
+    if _cache_timeout() <= 0:
+        return
+    try:
+        cache.delete(_cache_key(user_id))
+    except Exception as e:
+        logger.warning(f"Permission cache invalidation failed for user {user_id}: {e}")
+
+
+def invalidate_all():
+    """باطل کردن نقش‌های همه کاربران (مثلاً پس از تغییر تعریف ProjectRole)"""
+    _bump_generation()
+    if _cache_timeout() <= 0:
+        return
+    try:
+        cache.set(f'{_CACHE_PREFIX}:version', uuid.uuid4().hex, None)
+    except Exception as e:
+        logger.warning(f"Permission cache invalidation failed: {e}")
+
+
+def _bump_generation():
+    global _generation
+    with _generation_lock:
+        _generation += 1
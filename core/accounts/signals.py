@@ -0,0 +1,26 @@
+# accounts/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ProjectRole, ProjectUser, UserRole
+from .permissions import invalidate_all, invalidate_user
+
+
+@receiver(post_save, sender=UserRole)
+@receiver(post_delete, sender=UserRole)
+@receiver(post_save, sender=ProjectUser)
+@receiver(post_delete, sender=ProjectUser)
+def invalidate_user_permissions(sender, instance, **kwargs):
+    """
+    باطل کردن کش دسترسی کاربر پس از تغییر نقش یا انتساب پروژه
+    """
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=ProjectRole)
+@receiver(post_delete, sender=ProjectRole)
+def invalidate_role_permissions(sender, instance, **kwargs):
+    """
+    تغییر تعریف نقش پروژه روی همه کاربران اثر دارد
+    """
+    invalidate_all()
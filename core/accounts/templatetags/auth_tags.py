@@ -1,6 +1,5 @@
 from django import template
-from django.contrib.auth.models import User
-from accounts.models import UserRole, ProjectUser
+from accounts.permissions import permissions_for
 
 register = template.Library()
 
@@ -9,26 +8,22 @@ def has_any_project_role(user):
     """
     بررسی آیا کاربر دارای هرگونه نقش پروژه است یا سوپریوزر/ادمین است
     """
-    if user.is_superuser:
-        return True
-    
-    # بررسی نقش ادمین در UserRole
-    if UserRole.objects.filter(user=user, role='admin', is_active=True).exists():
+    permissions = permissions_for(user)
+
+    # سوپریوزر یا نقش ادمین در UserRole
+    if permissions.is_admin:
         return True
     
     # بررسی وجود نقش در پروژه‌ها
-    return ProjectUser.objects.filter(user=user, is_active=True).exists()
+    return permissions.has_any_project_role()
 
 @register.filter
 def can_access_management(user):
     """
     بررسی آیا کاربر می‌تواند به بخش مدیریت دسترسی داشته باشد
     """
-    if user.is_superuser:
-        return True
-    
-    # بررسی نقش ادمین در UserRole
-    if UserRole.objects.filter(user=user, role='admin', is_active=True).exists():
+    # سوپریوزر یا نقش ادمین در UserRole
+    if permissions_for(user).is_admin:
         return True
     
     # یا هر شرط دیگری برای دسترسی مدیریتی
@@ -39,16 +34,11 @@ def has_project_role(user, project):
     """
     بررسی آیا کاربر در پروژه خاصی نقش دارد
     """
-    if user.is_superuser:
-        return True
-    
-    # بررسی نقش ادمین در UserRole
-    if UserRole.objects.filter(user=user, role='admin', is_active=True).exists():
+    permissions = permissions_for(user)
+
+    # سوپریوزر یا نقش ادمین در UserRole
+    if permissions.is_admin:
         return True
     
     # بررسی نقش در پروژه خاص
-    return ProjectUser.objects.filter(
-        project=project, 
-        user=user, 
-        is_active=True
-    ).exists()
\ No newline at end of file
+    return permissions.has_project_role(project)
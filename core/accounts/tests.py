@@ -1,3 +1,44 @@
+from types import SimpleNamespace
+
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from project.context_processors import user_roles
+
+from .models import UserRole
+from .permissions import permissions_for
+
+
+class TemplateRolesTests(TestCase):
+    """نقش‌های قالب (project.context_processors) از PermissionResolver درخواست خوانده می‌شوند"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('manager', password='secret')
+        self.role = UserRole.objects.create(user=self.user, role='admin')
+
+    def template_context(self):
+        """context یک درخواست تازه"""
+        user = User.objects.get(pk=self.user.pk)
+        return user, user_roles(SimpleNamespace(user=user, session={}))
+
+    def test_roles_are_loaded_once_per_request(self):
+        user, context = self.template_context()
+        with self.assertNumQueries(2):  # نقش‌ها و انتساب‌های پروژه
+            self.assertIn('admin', context['user_roles'])
+            self.assertTrue(context['is_admin'])
+            self.assertFalse(context['is_contractor'])
+            self.assertTrue(permissions_for(user).is_admin)
+
+    def test_revoked_role_is_not_shown(self):
+        self.assertIn('admin', self.template_context()[1]['user_roles'])
+
+        self.role.is_active = False
+        self.role.save()
+        self.assertNotIn('admin', self.template_context()[1]['user_roles'])
+
+    def test_resolver_reloads_after_role_change(self):
+        resolver = permissions_for(self.user)
+        self.assertTrue(resolver.is_admin)
+
+        self.role.delete()
+        self.assertFalse(resolver.is_admin)
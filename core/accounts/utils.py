@@ -1,5 +1,5 @@
 # accounts/utils.py
-from .models import UserRole
+from .permissions import permissions_for
 
 def user_has_role(user, role_names):
     """
@@ -9,20 +9,13 @@ def user_has_role(user, role_names):
         role_names = [role_names]
     
     # سوپر یوزرها همه دسترسی‌ها را دارند
-    if user.is_superuser:
-        return True
-    
-    user_roles = UserRole.objects.filter(user=user, is_active=True)
-    user_role_names = [role.role for role in user_roles]
-    
-    return any(role in user_role_names for role in role_names)
+    return permissions_for(user).has_role(role_names)
 
 def get_user_roles(user):
     """
     دریافت لیست نقش‌های کاربر
     """
-    user_roles = UserRole.objects.filter(user=user, is_active=True)
-    return [role.role for role in user_roles]
+    return sorted(permissions_for(user).roles)
 
 def can_create_users(user):
     """
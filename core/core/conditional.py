@@ -0,0 +1,98 @@
+# core/conditional.py
+"""
+پاسخ‌های JSON شرطی برای داده‌هایی که به ندرت تغییر می‌کنند
+
+- ETag قوی از نسخه داده (مثلاً بیشترین updated_at) ساخته می‌شود و
+  If-None-Match / If-Modified-Since با 304 پاسخ داده می‌شوند
+- بدنه JSON و نسخه gzip آن در یک LRU داخل پردازه نگه داشته می‌شود تا
+  درخواست‌های بعدی بدون پرس‌وجوی داده و سریال‌سازی دوباره پاسخ بگیرند
+
+تنظیمات:
+- CONDITIONAL_JSON_CACHE_SIZE: حداکثر تعداد پاسخ‌های نگه‌داشته‌شده (پیش‌فرض 128)
+"""
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+# پاسخ‌های کوچک‌تر از این اندازه فشرده نمی‌شوند
+GZIP_MIN_LENGTH = 200
+
+_payloads = OrderedDict()
+_payloads_lock = threading.Lock()
+
+
+def make_etag(*parts):
+    """ETag قوی (بین دو کوتیشن) از اجزای نسخه داده"""
+    digest = hashlib.sha256(':'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags
+
+    if last_modified is not None:
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return if_modified_since is not None and int(last_modified.timestamp()) <= if_modified_since
+
+    return False
+
+
+def _get_payload(key, etag, build):
+    cache_key = (key, etag)
+    with _payloads_lock:
+        payload = _payloads.get(cache_key)
+        if payload is not None:
+            _payloads.move_to_end(cache_key)
+            return payload
+
+    body = json.dumps(build(), cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8')
+    compressed = gzip.compress(body) if len(body) >= GZIP_MIN_LENGTH else None
+    payload = (body, compressed)
+
+    with _payloads_lock:
+        # نسخه‌های قدیمی همین کلید دیگر استفاده نمی‌شوند
+        for old_key in [k for k in _payloads if k[0] == key]:
+            del _payloads[old_key]
+        _payloads[cache_key] = payload
+        while len(_payloads) > getattr(settings, 'CONDITIONAL_JSON_CACHE_SIZE', 128):
+            _payloads.popitem(last=False)
+    return payload
+
+
+def conditional_json_response(request, key, etag, build, last_modified=None):
+    """
+    پاسخ JSON با ETag/Last-Modified
+
+    key: شناسه ثابت داده (مثلاً ('price_list_items', 12))
+    etag: خروجی make_etag برای نسخه فعلی داده
+    build: تابعی که داده JSON را می‌سازد؛ فقط در صورت نبود در LRU فراخوانی می‌شود
+    """
+    if _not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+    else:
+        body, compressed = _get_payload(key, etag, build)
+        accepts_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if compressed is not None and accepts_gzip:
+            response = HttpResponse(compressed, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # مرورگر هر بار با If-None-Match اعتبارسنجی می‌کند
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,110 @@
+# core/exports.py
+"""
+ابزارهای مشترک خروجی CSV و اکسل با مصرف حافظه ثابت
+
+- CSV: سطرها با StreamingHttpResponse همزمان با تولید ارسال می‌شوند
+- اکسل: openpyxl در حالت write_only با استایل‌های نام‌دار از پیش ثبت‌شده؛
+  هر سطر فقط یک بار نوشته می‌شود و نیازی به دور دوم برای استایل‌دهی نیست
+"""
+import csv
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, Side
+from openpyxl.utils import get_column_letter
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# نام استایل‌های جدول گزارش‌ها
+CELL_STYLE = 'report_cell'
+HEADER_STYLE = 'report_header'
+
+
+class Echo:
+    """شیء شبه‌فایل برای csv.writer که به‌جای نوشتن، مقدار را برمی‌گرداند"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv_response(rows, filename, header=None):
+    """
+    پاسخ CSV جریانی: هر سطر به محض تولید برای کاربر ارسال می‌شود
+    rows می‌تواند هر iterable (از جمله generator) باشد.
+    """
+    writer = csv.writer(Echo())
+
+    def generate():
+        if header:
+            yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(generate(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _report_styles():
+    border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin'),
+    )
+    alignment = Alignment(horizontal='center', vertical='center')
+
+    cell = NamedStyle(name=CELL_STYLE, alignment=alignment, border=border)
+    header = NamedStyle(name=HEADER_STYLE, alignment=alignment, border=border, font=Font(bold=True))
+    return cell, header
+
+
+def new_workbook():
+    """Workbook در حالت write_only با استایل‌های جدول ثبت‌شده"""
+    wb = Workbook(write_only=True)
+    for style in _report_styles():
+        wb.add_named_style(style)
+    return wb
+
+
+def styled_row(ws, values, style=CELL_STYLE):
+    """ساخت سطر write_only که هر سلول آن استایل نام‌دار دارد"""
+    row = []
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        row.append(cell)
+    return row
+
+
+def append_table(wb, title, rows, header=None, column_width=None):
+    """
+    افزودن یک شیت جدول به workbook
+    سطرها به ترتیب از iterable خوانده و بلافاصله روی دیسک نوشته می‌شوند.
+    """
+    ws = wb.create_sheet(title=title)
+
+    # عرض ستون‌ها باید قبل از اولین سطر تعیین شود (یک عدد برای همه یا لیستی برای هر ستون)
+    if column_width and header:
+        widths = column_width if isinstance(column_width, (list, tuple)) else [column_width] * len(header)
+        for col, width in enumerate(widths, start=1):
+            ws.column_dimensions[get_column_letter(col)].width = width
+
+    if header:
+        ws.append(styled_row(ws, header, HEADER_STYLE))
+    for values in rows:
+        ws.append(styled_row(ws, values))
+    return ws
+
+
+def xlsx_response(wb, filename):
+    """
+    ارسال workbook به صورت تکه‌تکه از یک فایل موقت روی دیسک
+    (فایل xlsx یک zip است و تا پایان نوشتن قابل ارسال نیست، اما در حافظه هم نگه داشته نمی‌شود)
+    """
+    tmp = tempfile.TemporaryFile()
+    wb.save(tmp)
+    tmp.seek(0)
+    return FileResponse(tmp, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
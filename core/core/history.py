@@ -0,0 +1,113 @@
+# core/history.py
+"""
+سیاست ثبت تاریخچه (simple_history) برای کم کردن نوشتن‌های اضافه
+
+TrackedHistoricalRecords جایگزین HistoricalRecords است و ساختار جدول تاریخچه را
+تغییر نمی‌دهد؛ فقط تصمیم می‌گیرد کدام ذخیره‌ها ردیف تاریخچه بنویسند:
+
+- ignore_fields: فیلدهای مشتق‌شده (مجموع‌ها، شمارنده‌ها، updated_at و ...)؛ ذخیره‌ای که
+  جز این فیلدها (و excluded_fields) چیزی را عوض نکند ردیف تاریخچه نمی‌نویسد.
+  تغییرات نسبت به مقادیر بارگذاری‌شده (core.loaded_state) یا update_fields سنجیده می‌شوند
+- تنظیم HISTORY_TRACKING_POLICY برای هر مدل ('app_label.Model'):
+  {'ignore_fields': [...]} فیلدهای بیشتری اضافه می‌کند و {'enabled': False} تاریخچه
+  مدل را کاملاً خاموش می‌کند
+- suspended(*models): توقف ثبت تاریخچه (همه مدل‌ها یا مدل‌های داده‌شده) در thread جاری،
+  مثلاً هنگام بازمحاسبه دسته‌ای مجموع‌ها
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from simple_history.models import HistoricalRecords
+
+from core import loaded_state
+
+_local = threading.local()
+
+
+def _suspensions():
+    if not hasattr(_local, 'suspensions'):
+        _local.suspensions = []
+    return _local.suspensions
+
+
+@contextmanager
+def suspended(*models):
+    """توقف ثبت تاریخچه مدل‌های داده‌شده (بدون آرگومان: همه مدل‌ها) تا پایان محدوده"""
+    suspensions = _suspensions()
+    suspensions.append(frozenset(model._meta.label for model in models) or None)
+    try:
+        yield
+    finally:
+        suspensions.pop()
+
+
+def is_suspended(model):
+    label = model._meta.label
+    return any(labels is None or label in labels for labels in _suspensions())
+
+
+def model_policy(model):
+    """سیاست تنظیم‌شده برای یک مدل در HISTORY_TRACKING_POLICY"""
+    return getattr(settings, 'HISTORY_TRACKING_POLICY', {}).get(model._meta.label, {})
+
+
+def is_enabled(model):
+    return model_policy(model).get('enabled', True) and not is_suspended(model)
+
+
+class TrackedHistoricalRecords(HistoricalRecords):
+    """HistoricalRecords با ignore_fields، سیاست تنظیمات و suspended()"""
+
+    def __init__(self, *args, ignore_fields=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ignore_fields = tuple(ignore_fields)
+        self._ignored_attnames = {}
+
+    def finalize(self, sender, **kwargs):
+        super().finalize(sender, **kwargs)
+        if sender is self.cls and self.ignored_attnames(sender):
+            loaded_state.track(sender)
+
+    def ignored_attnames(self, model):
+        """attname فیلدهایی که تغییرشان به تنهایی ردیف تاریخچه نمی‌نویسد"""
+        attnames = self._ignored_attnames.get(model)
+        if attnames is None:
+            names = (
+                set(self.ignore_fields)
+                | set(self.excluded_fields)
+                | set(model_policy(model).get('ignore_fields', ()))
+            )
+            attnames = self._ignored_attnames[model] = frozenset(
+                model._meta.get_field(name).attname for name in names
+            )
+        return attnames
+
+    def changed_attnames(self, instance, update_fields=None):
+        """فیلدهای تغییرکرده در این ذخیره؛ None یعنی نامعلوم"""
+        changed = loaded_state.changed_fields(instance, update_fields)
+        if changed is not None:
+            return set(changed)
+        if update_fields is not None:
+            return {instance._meta.get_field(name).attname for name in update_fields}
+        return None
+
+    def post_save(self, instance, created, using=None, **kwargs):
+        model = instance.__class__
+        if not is_enabled(model):
+            return
+        if not created:
+            changed = self.changed_attnames(instance, kwargs.get('update_fields'))
+            if changed is not None and changed <= self.ignored_attnames(model):
+                return
+        super().post_save(instance, created, using=using, **kwargs)
+
+    def post_delete(self, instance, using=None, **kwargs):
+        if not is_enabled(instance.__class__):
+            return
+        super().post_delete(instance, using=using, **kwargs)
+
+    def m2m_changed(self, instance, action, attr, pk_set, reverse, **kwargs):
+        if not is_enabled(instance.__class__):
+            return
+        super().m2m_changed(instance, action, attr, pk_set, reverse, **kwargs)
@@ -0,0 +1,96 @@
+# core/loaded_state.py
+"""
+مقادیر بارگذاری‌شده هر شیء برای تشخیص فیلدهای تغییرکرده بدون کوئری اضافه
+
+برای هر مدل ثبت‌شده با track(model) یک نسخه از مقادیر فیلدها (بر اساس attname، کلید
+خارجی به صورت id) هنگام بارگذاری از پایگاه داده (post_init) در instance._loaded_state
+نگه داشته و پس از هر ذخیره با مقادیر ذخیره‌شده جایگزین می‌شود. مجموع‌های تفاضلی
+(sooratvaziat.aggregates)، لاگ ممیزی (ProjectLog.signals) و سیاست تاریخچه
+(core.history) همه از همین یک نسخه استفاده می‌کنند:
+
+- loaded_values(instance): مقادیر آخرین بارگذاری / ذخیره (None یعنی نامعلوم)
+- changed_fields(instance, update_fields=None): {attname: مقدار قبلی} فیلدهای تغییرکرده
+- remember(instance, update_fields=None): مقادیر فعلی مبنای مقایسه بعدی می‌شوند
+
+فیلدهای deferred در نسخه نیستند و مقایسه نمی‌شوند.
+"""
+from django.db.models.signals import post_init, post_save
+
+_tracked = set()
+
+
+def track(model):
+    """
+    ثبت مدل برای نگه‌داشتن مقادیر بارگذاری‌شده
+
+    گیرنده post_save که نسخه را به‌روز می‌کند هر بار به انتهای فهرست گیرنده‌ها منتقل
+    می‌شود؛ گیرنده‌هایی که در post_save از changed_fields استفاده می‌کنند باید پیش از
+    فراخوانی track متصل شوند تا مقایسه را با مقادیر پیش از همین ذخیره انجام دهند.
+    """
+    dispatch_uid = f'loaded_state_{model._meta.label}'
+    if model not in _tracked:
+        post_init.connect(_capture, sender=model, dispatch_uid=dispatch_uid)
+        _tracked.add(model)
+    post_save.disconnect(sender=model, dispatch_uid=dispatch_uid)
+    post_save.connect(_remember_saved, sender=model, dispatch_uid=dispatch_uid)
+
+
+def is_tracked(model):
+    return model in _tracked
+
+
+def _values(instance):
+    values = instance.__dict__
+    return {
+        field.attname: values[field.attname]
+        for field in instance._meta.concrete_fields
+        if field.attname in values
+    }
+
+
+def _capture(sender, instance, **kwargs):
+    # اشیای جدید پس از اولین ذخیره نسخه می‌گیرند
+    if instance.pk is not None:
+        instance._loaded_state = _values(instance)
+
+
+def _remember_saved(sender, instance, update_fields=None, **kwargs):
+    remember(instance, update_fields)
+
+
+def _update_attnames(instance, update_fields):
+    if update_fields is None:
+        return None
+    return {instance._meta.get_field(name).attname for name in update_fields}
+
+
+def loaded_values(instance):
+    """مقادیر فیلدها در آخرین بارگذاری یا ذخیره؛ None برای شیء جدید یا مدل ثبت‌نشده"""
+    return instance.__dict__.get('_loaded_state')
+
+
+def changed_fields(instance, update_fields=None):
+    """
+    {attname: مقدار قبلی} فیلدهایی که از آخرین بارگذاری یا ذخیره تغییر کرده‌اند
+    (با update_fields فقط همان فیلدها)؛ None یعنی مقادیر قبلی نامعلوم است
+    """
+    previous = loaded_values(instance)
+    if previous is None:
+        return None
+
+    saved = _update_attnames(instance, update_fields)
+    values = instance.__dict__
+    return {
+        attname: value for attname, value in previous.items()
+        if attname in values and values[attname] != value and (saved is None or attname in saved)
+    }
+
+
+def remember(instance, update_fields=None):
+    """مقادیر فعلی (با update_fields فقط همان فیلدها) مبنای مقایسه بعدی همین شیء است"""
+    state = _values(instance)
+    previous = loaded_values(instance)
+    saved = _update_attnames(instance, update_fields)
+    if saved is not None and previous is not None:
+        state = {**previous, **{attname: state[attname] for attname in saved if attname in state}}
+    instance._loaded_state = state
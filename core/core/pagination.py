@@ -0,0 +1,319 @@
+# core/pagination.py
+"""
+صفحه‌بندی keyset (cursor) برای فهرست‌های بزرگ
+
+به‌جای OFFSET و COUNT(*) کامل Paginator، هر صفحه با شرط روی مقادیر ستون‌های
+مرتب‌سازی آخرین (یا اولین) ردیف صفحه قبل خوانده می‌شود، پس هزینه صفحه‌های عمیق
+با صفحه اول یکی است:
+
+- ترتیب پیش‌فرض (-created_at, -id)؛ آخرین ستون ترتیب باید یکتا و همه ستون‌ها
+  غیر null باشند
+- cursor رشته‌ای base64 از مقادیر کلید و جهت حرکت (بعدی/قبلی) است
+- تعداد کل اختیاری است: دقیق، تخمینی (با سقف PAGINATION_COUNT_LIMIT، پیش‌فرض 10000)
+  یا بدون شمارش
+
+استفاده در view با paginate_keyset و در ادمین با KeysetChangeList / KeysetPaginationAdminMixin
+"""
+import base64
+import json
+from decimal import Decimal
+from uuid import UUID
+
+from django.conf import settings
+from django.contrib.admin.views.main import ChangeList
+from django.db import connections
+from django.db.models import Q
+from django.http import QueryDict
+
+# نام پارامتر cursor در آدرس
+CURSOR_VAR = 'cursor'
+
+DEFAULT_ORDERING = ('-created_at', '-id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _count_limit():
+    return getattr(settings, 'PAGINATION_COUNT_LIMIT', 10000)
+
+
+def _field_name(order):
+    return order.lstrip('-')
+
+
+def _cursor_value(value):
+    # تاریخ‌ها با دقت کامل میکروثانیه (DjangoJSONEncoder آن را تا میلی‌ثانیه کوتاه می‌کند)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    return value
+
+
+def estimate_count(queryset, limit=None):
+    """
+    تعداد تقریبی ردیف‌ها: (تعداد، تخمینی است؟)
+    - PostgreSQL و پرس‌وجوی بدون فیلتر: reltuples از pg_class (بدون پیمایش جدول)
+    - در بقیه موارد شمارش تا سقف limit؛ اگر به سقف برسد تعداد «limit+» است
+    """
+    limit = _count_limit() if limit is None else limit
+    connection = connections[queryset.db]
+
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= limit:
+            return int(row[0]), True
+
+    count = queryset.order_by()[:limit + 1].count()
+    if count > limit:
+        return limit, True
+    return count, False
+
+
+class KeysetPage:
+    """یک صفحه از نتایج؛ مانند Page جنگو قابل پیمایش است"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous, is_first):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.is_first = is_first
+        self.query_params = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __repr__(self):
+        return f"<KeysetPage of {len(self.object_list)} items>"
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], reverse=False)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], reverse=True)
+
+    # ---------- رشته پرس‌وجو برای لینک‌ها (با حفظ بقیه پارامترها) ----------
+
+    def _query(self, cursor):
+        params = self.query_params.copy() if self.query_params is not None else QueryDict(mutable=True)
+        params.pop(CURSOR_VAR, None)
+        if cursor:
+            params[CURSOR_VAR] = cursor
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        return self._query(self.next_cursor)
+
+    @property
+    def previous_query(self):
+        return self._query(self.previous_cursor)
+
+    @property
+    def first_query(self):
+        return self._query(None)
+
+
+class KeysetPaginator:
+    """
+    صفحه‌بندی keyset یک QuerySet
+
+    count_mode: 'exact' (COUNT کامل)، 'estimate' (estimate_count) یا None (بدون شمارش)
+    """
+
+    def __init__(self, queryset, per_page, ordering=DEFAULT_ORDERING, count_mode='estimate'):
+        self.ordering = tuple(ordering)
+        self.queryset = queryset.order_by(*self.ordering)
+        self.per_page = int(per_page)
+        self.count_mode = count_mode
+        self._count = None
+
+        model = queryset.model
+        self.fields = [model._meta.get_field(_field_name(order)) for order in self.ordering]
+
+    # ---------- تعداد ----------
+
+    def _load_count(self):
+        if self._count is None:
+            if self.count_mode == 'exact':
+                self._count = (self.queryset.order_by().count(), False)
+            elif self.count_mode == 'estimate':
+                self._count = estimate_count(self.queryset)
+            else:
+                self._count = (None, False)
+        return self._count
+
+    @property
+    def count(self):
+        """تعداد کل (یا سقف تخمین)؛ None وقتی شمارش غیرفعال است"""
+        return self._load_count()[0]
+
+    @property
+    def count_is_estimate(self):
+        return self._load_count()[1]
+
+    # ---------- cursor ----------
+
+    def encode_cursor(self, obj, reverse=False):
+        values = [_cursor_value(field.value_from_object(obj)) for field in self.fields]
+        payload = json.dumps({'v': values, 'r': int(reverse)})
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            values = payload['v']
+            if len(values) != len(self.fields):
+                raise ValueError("cursor length")
+            values = [field.to_python(value) for field, value in zip(self.fields, values)]
+            return values, bool(payload.get('r'))
+        except Exception as e:
+            raise InvalidCursor(f"cursor نامعتبر است: {e}")
+
+    def _after(self, values, reverse):
+        """
+        شرط ردیف‌های بعد از کلید داده‌شده در جهت ترتیب (یا قبل از آن وقتی reverse)
+        (a, b) > (x, y)  ⇔  a > x  OR  (a = x AND b > y)
+        """
+        condition = Q()
+        equal = {}
+        for order, field, value in zip(self.ordering, self.fields, values):
+            descending = order.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            condition |= Q(**equal, **{f'{field.name}__{lookup}': value})
+            equal[field.name] = value
+        return condition
+
+    # ---------- صفحه ----------
+
+    def get_page(self, cursor=None):
+        """صفحه متناظر با cursor؛ cursor خالی یا نامعتبر صفحه اول است"""
+        values, reverse = None, False
+        if cursor:
+            try:
+                values, reverse = self.decode_cursor(cursor)
+            except InvalidCursor:
+                values = None
+
+        if values is None:
+            rows = list(self.queryset[:self.per_page + 1])
+            return KeysetPage(
+                rows[:self.per_page], self,
+                has_next=len(rows) > self.per_page, has_previous=False, is_first=True,
+            )
+
+        queryset = self.queryset.filter(self._after(values, reverse))
+        if reverse:
+            reversed_ordering = [
+                _field_name(order) if order.startswith('-') else f'-{order}' for order in self.ordering
+            ]
+            rows = list(queryset.order_by(*reversed_ordering)[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return KeysetPage(rows, self, has_next=True, has_previous=has_previous, is_first=not has_previous)
+
+        rows = list(queryset[:self.per_page + 1])
+        return KeysetPage(
+            rows[:self.per_page], self,
+            has_next=len(rows) > self.per_page, has_previous=True, is_first=False,
+        )
+
+
+def paginate_keyset(request, queryset, per_page, ordering=DEFAULT_ORDERING, count_mode='estimate'):
+    """صفحه جاری بر اساس پارامتر cursor درخواست؛ لینک‌ها بقیه پارامترها را حفظ می‌کنند"""
+    paginator = KeysetPaginator(queryset, per_page, ordering=ordering, count_mode=count_mode)
+    page = paginator.get_page(request.GET.get(CURSOR_VAR))
+    page.query_params = request.GET
+    return page
+
+
+# ========== ادمین ==========
+
+class KeysetChangeList(ChangeList):
+    """
+    ChangeList ادمین با صفحه‌بندی keyset (بدون OFFSET و COUNT کامل)
+    مرتب‌سازی ثابت ModelAdmin.keyset_ordering است
+    """
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(CURSOR_VAR, None)
+        return params
+
+    def get_results(self, request):
+        paginator = KeysetPaginator(
+            self.queryset, self.list_per_page,
+            ordering=getattr(self.model_admin, 'keyset_ordering', DEFAULT_ORDERING),
+            count_mode=getattr(self.model_admin, 'keyset_count_mode', 'estimate'),
+        )
+        page = paginator.get_page(request.GET.get(CURSOR_VAR))
+        page.query_params = request.GET
+
+        self.keyset_page = page
+        self.paginator = paginator
+        self.result_list = page.object_list
+        self.result_count = paginator.count if paginator.count is not None else len(page.object_list)
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.show_all = False
+        self.multi_page = page.has_other_pages()
+
+    def next_page_url(self):
+        if not self.keyset_page.has_next():
+            return None
+        return self.get_query_string({CURSOR_VAR: self.keyset_page.next_cursor})
+
+    def previous_page_url(self):
+        if not self.keyset_page.has_previous():
+            return None
+        return self.get_query_string({CURSOR_VAR: self.keyset_page.previous_cursor})
+
+
+class KeysetPaginationAdminMixin:
+    """
+    صفحه‌بندی keyset برای ModelAdmin
+    keyset_ordering: ترتیب ثابت فهرست (مرتب‌سازی ستون‌ها غیرفعال می‌شود)
+    """
+
+    keyset_ordering = DEFAULT_ORDERING
+    keyset_count_mode = 'estimate'
+    show_full_result_count = False
+    sortable_by = ()
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_ordering(self, request):
+        return list(self.keyset_ordering)
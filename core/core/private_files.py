@@ -0,0 +1,63 @@
+# core/private_files.py
+"""
+مسیرهای فایل‌های خصوصی (خروجی گزارش‌ها، کش گزارش‌ها، بایگانی لاگ ممیزی)
+
+MEDIA_ROOT و STATIC_ROOT بدون بررسی دسترسی سرو می‌شوند (core/urls.py)، پس فایل‌هایی که
+فقط از طریق view با کنترل دسترسی خوانده می‌شوند نباید داخل آن‌ها باشند:
+
+- PRIVATE_MEDIA_ROOT: ریشه پیش‌فرض فایل‌های خصوصی (پیش‌فرض BASE_DIR/private_media)
+- ensure_private(path, setting_name) برای مسیر داخل یکی از مسیرهای سروشده
+  ImproperlyConfigured می‌دهد
+"""
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import FileSystemStorage
+
+# تنظیم‌هایی که مسیرشان بدون بررسی دسترسی سرو می‌شود
+SERVED_ROOTS = ('MEDIA_ROOT', 'STATIC_ROOT')
+
+
+def ensure_private(path, setting_name):
+    """مسیر داده‌شده (Path)؛ اگر داخل MEDIA_ROOT یا STATIC_ROOT باشد خطای تنظیمات"""
+    path = Path(path)
+    resolved = path.resolve()
+    for name in SERVED_ROOTS:
+        served = getattr(settings, name, None)
+        if served and resolved.is_relative_to(Path(served).resolve()):
+            raise ImproperlyConfigured(
+                f"{setting_name} ({path}) must not be inside {name} ({served})"
+            )
+    return path
+
+
+def private_root(setting_name=None, default_subdir=''):
+    """
+    مسیر خصوصی از تنظیم setting_name؛ در صورت نبود آن
+    PRIVATE_MEDIA_ROOT/default_subdir
+    """
+    root = getattr(settings, setting_name, None) if setting_name else None
+    if not root:
+        base = getattr(settings, 'PRIVATE_MEDIA_ROOT', None) or Path(settings.BASE_DIR) / 'private_media'
+        root = Path(base) / default_subdir
+        setting_name = 'PRIVATE_MEDIA_ROOT'
+    return ensure_private(root, setting_name)
+
+
+class PrivateFileSystemStorage(FileSystemStorage):
+    """FileSystemStorage روی PRIVATE_MEDIA_ROOT؛ مسیر در هر استفاده از تنظیمات خوانده و بررسی می‌شود"""
+
+    @property
+    def base_location(self):
+        return private_root()
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+
+def private_storage():
+    """storage فیلدهای فایلی که آدرس عمومی ندارند (فقط از طریق view داده می‌شوند)"""
+    return PrivateFileSystemStorage()
@@ -62,6 +62,10 @@ MIDDLEWARE = [
 
     # Add this after AuthenticationMiddleware
     'core.middleware.CurrentUserMiddleware',
+    # ثبت یکجای لاگ‌های ممیزی هر درخواست
+    'ProjectLog.middleware.AuditFlushMiddleware',
+    # قیمت هر آیتم فهرست بها فقط یک بار در هر درخواست تعیین می‌شود
+    'fehrestbaha.middleware.PriceMemoMiddleware',
 ]
 # CSRF تنظیمات اضافی
 CSRF_COOKIE_SECURE = False  # در production True کنید
@@ -84,6 +88,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'project.context_processors.user_roles',
             ],
         },
     },
@@ -150,6 +155,64 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# فایل‌های خصوصی (خروجی و کش گزارش‌ها) که فقط از طریق view با بررسی دسترسی داده می‌شوند
+# (core.private_files)؛ نباید داخل MEDIA_ROOT یا STATIC_ROOT باشد
+PRIVATE_MEDIA_ROOT = BASE_DIR / 'private_media'
+
+
+# بازمحاسبه تأخیری مجموع‌ها (sooratvaziat.aggregates)
+# 'thread': thread pool داخل پروسه، 'sync': بلافاصله پس از commit،
+# 'queue': فقط ثبت نشانگر و پردازش با manage.py refresh_aggregates
+# SQLite فقط یک نویسنده همزمان دارد، پس روی آن بازمحاسبه بعد از commit در همان درخواست انجام می‌شود
+AGGREGATE_REFRESH_MODE = 'sync' if DATABASES['default']['ENGINE'].endswith('sqlite3') else 'thread'
+AGGREGATE_REFRESH_WORKERS = 2
+
+# کارهای خروجی پس‌زمینه گزارش مالی (sooratvaziat.export_jobs)
+# تعداد پردازه‌های رندر PDF/اکسل (0 یعنی اجرای همزمان پس از commit) و مدت نگهداری فایل‌ها
+EXPORT_JOB_WORKERS = 2
+EXPORT_JOB_TTL_HOURS = 24
+
+# نوشتن دسته‌ای لاگ ممیزی (ProjectLog.buffer)
+# AUDIT_LOG_ASYNC: نوشتن در thread پس‌زمینه با صف محدود؛ روی SQLite غیرفعال است
+AUDIT_LOG_ASYNC = not DATABASES['default']['ENGINE'].endswith('sqlite3')
+AUDIT_LOG_BATCH_SIZE = 500
+AUDIT_LOG_QUEUE_SIZE = 100
+AUDIT_LOG_QUEUE_TIMEOUT = 2
+
+# مدل‌هایی که لاگ ممیزی می‌گیرند (ProjectLog.signals)؛ گیرنده‌ها فقط برای همین مدل‌ها وصل می‌شوند
+# و جدول‌های مشتق‌شده (مجموع‌ها، داشبورد، کارهای خروجی) و مدل‌های جنگو لاگ نمی‌شوند
+AUDIT_LOG_MODELS = [
+    'accounts.UserRole',
+    'accounts.ProjectRole',
+    'accounts.ProjectUser',
+    'project.Project',
+    'project.StatusReport',
+    'fehrestbaha.PriceList',
+    'fehrestbaha.PriceListItem',
+    'sooratvaziat.MeasurementSession',
+    'sooratvaziat.MeasurementSessionItem',
+    'sooratvaziat.MeasurementRevision',
+]
+
+# بایگانی لاگ ممیزی و تاریخچه (ProjectLog.archive، دستور archive_audit_logs)
+# ردیف‌های قدیمی‌تر از مدت نگهداری به فایل‌های ماهانه فشرده منتقل و از جدول حذف می‌شوند
+# HISTORY_RETENTION_DAYS = None جدول‌های تاریخچه را بایگانی نمی‌کند
+# مسیر بایگانی AUDIT_ARCHIVE_ROOT است (پیش‌فرض BASE_DIR/audit_archive)؛ مسیر داخل MEDIA_ROOT یا
+# STATIC_ROOT پذیرفته نمی‌شود چون این فایل‌ها بدون بررسی دسترسی سرو می‌شوند
+AUDIT_LOG_RETENTION_DAYS = 180
+HISTORY_RETENTION_DAYS = 365
+AUDIT_ARCHIVE_BATCH_SIZE = 1000
+
+# سیاست ثبت تاریخچه (core.history)
+# هر مدل فیلدهای مشتق‌شده خود را در TrackedHistoricalRecords(ignore_fields=...) معرفی می‌کند؛
+# اینجا برای هر مدل فیلدهای بیشتری نادیده گرفته یا تاریخچه خاموش می‌شود، مثلاً:
+# {'project.StatusReport': {'ignore_fields': ['progress_percentage']}, 'fehrestbaha.PriceList': {'enabled': False}}
+HISTORY_TRACKING_POLICY = {}
+
+# کش دسترسی‌ها (accounts.permissions)
+# نقش‌ها در هر درخواست یک بار خوانده می‌شوند؛ با مقدار بیشتر از 0 بین درخواست‌ها هم در کش جنگو می‌مانند
+PERMISSION_CACHE_TIMEOUT = 0
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -10,6 +10,7 @@ from django.contrib import messages
 from django.core.files.storage import FileSystemStorage
 import os
 import jdatetime
+from core.exports import stream_csv_response, xlsx_response
 from .models import PriceList, PriceListItem
 
 class JalaliDateFilter(DateFieldListFilter):
@@ -76,7 +77,7 @@ class PriceListAdmin(admin.ModelAdmin):
     )
     
     # اضافه کردن اکشن‌های سفارشی
-    actions = ['export_to_excel', 'create_sample_excel']
+    actions = ['export_to_excel', 'export_to_csv', 'create_sample_excel']
     
     def get_urls(self):
         urls = super().get_urls()
@@ -93,25 +94,34 @@ class PriceListAdmin(admin.ModelAdmin):
             return
         
         price_list = queryset.first()
-        filepath, filename = price_list.export_to_excel()
         
         try:
-            response = FileResponse(open(filepath, 'rb'), as_attachment=True, filename=filename)
-            self.message_user(request, f"فایل اکسل با موفقیت ایجاد شد: {filename}", level=messages.SUCCESS)
-            return response
+            return xlsx_response(price_list.export_to_excel(), price_list.export_filename('xlsx'))
         except Exception as e:
             self.message_user(request, f"خطا در ایجاد فایل اکسل: {str(e)}", level=messages.ERROR)
     
     export_to_excel.short_description = "صادر کردن آیتم‌ها به اکسل"
     
+    def export_to_csv(self, request, queryset):
+        """اکشن برای صادر کردن جریانی به CSV"""
+        if queryset.count() != 1:
+            self.message_user(request, "لطفاً فقط یک فهرست بها را انتخاب کنید", level=messages.ERROR)
+            return
+        
+        price_list = queryset.first()
+        return stream_csv_response(
+            price_list.iter_export_rows(),
+            f"pricelist_{price_list.pk}.csv",
+            header=PriceList.EXPORT_HEADERS,
+        )
+    
+    export_to_csv.short_description = "صادر کردن آیتم‌ها به CSV"
+    
     def create_sample_excel(self, request, queryset):
         """ایجاد فایل نمونه"""
-        filepath, filename = PriceList.create_sample_excel()
-        
         try:
-            response = FileResponse(open(filepath, 'rb'), as_attachment=True, filename=filename)
-            self.message_user(request, f"فایل نمونه با موفقیت ایجاد شد: {filename}", level=messages.SUCCESS)
-            return response
+            wb, filename = PriceList.create_sample_excel()
+            return xlsx_response(wb, filename)
         except Exception as e:
             self.message_user(request, f"خطا در ایجاد فایل نمونه: {str(e)}", level=messages.ERROR)
     
@@ -159,11 +169,9 @@ class PriceListAdmin(admin.ModelAdmin):
     
     def download_sample_view(self, request):
         """دانلود فایل نمونه"""
-        filepath, filename = PriceList.create_sample_excel()
-        
         try:
-            response = FileResponse(open(filepath, 'rb'), as_attachment=True, filename=filename)
-            return response
+            wb, filename = PriceList.create_sample_excel()
+            return xlsx_response(wb, filename)
         except Exception as e:
             self.message_user(request, f"خطا در ایجاد فایل نمونه: {str(e)}", level=messages.ERROR)
             return redirect('admin:fehrestbaha_pricelist_changelist')
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FehrestbahaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fehrestbaha'
+
+    def ready(self):
+        import fehrestbaha.signals  # Import signals
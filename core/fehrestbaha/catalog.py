@@ -0,0 +1,277 @@
+# fehrestbaha/catalog.py
+"""
+کش فشرده فهرست‌های بها در حافظه پردازه (مشترک بین درخواست‌ها)
+
+گزارش‌ها و صفحات متره برای هر آیتم صورت جلسه فقط به چند مشخصه آیتم فهرست بها
+(شماره ردیف، شرح، واحد، نوع واحد و قیمت) نیاز دارند. به‌جای join با
+PriceListItem در هر پرس‌وجو، هر فهرست بها یک بار خوانده و به صورت آرایه‌های
+فشرده نگه داشته می‌شود:
+
+- شناسه‌ها و قیمت‌ها (به صورت عدد صحیح صدم ریال، با همان دو رقم اعشار فیلد price) در
+  array، نوع واحد به صورت کد یک بایتی
+- رکورد CatalogItem (با __slots__) فقط هنگام دسترسی ساخته می‌شود
+- نسخه هر کاتالوگ updated_at فهرست بهاست؛ ذخیره/حذف آیتم‌ها updated_at فهرست
+  بها را جلو می‌برد (fehrestbaha.signals) تا پردازه‌های دیگر هم نسخه جدید را ببینند
+  و کاتالوگ همین پردازه بلافاصله حذف می‌شود
+- حداکثر PRICELIST_CATALOG_CACHE_SIZE کاتالوگ (پیش‌فرض 32) نگه داشته می‌شود
+"""
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.utils import timezone
+
+from .units import UnitType, classify_unit
+
+# کد یک بایتی هر نوع واحد (اندیس در این تاپل)
+UNIT_CODES = tuple(UnitType)
+
+_catalogs = OrderedDict()
+_catalogs_lock = threading.Lock()
+
+
+# قیمت‌ها با دو رقم اعشار (همان دقت pricing.price_value و item_total) نگه داشته می‌شوند
+CENTS = Decimal('0.01')
+
+
+def _to_cents(price):
+    if price is None:
+        return 0
+    return int(Decimal(str(price)).quantize(CENTS, rounding=ROUND_HALF_UP).scaleb(2))
+
+
+def _from_cents(cents):
+    return Decimal(cents).scaleb(-2).quantize(CENTS)
+
+
+class CatalogItem:
+    """مشخصات یک آیتم فهرست بها از کاتالوگ (فقط خواندنی)"""
+
+    __slots__ = (
+        'id', 'price_list_id', 'discipline_choice', 'row_number', 'description',
+        'unit', 'unit_type', 'price', 'is_starred', 'is_active',
+    )
+
+    def __init__(self, **values):
+        for field in self.__slots__:
+            setattr(self, field, values[field])
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __repr__(self):
+        return f"<CatalogItem {self.id}: {self.row_number}>"
+
+
+class PriceListCatalog:
+    """آیتم‌های یک فهرست بها به صورت آرایه‌های هم‌اندیس مرتب بر اساس شناسه"""
+
+    __slots__ = (
+        'price_list_id', 'discipline_choice', 'version',
+        'ids', 'prices', 'unit_codes', 'flags',
+        'row_numbers', 'descriptions', 'units', '_by_row_number',
+    )
+
+    FIELDS = ('id', 'row_number', 'description', 'unit', 'unit_type', 'price', 'is_starred', 'is_active')
+
+    # بیت‌های flags
+    STARRED = 1
+    ACTIVE = 2
+
+    def __init__(self, price_list_id, discipline_choice, version, rows):
+        self.price_list_id = price_list_id
+        self.discipline_choice = discipline_choice
+        self.version = version
+        self.ids = array('q')
+        self.prices = array('q')
+        self.unit_codes = array('b')
+        self.flags = array('b')
+        self.row_numbers = []
+        self.descriptions = []
+        self.units = []
+
+        for pk, row_number, description, unit, unit_type, price, is_starred, is_active in rows:
+            self.ids.append(pk)
+            self.prices.append(_to_cents(price))
+            self.unit_codes.append(UNIT_CODES.index(unit_type or classify_unit(unit)))
+            self.flags.append((self.STARRED if is_starred else 0) | (self.ACTIVE if is_active else 0))
+            self.row_numbers.append(row_number)
+            self.descriptions.append(description)
+            self.units.append(unit)
+
+        self._by_row_number = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return (self._record(position) for position in range(len(self.ids)))
+
+    def __contains__(self, pk):
+        return self._position(pk) is not None
+
+    def _position(self, pk):
+        position = bisect_left(self.ids, pk)
+        if position < len(self.ids) and self.ids[position] == pk:
+            return position
+        return None
+
+    def _record(self, position):
+        flags = self.flags[position]
+        return CatalogItem(
+            id=self.ids[position],
+            price_list_id=self.price_list_id,
+            discipline_choice=self.discipline_choice,
+            row_number=self.row_numbers[position],
+            description=self.descriptions[position],
+            unit=self.units[position],
+            unit_type=UNIT_CODES[self.unit_codes[position]],
+            price=_from_cents(self.prices[position]),
+            is_starred=bool(flags & self.STARRED),
+            is_active=bool(flags & self.ACTIVE),
+        )
+
+    def get(self, pk, default=None):
+        """CatalogItem با شناسه داده‌شده"""
+        position = self._position(pk)
+        return default if position is None else self._record(position)
+
+    def price(self, pk, default=None):
+        """قیمت واحد (Decimal دو رقم اعشار) بدون ساختن رکورد"""
+        position = self._position(pk)
+        return default if position is None else _from_cents(self.prices[position])
+
+    def by_row_number(self, row_number, default=None):
+        """CatalogItem با شماره ردیف داده‌شده"""
+        if self._by_row_number is None:
+            self._by_row_number = {
+                number: position for position, number in enumerate(self.row_numbers)
+            }
+        position = self._by_row_number.get(row_number)
+        return default if position is None else self._record(position)
+
+
+def _cache_size():
+    return getattr(settings, 'PRICELIST_CATALOG_CACHE_SIZE', 32)
+
+
+def _versions(price_list_ids):
+    from .models import PriceList
+
+    return {
+        pk: (discipline_choice, updated_at.isoformat() if updated_at else '')
+        for pk, discipline_choice, updated_at in PriceList.objects.filter(
+            pk__in=price_list_ids
+        ).values_list('pk', 'discipline_choice', 'updated_at')
+    }
+
+
+def _build(price_list_id, discipline_choice, version):
+    from .models import PriceListItem
+
+    rows = PriceListItem.objects.filter(price_list_id=price_list_id).order_by('id').values_list(
+        *PriceListCatalog.FIELDS
+    )
+    return PriceListCatalog(price_list_id, discipline_choice, version, rows)
+
+
+def get_catalogs(price_list_ids):
+    """
+    کاتالوگ فهرست‌های بها: {شناسه فهرست بها: PriceListCatalog}
+    نسخه‌ها با یک پرس‌وجو بررسی و فقط کاتالوگ‌های تغییرکرده دوباره خوانده می‌شوند
+    """
+    price_list_ids = {pk for pk in price_list_ids if pk is not None}
+    if not price_list_ids:
+        return {}
+
+    catalogs = {}
+    for pk, (discipline_choice, version) in _versions(price_list_ids).items():
+        with _catalogs_lock:
+            catalog = _catalogs.get(pk)
+            if catalog is not None and catalog.version == version:
+                _catalogs.move_to_end(pk)
+                catalogs[pk] = catalog
+                continue
+
+        catalog = _build(pk, discipline_choice, version)
+        with _catalogs_lock:
+            _catalogs[pk] = catalog
+            _catalogs.move_to_end(pk)
+            while len(_catalogs) > _cache_size():
+                _catalogs.popitem(last=False)
+        catalogs[pk] = catalog
+
+    return catalogs
+
+
+def catalog_version(price_list_id):
+    """
+    نسخه فعلی کاتالوگ یک فهرست بها (updated_at آن)، بدون ساختن کاتالوگ
+    برای کلید ایندکس‌ها و ETag پاسخ‌های وابسته به آیتم‌ها؛ None اگر فهرست بها وجود نداشته باشد
+    """
+    version = _versions([int(price_list_id)]).get(int(price_list_id))
+    return None if version is None else version[1]
+
+
+def get_catalog(price_list_id):
+    """کاتالوگ یک فهرست بها (None اگر فهرست بها وجود نداشته باشد)"""
+    return get_catalogs([price_list_id]).get(price_list_id)
+
+
+def find_items(item_ids, price_list_ids=()):
+    """
+    مشخصات آیتم‌های فهرست بها: {شناسه آیتم: CatalogItem}
+
+    price_list_ids: فهرست‌های بهایی که آیتم‌ها احتمالاً در آن‌ها هستند (مثلاً فهرست بهای
+    صورت جلسه‌ها)؛ آیتم‌هایی که در آن‌ها پیدا نشوند با یک پرس‌وجوی شناسه فهرست بها
+    پیدا می‌شوند
+    """
+    from .models import PriceListItem
+
+    item_ids = {pk for pk in item_ids if pk is not None}
+    found = {}
+
+    catalogs = get_catalogs(price_list_ids)
+    for catalog in catalogs.values():
+        for pk in item_ids:
+            if pk not in found:
+                item = catalog.get(pk)
+                if item is not None:
+                    found[pk] = item
+
+    missing = item_ids - found.keys()
+    if missing:
+        owners = dict(PriceListItem.objects.filter(pk__in=missing).values_list('pk', 'price_list_id'))
+        extra = get_catalogs(set(owners.values()) - catalogs.keys())
+        catalogs = {**catalogs, **extra}
+        for pk, price_list_id in owners.items():
+            catalog = catalogs.get(price_list_id)
+            item = catalog.get(pk) if catalog is not None else None
+            if item is not None:
+                found[pk] = item
+
+    return found
+
+
+def invalidate(price_list_id=None):
+    """حذف کاتالوگ یک فهرست بها (یا همه) از حافظه این پردازه"""
+    with _catalogs_lock:
+        if price_list_id is None:
+            _catalogs.clear()
+        else:
+            _catalogs.pop(price_list_id, None)
+
+
+def touch(price_list_id):
+    """
+    جلو بردن نسخه فهرست بها پس از تغییر آیتم‌های آن (برای همه پردازه‌ها)
+    برای عملیات دسته‌ای که سیگنال ذخیره ندارند (مثل bulk_update) هم فراخوانی شود
+    """
+    from .models import PriceList
+
+    PriceList.objects.filter(pk=price_list_id).update(updated_at=timezone.now())
+    invalidate(price_list_id)
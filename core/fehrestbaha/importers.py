@@ -0,0 +1,250 @@
+# fehrestbaha/importers.py
+"""
+ورود دسته‌ای آیتم‌های فهرست بها از فایل اکسل
+
+- فایل با openpyxl در حالت read_only خوانده می‌شود (بدون بارگذاری کل workbook)
+- ستون‌ها یک بار از روی سطر عنوان بررسی می‌شوند
+- آیتم‌های موجود فهرست بها با یک پرس‌وجو خوانده و با سطرهای فایل مقایسه می‌شوند
+- آیتم‌های جدید و تغییرکرده با bulk_create/bulk_update در دسته‌های
+  PRICELIST_IMPORT_BATCH_SIZE (پیش‌فرض 1000) ذخیره می‌شوند و تاریخچه
+  simple_history هم به صورت دسته‌ای ثبت می‌شود
+- خطای هر سطر با شماره سطر اکسل گزارش می‌شود و بقیه سطرها وارد می‌شوند
+"""
+import logging
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from openpyxl import load_workbook
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
+
+from .catalog import touch as touch_catalog
+from .models import PriceListItem
+from .units import classify_unit
+
+logger = logging.getLogger(__name__)
+
+ROW_NUMBER_COLUMN = 'شماره ردیف'
+DESCRIPTION_COLUMN = 'شرح'
+PRICE_COLUMN = 'قیمت واحد (ریال)'
+UNIT_COLUMN = 'واحد'
+STARRED_COLUMN = 'ستاره‌دار'
+
+REQUIRED_COLUMNS = [ROW_NUMBER_COLUMN, DESCRIPTION_COLUMN, PRICE_COLUMN, UNIT_COLUMN]
+
+STARRED_VALUES = {'بله', 'yes', 'true', '1', '✓'}
+
+# فیلدهایی که از فایل به‌روزرسانی می‌شوند
+UPDATE_FIELDS = ['description', 'price', 'unit', 'unit_type', 'is_starred']
+
+# حداکثر تعداد خطاهایی که در پیام خلاصه نمایش داده می‌شود
+MESSAGE_ERRORS = 5
+
+
+def _batch_size():
+    return getattr(settings, 'PRICELIST_IMPORT_BATCH_SIZE', 1000)
+
+
+def _header_key(value):
+    """نام ستون بدون فاصله و نیم‌فاصله برای مقایسه"""
+    return str(value or '').replace('\u200c', '').replace(' ', '').strip()
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _parse_price(value):
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        price = Decimal(str(value))
+    else:
+        text = _cell_text(value).replace(',', '').replace('٬', '')
+        if not text:
+            raise ValueError("قیمت واحد خالی است")
+        try:
+            price = Decimal(text)
+        except InvalidOperation:
+            raise ValueError(f"قیمت واحد نامعتبر است: {text}")
+    if price < 0:
+        raise ValueError("قیمت واحد نمی‌تواند منفی باشد")
+    return price.quantize(Decimal('0.01'))
+
+
+class ImportResult:
+    """نتیجه ورود: تعداد آیتم‌های جدید/به‌روزشده/بدون تغییر و خطاهای هر سطر"""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []  # [(شماره سطر اکسل، پیام)]
+        self.fatal = None
+
+    @property
+    def success(self):
+        return self.fatal is None
+
+    @property
+    def success_count(self):
+        return self.created + self.updated + self.unchanged
+
+    def add_error(self, row, message):
+        self.errors.append((row, message))
+
+    @property
+    def message(self):
+        if self.fatal:
+            return self.fatal
+
+        message = (
+            f"عملیات وارد کردن کامل شد. {self.success_count} آیتم موفق "
+            f"({self.created} جدید، {self.updated} به‌روزرسانی، {self.unchanged} بدون تغییر)، "
+            f"{len(self.errors)} آیتم ناموفق"
+        )
+        if self.errors:
+            details = '; '.join(f"ردیف {row}: {error}" for row, error in self.errors[:MESSAGE_ERRORS])
+            message += f"\nخطاها: {details}"  # فقط چند خطای اول
+        return message
+
+
+def read_price_list_rows(file_path, result):
+    """
+    سطرهای معتبر فایل اکسل به صورت {شماره ردیف: (شماره سطر اکسل، داده‌ها)}
+    خطاهای ستون‌ها در result.fatal و خطاهای سطرها در result.errors ثبت می‌شوند
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+
+        positions = {}
+        for position, title in enumerate(header):
+            positions.setdefault(_header_key(title), position)
+
+        missing_columns = [col for col in REQUIRED_COLUMNS if _header_key(col) not in positions]
+        if missing_columns:
+            result.fatal = f"ستون‌های ضروری وجود ندارند: {', '.join(missing_columns)}"
+            return {}
+
+        row_number_at = positions[_header_key(ROW_NUMBER_COLUMN)]
+        description_at = positions[_header_key(DESCRIPTION_COLUMN)]
+        price_at = positions[_header_key(PRICE_COLUMN)]
+        unit_at = positions[_header_key(UNIT_COLUMN)]
+        starred_at = positions.get(_header_key(STARRED_COLUMN))
+        width = len(header)
+
+        parsed = {}
+        for excel_row, values in enumerate(rows, start=2):
+            if not values or all(value is None for value in values):
+                continue
+            values = tuple(values) + (None,) * (width - len(values))
+
+            try:
+                row_number = _cell_text(values[row_number_at])
+                if not row_number:
+                    raise ValueError("شماره ردیف خالی است")
+                if len(row_number) > PriceListItem._meta.get_field('row_number').max_length:
+                    raise ValueError(f"شماره ردیف بیش از حد طولانی است: {row_number}")
+                if row_number in parsed:
+                    raise ValueError(f"شماره ردیف {row_number} تکراری است (سطر {parsed[row_number][0]})")
+
+                description = _cell_text(values[description_at])
+                if not description:
+                    raise ValueError("شرح خالی است")
+
+                unit = _cell_text(values[unit_at])
+                if len(unit) > PriceListItem._meta.get_field('unit').max_length:
+                    raise ValueError(f"واحد بیش از حد طولانی است: {unit}")
+
+                is_starred = False
+                if starred_at is not None:
+                    is_starred = _cell_text(values[starred_at]).lower() in STARRED_VALUES
+
+                parsed[row_number] = (excel_row, {
+                    'description': description,
+                    'price': _parse_price(values[price_at]),
+                    'unit': unit,
+                    # نوع واحد اینجا تعیین می‌شود چون bulk_create متد save را صدا نمی‌زند
+                    'unit_type': classify_unit(unit),
+                    'is_starred': is_starred,
+                })
+            except ValueError as e:
+                result.add_error(excel_row, str(e))
+
+        return parsed
+    finally:
+        workbook.close()
+
+
+def import_price_list_items(file_path, price_list, user=None):
+    """
+    ورود/به‌روزرسانی آیتم‌های فهرست بها از فایل اکسل
+    خروجی: ImportResult
+    """
+    result = ImportResult()
+    try:
+        parsed = read_price_list_rows(file_path, result)
+    except Exception as e:
+        logger.error(f"Error reading price list excel {file_path}: {e}")
+        result.fatal = f"خطا در خواندن فایل اکسل: {str(e)}"
+        return result
+
+    if result.fatal or not parsed:
+        return result
+
+    # همه آیتم‌های موجود فهرست بها با یک پرس‌وجو
+    existing = {
+        item.row_number: item
+        for item in PriceListItem.objects.filter(price_list=price_list)
+    }
+
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    for row_number, (excel_row, data) in parsed.items():
+        item = existing.get(row_number)
+        if item is None:
+            to_create.append(PriceListItem(
+                price_list=price_list,
+                row_number=row_number,
+                modified_by=user,
+                **data,
+            ))
+            continue
+
+        if all(getattr(item, field) == value for field, value in data.items()):
+            result.unchanged += 1
+            continue
+
+        for field, value in data.items():
+            setattr(item, field, value)
+        item.modified_by = user
+        item.updated_at = now
+        to_update.append(item)
+
+    with transaction.atomic():
+        if to_create:
+            bulk_create_with_history(
+                to_create, PriceListItem, batch_size=_batch_size(), default_user=user, default_date=now,
+            )
+        if to_update:
+            bulk_update_with_history(
+                to_update, PriceListItem, UPDATE_FIELDS + ['modified_by', 'updated_at'],
+                batch_size=_batch_size(), default_user=user, default_date=now,
+            )
+        if to_create or to_update:
+            # عملیات دسته‌ای سیگنال ذخیره ندارد؛ نسخه کاتالوگ یک بار جلو می‌رود
+            touch_catalog(price_list.pk)
+
+    result.created = len(to_create)
+    result.updated = len(to_update)
+    logger.info(
+        f"Price list {price_list.pk} import: {result.created} created, {result.updated} updated, "
+        f"{result.unchanged} unchanged, {len(result.errors)} errors"
+    )
+    return result
@@ -0,0 +1,53 @@
+# fehrestbaha/management/commands/backfill_unit_types.py
+from django.core.management.base import BaseCommand
+
+from fehrestbaha.models import PriceListItem
+from fehrestbaha.units import classify_unit
+
+
+class Command(BaseCommand):
+    help = 'تعیین نوع واحد (unit_type) آیتم‌های فهرست بها از روی واحد اندازه‌گیری'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            dest='reclassify',
+            help='بازبینی همه آیتم‌ها (پیش‌فرض: فقط آیتم‌های بدون نوع واحد)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='تعداد آیتم‌های هر دسته به‌روزرسانی',
+        )
+
+    def handle(self, *args, **options):
+        items = PriceListItem.objects.only('id', 'unit', 'unit_type').order_by('pk')
+        if not options['reclassify']:
+            items = items.filter(unit_type__isnull=True)
+
+        batch_size = options['batch_size']
+        checked = 0
+        changed = []
+        updated = 0
+        for item in items.iterator(chunk_size=batch_size):
+            checked += 1
+            unit_type = classify_unit(item.unit)
+            if item.unit_type != unit_type:
+                item.unit_type = unit_type
+                changed.append(item)
+            if len(changed) >= batch_size:
+                updated += PriceListItem.objects.bulk_update(changed, ['unit_type'])
+                changed = []
+
+        if changed:
+            updated += PriceListItem.objects.bulk_update(changed, ['unit_type'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{checked} آیتم بررسی و نوع واحد {updated} آیتم به‌روزرسانی شد'
+        ))
+        if updated:
+            self.stdout.write(self.style.WARNING(
+                'مقدار ذخیره‌شده آیتم‌های صورت جلسه را با دستور recalculate_item_quantities بازمحاسبه کنید'
+            ))
@@ -0,0 +1,18 @@
+"""
+Middleware that keeps resolved price list prices for the whole request
+"""
+from .pricing import memoized
+
+
+class PriceMemoMiddleware:
+    """
+    Resolve each price list item's unit price at most once per request
+    (see fehrestbaha.pricing)
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with memoized():
+            return self.get_response(request)
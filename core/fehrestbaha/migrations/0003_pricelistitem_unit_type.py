@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fehrestbaha', '0002_alter_historicalpricelist_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalpricelistitem',
+            name='unit_type',
+            field=models.CharField(blank=True, choices=[('area', 'سطح'), ('volume', 'حجم'), ('weight', 'وزن'), ('length', 'طول'), ('count', 'تعداد'), ('lump_sum', 'مقطوع')], help_text='هنگام ذخیره از روی واحد اندازه\u200cگیری تعیین می\u200cشود (دستور backfill_unit_types برای داده\u200cهای قدیمی)', max_length=10, null=True, verbose_name='نوع واحد'),
+        ),
+        migrations.AddField(
+            model_name='pricelistitem',
+            name='unit_type',
+            field=models.CharField(blank=True, choices=[('area', 'سطح'), ('volume', 'حجم'), ('weight', 'وزن'), ('length', 'طول'), ('count', 'تعداد'), ('lump_sum', 'مقطوع')], help_text='هنگام ذخیره از روی واحد اندازه\u200cگیری تعیین می\u200cشود (دستور backfill_unit_types برای داده\u200cهای قدیمی)', max_length=10, null=True, verbose_name='نوع واحد'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+from fehrestbaha.units import classify_unit
+
+BATCH_SIZE = 2000
+
+
+def backfill_unit_types(apps, schema_editor):
+    """
+    نوع واحد آیتم‌های موجود؛ بدون آن مقدار آیتم‌های صورت جلسه تعداد حساب می‌شود
+
+    دسته‌بندی فعلی بعضی واحدها (m2، m3، مترمکعب، lumpsum) با محاسبه قبلی فرق دارد؛
+    مقدار و مبلغ ذخیره‌شده آیتم‌های صورت جلسه و مجموع‌های پروژه با دستور
+    recalculate_item_quantities (sooratvaziat) بازمحاسبه می‌شوند.
+    """
+    PriceListItem = apps.get_model('fehrestbaha', 'PriceListItem')
+    items = PriceListItem.objects.filter(unit_type__isnull=True).only('id', 'unit').order_by('pk')
+
+    changed = []
+    for item in items.iterator(chunk_size=BATCH_SIZE):
+        item.unit_type = classify_unit(item.unit)
+        changed.append(item)
+        if len(changed) >= BATCH_SIZE:
+            PriceListItem.objects.bulk_update(changed, ['unit_type'])
+            changed = []
+
+    if changed:
+        PriceListItem.objects.bulk_update(changed, ['unit_type'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fehrestbaha', '0003_pricelistitem_unit_type'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_unit_types, migrations.RunPython.noop),
+    ]
@@ -4,7 +4,10 @@ from django.db import models
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from django.utils.translation import gettext_lazy as _
-from simple_history.models import HistoricalRecords
+from core.history import TrackedHistoricalRecords
+
+from .pricing import forget as forget_price
+from .units import UnitType, classify_unit
 
 class DisciplineChoices(models.TextChoices):
     # رشته‌های صورت وضعیت (می‌تونی اضافه کنی)
@@ -52,7 +55,7 @@ class PriceList(models.Model):
         blank=True, 
         verbose_name=_("ویرایش‌کننده")
     )
-    history = HistoricalRecords()
+    history = TrackedHistoricalRecords(ignore_fields=['updated_at'])
 
     class Meta:
         verbose_name = _("فهرست بها")
@@ -84,112 +87,56 @@ class PriceList(models.Model):
     def active_items_count(self):
         return self.items.filter(is_active=True).count()
     
+    # ستون‌های فایل خروجی (همان ستون‌هایی که import_from_excel می‌خواند)
+    EXPORT_HEADERS = ['شماره ردیف', 'شرح', 'قیمت واحد (ریال)', 'واحد', 'ستاره‌دار']
+    EXPORT_COLUMN_WIDTHS = [15, 50, 20, 15, 12]
+    EXPORT_CHUNK_SIZE = 2000
+
+    def export_filename(self, extension='xlsx'):
+        """نام فایل خروجی فهرست بها"""
+        return f"فهرست_بها_{self.discipline}_{self.year or 'بدون_سال'}.{extension}"
+
+    def iter_export_rows(self, chunk_size=EXPORT_CHUNK_SIZE):
+        """سطرهای خروجی آیتم‌های فعال، تکه‌تکه از پایگاه داده خوانده می‌شوند"""
+        items = self.items.filter(is_active=True).order_by('row_number').values_list(
+            'row_number', 'description', 'price', 'unit', 'is_starred'
+        )
+        for row_number, description, price, unit, is_starred in items.iterator(chunk_size=chunk_size):
+            yield [row_number, description, float(price), unit, 'بله' if is_starred else 'خیر']
+
     def export_to_excel(self):
-        """صادر کردن آیتم‌های فهرست بها به اکسل"""
-        items = self.items.filter(is_active=True).order_by('row_number')
-        
-        data = []
-        for item in items:
-            data.append({
-                'شماره ردیف': item.row_number,
-                'شرح': item.description,
-                'قیمت واحد (ریال)': float(item.price),
-                'واحد': item.unit,
-                'ستاره‌دار': 'بله' if item.is_starred else 'خیر'
-            })
-        
-        df = pd.DataFrame(data)
-        
-        # ایجاد نام فایل
-        filename = f"فهرست_بها_{self.discipline}_{self.year or 'بدون_سال'}.xlsx"
-        filepath = os.path.join(settings.MEDIA_ROOT, 'exports', filename)
-        
-        # اطمینان از وجود پوشه
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        
-        # ذخیره فایل اکسل
-        with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='فهرست بها', index=False)
-            
-            # تنظیمات ظاهری
-            workbook = writer.book
-            worksheet = writer.sheets['فهرست بها']
-            
-            # تنظیم عرض ستون‌ها
-            worksheet.column_dimensions['A'].width = 15
-            worksheet.column_dimensions['B'].width = 50
-            worksheet.column_dimensions['C'].width = 20
-            worksheet.column_dimensions['D'].width = 15
-            worksheet.column_dimensions['E'].width = 12
-        
-        return filepath, filename
+        """
+        workbook اکسل (write_only) آیتم‌های فهرست بها
+        سطرها هنگام ذخیره workbook به ترتیب نوشته می‌شوند و در حافظه جمع نمی‌شوند
+        """
+        from core.exports import new_workbook, append_table
+
+        wb = new_workbook()
+        append_table(wb, 'فهرست بها', self.iter_export_rows(),
+                     header=self.EXPORT_HEADERS, column_width=self.EXPORT_COLUMN_WIDTHS)
+        return wb
+
+    @classmethod
+    def create_sample_excel(cls):
+        """workbook نمونه برای ورود از اکسل"""
+        from core.exports import new_workbook, append_table
+
+        wb = new_workbook()
+        sample_rows = [
+            ['010101', 'نمونه شرح آیتم اول', 1500000, 'متر مربع', 'خیر'],
+            ['010102', 'نمونه شرح آیتم دوم', 250000, 'متر مکعب', 'بله'],
+        ]
+        append_table(wb, 'فهرست بها', sample_rows,
+                     header=cls.EXPORT_HEADERS, column_width=cls.EXPORT_COLUMN_WIDTHS)
+        return wb, 'نمونه_فهرست_بها.xlsx'
     
     @classmethod
     def import_from_excel(cls, file_path, price_list_instance, user):
-        """ورود داده از اکسل"""
-        try:
-            df = pd.read_excel(file_path)
-            
-            required_columns = ['شماره ردیف', 'شرح', 'قیمت واحد (ریال)', 'واحد']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
-                return False, f"ستون‌های ضروری وجود ندارند: {', '.join(missing_columns)}"
-            
-            success_count = 0
-            error_count = 0
-            errors = []
-            
-            with transaction.atomic():
-                for index, row in df.iterrows():
-                    try:
-                        row_number = str(row['شماره ردیف']).strip()
-                        description = str(row['شرح']).strip()
-                        price = float(row['قیمت واحد (ریال)'])
-                        unit = str(row['واحد']).strip()
-                        
-                        # بررسی وجود ستون ستاره‌دار
-                        is_starred = False
-                        if 'ستاره‌دار' in df.columns:
-                            starred_value = str(row['ستاره‌دار']).strip().lower()
-                            is_starred = starred_value in ['بله', 'yes', 'true', '1', '✓']
-                        
-                        # ایجاد یا به‌روزرسانی آیتم
-                        item, created = PriceListItem.objects.get_or_create(
-                            price_list=price_list_instance,
-                            row_number=row_number,
-                            defaults={
-                                'description': description,
-                                'price': price,
-                                'unit': unit,
-                                'is_starred': is_starred,
-                                'modified_by': user
-                            }
-                        )
-                        
-                        if not created:
-                            # به‌روزرسانی آیتم موجود
-                            item.description = description
-                            item.price = price
-                            item.unit = unit
-                            item.is_starred = is_starred
-                            item.modified_by = user
-                            item.save()
-                        
-                        success_count += 1
-                        
-                    except Exception as e:
-                        error_count += 1
-                        errors.append(f"خطا در ردیف {index + 2}: {str(e)}")
-            
-            message = f"عملیات وارد کردن کامل شد. {success_count} آیتم موفق، {error_count} آیتم ناموفق"
-            if errors:
-                message += f"\nخطاها: {'; '.join(errors[:5])}"  # فقط 5 خطای اول
-            
-            return True, message
-            
-        except Exception as e:
-            return False, f"خطا در خواندن فایل اکسل: {str(e)}"
+        """ورود داده از اکسل (ورود دسته‌ای با fehrestbaha.importers)"""
+        from .importers import import_price_list_items
+
+        result = import_price_list_items(file_path, price_list_instance, user)
+        return result.success, result.message
                 
     @property
     def total_items_price(self):
@@ -226,6 +173,14 @@ class PriceListItem(models.Model):
         verbose_name=_("واحد اندازه‌گیری"),
         help_text=_("واحد اندازه‌گیری (مثال: متر مربع، متر مکعب)")
     )
+    unit_type = models.CharField(
+        max_length=10,
+        choices=UnitType.choices,
+        null=True,
+        blank=True,
+        verbose_name=_("نوع واحد"),
+        help_text=_("هنگام ذخیره از روی واحد اندازه‌گیری تعیین می‌شود (دستور backfill_unit_types برای داده‌های قدیمی)")
+    )
     is_starred = models.BooleanField(
         default=False,
         verbose_name=_("ستاره‌دار"),
@@ -252,7 +207,7 @@ class PriceListItem(models.Model):
         blank=True, 
         verbose_name=_("ویرایش‌کننده")
     )
-    history = HistoricalRecords()
+    history = TrackedHistoricalRecords(ignore_fields=['updated_at'])
 
     class Meta:
         verbose_name = _("آیتم فهرست بها")
@@ -268,6 +223,16 @@ class PriceListItem(models.Model):
     def __str__(self):
         return f"{self.row_number} - {self.description[:50]}..."
 
+    def save(self, *args, **kwargs):
+        """ذخیره با تعیین نوع واحد از روی واحد اندازه‌گیری"""
+        self.unit_type = classify_unit(self.unit)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'unit' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'unit_type'}
+        super().save(*args, **kwargs)
+        # قیمت قبلی این آیتم در حافظه درخواست دیگر معتبر نیست
+        forget_price(self.pk)
+
     @property
     def discipline_choice(self):
         """دسترسی به رشته از طریق فهرست بها"""
@@ -0,0 +1,120 @@
+# fehrestbaha/pricing.py
+"""
+تعیین قیمت واحد آیتم‌های فهرست بها در یک جا
+
+- قیمت از اولین فیلد مقداردار PRICE_FIELDS خوانده و به Decimal دو رقم اعشار تبدیل می‌شود
+- داخل یک محدوده memoized() (برای هر درخواست با PriceMemoMiddleware) قیمت هر
+  آیتم با شناسه آن نگه داشته می‌شود و دوباره محاسبه یا از پایگاه داده خوانده نمی‌شود
+- resolve_prices قیمت مجموعه‌ای از آیتم‌ها (یا شناسه‌ها) را با حداکثر یک پرس‌وجو برمی‌گرداند
+- بیرون از محدوده، قیمت هر بار از خود آیتم محاسبه می‌شود (شناسه‌ها با پرس‌وجو)
+"""
+import threading
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+
+# فیلدهای قیمت به ترتیب اولویت (سازگار با کدهای قدیمی)
+PRICE_FIELDS = ('price', 'unit_price', 'rate', 'baha')
+
+ZERO_PRICE = Decimal('0.00')
+
+_local = threading.local()
+
+
+def _state():
+    if not hasattr(_local, 'prices'):
+        _local.prices = {}
+        _local.depth = 0
+    return _local
+
+
+@contextmanager
+def memoized():
+    """نگهداری قیمت‌های تعیین‌شده تا پایان محدوده (قابل تودرتو)"""
+    state = _state()
+    state.depth += 1
+    try:
+        yield
+    finally:
+        state.depth -= 1
+        if state.depth == 0:
+            state.prices.clear()
+
+
+def _memo():
+    state = _state()
+    return state.prices if state.depth else None
+
+
+def price_value(item):
+    """قیمت واحد یک شیء (PriceListItem یا مشابه آن) از روی PRICE_FIELDS"""
+    if item is None:
+        return ZERO_PRICE
+    for field in PRICE_FIELDS:
+        value = getattr(item, field, None)
+        if value is not None:
+            try:
+                return Decimal(str(value)).quantize(ZERO_PRICE)
+            except (InvalidOperation, ValueError, TypeError):
+                continue
+    return ZERO_PRICE
+
+
+def resolve_price(item):
+    """قیمت واحد یک آیتم فهرست بها (شیء یا شناسه)"""
+    if item is None:
+        return ZERO_PRICE
+    return resolve_prices([item]).get(getattr(item, 'pk', item), ZERO_PRICE)
+
+
+def resolve_prices(items):
+    """
+    قیمت واحد چند آیتم فهرست بها (اشیاء یا شناسه‌ها)
+    خروجی: {شناسه: قیمت}؛ شناسه‌های ناموجود در پایگاه داده در خروجی نیستند
+    """
+    memo = _memo()
+    prices = {}
+    missing = set()
+
+    for item in items:
+        if item is None:
+            continue
+        if hasattr(item, 'pk'):
+            prices[item.pk] = price_value(item)
+            if memo is not None and item.pk is not None:
+                memo[item.pk] = prices[item.pk]
+        elif memo is not None and item in memo:
+            prices[item] = memo[item]
+        else:
+            missing.add(item)
+
+    if missing:
+        from .models import PriceListItem
+
+        for pk, price in PriceListItem.objects.filter(pk__in=missing).values_list('pk', 'price'):
+            prices[pk] = Decimal(str(price)).quantize(ZERO_PRICE) if price is not None else ZERO_PRICE
+            if memo is not None:
+                memo[pk] = prices[pk]
+
+    return prices
+
+
+def forget(pk=None):
+    """حذف قیمت نگه‌داشته‌شده یک آیتم (یا همه آیتم‌ها) از حافظه محدوده فعلی"""
+    memo = _memo()
+    if memo is None:
+        return
+    if pk is None:
+        memo.clear()
+    else:
+        memo.pop(pk, None)
+
+
+def resolve_related_price(instance, field_name):
+    """
+    قیمت آیتم فهرست بهای مرتبط با یک شیء (مثلاً pricelist_item آیتم صورت جلسه)
+    اگر رابطه هنوز بارگذاری نشده باشد فقط با شناسه و از حافظه محدوده تعیین می‌شود
+    """
+    field = instance._meta.get_field(field_name)
+    if field.is_cached(instance):
+        return resolve_price(getattr(instance, field_name))
+    return resolve_price(getattr(instance, field.attname))
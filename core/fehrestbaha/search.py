@@ -0,0 +1,203 @@
+# fehrestbaha/search.py
+"""
+جستجوی سمت سرور در آیتم‌های فهرست بها (شماره ردیف و شرح)
+
+برای هر فهرست بها یک ایندکس توکنی در حافظه ساخته می‌شود:
+- متن‌ها نرمال می‌شوند (ی/ي، ک/ك، نیم‌فاصله، اعراب و ارقام فارسی/عربی)
+- هر توکن جستجو با پیشوند واژه‌های ایندکس تطبیق داده می‌شود و اگر چیزی پیدا
+  نشود، با نزدیک‌ترین واژه‌ها (difflib) به صورت تقریبی
+- نتیجه همه توکن‌ها اشتراک گرفته می‌شود (AND)
+
+ایندکس با نسخه کاتالوگ فهرست بها (fehrestbaha.catalog.catalog_version) کلید می‌خورد؛
+ذخیره آیتم‌ها و ورود دسته‌ای آن را جلو می‌برند، پس ایندکس خودبه‌خود دوباره ساخته می‌شود. حداکثر PRICELIST_SEARCH_INDEXES
+ایندکس (پیش‌فرض 16) در هر پردازه نگه داشته می‌شود.
+"""
+import difflib
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .catalog import catalog_version
+from .models import PriceListItem
+
+# جایگزینی حروف عربی با فارسی و ارقام با ارقام لاتین
+_CHAR_MAP = str.maketrans({
+    'ي': 'ی',
+    'ى': 'ی',
+    'ك': 'ک',
+    'ۀ': 'ه',
+    'ة': 'ه',
+    'أ': 'ا',
+    'إ': 'ا',
+    'ٱ': 'ا',
+    **{chr(0x06F0 + i): str(i) for i in range(10)},  # ارقام فارسی
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # ارقام عربی
+})
+
+# نیم‌فاصله و اتصال‌دهنده‌ها حذف می‌شوند تا «می‌شود» و «میشود» یکی باشند؛ اعراب و کشیده هم حذف می‌شوند
+_STRIP_RE = re.compile('[\u200c\u200d\u200e\u200f\u0640\u064b-\u065f\u0670]')
+_TOKEN_RE = re.compile(r'\w+')
+
+# حداقل طول توکن برای تطبیق تقریبی و حد شباهت difflib
+FUZZY_MIN_LENGTH = 3
+FUZZY_CUTOFF = 0.75
+FUZZY_MAX_WORDS = 5
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def normalize(text):
+    """نرمال‌سازی متن فارسی برای ایندکس و جستجو"""
+    if not text:
+        return ''
+    text = str(text).translate(_CHAR_MAP)
+    return _STRIP_RE.sub('', text).lower()
+
+
+def tokenize(text):
+    """توکن‌های نرمال‌شده متن"""
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def index_tokens(text):
+    """
+    توکن‌های ایندکس: هم شکل چسبیده و هم اجزای جدا شده با نیم‌فاصله
+    تا «بتن‌ریزی»، «بتنریزی» و «بتن ریزی» همگی پیدا شوند
+    """
+    if not text:
+        return frozenset()
+    return frozenset(tokenize(text)) | frozenset(tokenize(str(text).replace('\u200c', ' ')))
+
+
+class PriceListIndex:
+    """ایندکس توکنی آیتم‌های فعال یک فهرست بها"""
+
+    FIELDS = ('id', 'row_number', 'description', 'unit', 'price', 'is_starred')
+
+    def __init__(self, items):
+        self.items = list(items)
+        self.postings = {}
+        self.row_numbers = []
+        self.words = []
+
+        for position, item in enumerate(self.items):
+            row_number = normalize(item['row_number'])
+            words = index_tokens(item['description'])
+            self.row_numbers.append(row_number)
+            self.words.append(words)
+            for token in words | {row_number}:
+                if token:
+                    self.postings.setdefault(token, set()).add(position)
+
+        self.vocabulary = sorted(self.postings)
+
+    def _prefix_words(self, token):
+        start = bisect_left(self.vocabulary, token)
+        words = []
+        for word in self.vocabulary[start:]:
+            if not word.startswith(token):
+                break
+            words.append(word)
+        return words
+
+    def _match(self, token, fuzzy):
+        """موقعیت آیتم‌های منطبق با یک توکن و اینکه تطبیق تقریبی بوده یا نه"""
+        words = self._prefix_words(token)
+        approximate = False
+        if not words and fuzzy and len(token) >= FUZZY_MIN_LENGTH and not token.isdigit():
+            words = difflib.get_close_matches(token, self.vocabulary, n=FUZZY_MAX_WORDS, cutoff=FUZZY_CUTOFF)
+            approximate = True
+
+        positions = set()
+        for word in words:
+            positions |= self.postings[word]
+        return positions, approximate
+
+    def search(self, query, fuzzy=True):
+        """
+        آیتم‌های منطبق به ترتیب مرتبط بودن
+        ابتدا شماره ردیف دقیق، سپس پیشوند شماره ردیف، سپس تطبیق دقیق، و در آخر تقریبی
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return list(self.items)
+
+        matched = None
+        approximate = False
+        for token in tokens:
+            positions, fuzzy_hit = self._match(token, fuzzy)
+            approximate = approximate or fuzzy_hit
+            matched = positions if matched is None else matched & positions
+            if not matched:
+                return []
+
+        query_row = normalize(query).strip()
+        exact_words = set(tokens)
+
+        def rank(position):
+            row_number = self.row_numbers[position]
+            return (
+                row_number != query_row,
+                not row_number.startswith(tokens[0]),
+                approximate,
+                -len(exact_words & self.words[position]),
+                row_number,
+            )
+
+        return [self.items[position] for position in sorted(matched, key=rank)]
+
+
+def index_version(price_list_id):
+    """نسخه داده آیتم‌های یک فهرست بها (برای کلید ایندکس)؛ همان نسخه کاتالوگ فهرست بها"""
+    return catalog_version(price_list_id) or ''
+
+
+def get_index(price_list_id, version=None):
+    """ایندکس فهرست بها از کش پردازه؛ در صورت تغییر نسخه دوباره ساخته می‌شود"""
+    if version is None:
+        version = index_version(price_list_id)
+    key = (int(price_list_id), version)
+
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+
+    items = PriceListItem.objects.filter(
+        price_list_id=price_list_id, is_active=True
+    ).order_by('row_number', 'id').values(*PriceListIndex.FIELDS)
+    index = PriceListIndex(items)
+
+    with _indexes_lock:
+        # نسخه‌های قدیمی همین فهرست بها دیگر لازم نیستند
+        for old_key in [k for k in _indexes if k[0] == key[0]]:
+            del _indexes[old_key]
+        _indexes[key] = index
+        while len(_indexes) > getattr(settings, 'PRICELIST_SEARCH_INDEXES', 16):
+            _indexes.popitem(last=False)
+    return index
+
+
+def search_items(price_list_id, query, page=1, page_size=20, fuzzy=True, version=None):
+    """
+    جستجوی صفحه‌بندی‌شده در آیتم‌های فعال فهرست بها
+    خروجی: دیکشنری شامل results، count، page، num_pages و has_next
+    """
+    results = get_index(price_list_id, version=version).search(query, fuzzy=fuzzy)
+    count = len(results)
+    num_pages = max(1, -(-count // page_size))
+    page = min(max(1, page), num_pages)
+    start = (page - 1) * page_size
+
+    return {
+        'results': results[start:start + page_size],
+        'count': count,
+        'page': page,
+        'num_pages': num_pages,
+        'has_next': page < num_pages,
+    }
@@ -0,0 +1,24 @@
+# fehrestbaha/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import invalidate, touch
+from .models import PriceList, PriceListItem
+
+
+@receiver(post_save, sender=PriceList)
+@receiver(post_delete, sender=PriceList)
+def invalidate_price_list_catalog(sender, instance, **kwargs):
+    """
+    حذف کاتالوگ فهرست بها پس از تغییر آن (updated_at خودش جلو می‌رود)
+    """
+    invalidate(instance.pk)
+
+
+@receiver(post_save, sender=PriceListItem)
+@receiver(post_delete, sender=PriceListItem)
+def touch_price_list_catalog(sender, instance, **kwargs):
+    """
+    تغییر آیتم نسخه کاتالوگ فهرست بهای آن را در همه پردازه‌ها عوض می‌کند
+    """
+    touch(instance.price_list_id)
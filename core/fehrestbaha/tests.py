@@ -1,3 +1,252 @@
-from django.test import TestCase
+import csv
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from openpyxl import Workbook, load_workbook
+
+from core.exports import XLSX_CONTENT_TYPE
+
+from .catalog import find_items
+from .importers import import_price_list_items
+from .middleware import PriceMemoMiddleware
+from .models import DisciplineChoices, PriceList, PriceListItem
+from .pricing import memoized, resolve_price, resolve_prices
+from .search import search_items
+from .units import UnitType, classify_unit, unit_type_expression
+
+
+class PriceListTestMixin:
+    """فهرست بها نمونه برای تست‌ها"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.price_list = PriceList.objects.create(
+            discipline_choice=DisciplineChoices.ABANIE, discipline='ابنیه ۱۴۰۳', year=1403
+        )
+
+    def create_item(self, row_number, description, unit='عدد', price=Decimal('1000')):
+        return PriceListItem.objects.create(
+            price_list=self.price_list, row_number=row_number, description=description,
+            price=price, unit=unit,
+        )
+
+
+class UnitTypeBackfillTests(PriceListTestMixin, TestCase):
+
+    def test_migration_classifies_existing_items(self):
+        volume = self.create_item('010101', 'بتن', unit='متر مکعب')
+        area = self.create_item('010102', 'اندود', unit='m2')
+        PriceListItem.objects.update(unit_type=None)
+
+        migration = import_module('fehrestbaha.migrations.0004_backfill_pricelistitem_unit_type')
+        migration.backfill_unit_types(apps, None)
+
+        self.assertEqual(
+            dict(PriceListItem.objects.values_list('pk', 'unit_type')),
+            {volume.pk: UnitType.VOLUME, area.pk: UnitType.AREA},
+        )
+
+
+class UnitTypeExpressionTests(PriceListTestMixin, TestCase):
+
+    def test_matches_classify_unit(self):
+        units = ['متر مربع', 'مترمكعب', 'M3', 'm²', 'کیلو\u200cگرم', 'kg', 'متر طول', 'عدد', 'LS', 'مقطوع', 'دستگاه', '']
+        for number, unit in enumerate(units):
+            self.create_item(f'0101{number:02d}', unit or 'بدون واحد', unit=unit)
+
+        annotated = PriceListItem.objects.annotate(sql_unit_type=unit_type_expression())
+        self.assertEqual(
+            {item.unit: item.sql_unit_type for item in annotated},
+            {unit: classify_unit(unit) for unit in units},
+        )
+
+
+class SearchIndexTests(PriceListTestMixin, TestCase):
+
+    def setUp(self):
+        self.concrete = self.create_item('010101', 'بتن ريزي با عيار ۳۵۰')
+        self.formwork = self.create_item('010102', 'قالب\u200cبندی فلزی')
+        self.lean = self.create_item('020101', 'بتن مگر')
+
+    def found(self, query, **options):
+        return [item['id'] for item in search_items(self.price_list.pk, query, **options)['results']]
+
+    def test_normalized_and_ranked_matches(self):
+        self.assertEqual(self.found('ریزی 350'), [self.concrete.pk])
+        self.assertEqual(self.found('قالب بندی'), [self.formwork.pk])
+        self.assertEqual(self.found('قالببندی'), [self.formwork.pk])
+        self.assertEqual(self.found('بتن'), [self.concrete.pk, self.lean.pk])
+        self.assertEqual(self.found('010102'), [self.formwork.pk])
+        self.assertEqual(self.found('0101'), [self.concrete.pk, self.formwork.pk])
+
+    def test_fuzzy_match_is_optional(self):
+        self.assertEqual(self.found('قالبندی'), [self.formwork.pk])
+        self.assertEqual(self.found('قالبندی', fuzzy=False), [])
+
+    def test_index_follows_item_changes(self):
+        self.assertEqual(self.found('آرماتور'), [])
+
+        self.lean.description = 'آرماتور بندی'
+        self.lean.save()
+        self.assertEqual(self.found('آرماتور'), [self.lean.pk])
+
+        self.lean.is_active = False
+        self.lean.save()
+        self.assertEqual(self.found('آرماتور'), [])
+
+    def test_pagination(self):
+        data = search_items(self.price_list.pk, '', page=5, page_size=2)
+        self.assertEqual((data['count'], data['num_pages'], data['page'], data['has_next']), (3, 2, 2, False))
+        self.assertEqual([item['id'] for item in data['results']], [self.lean.pk])
+
+
+class CatalogPriceTests(PriceListTestMixin, TestCase):
+
+    def test_catalog_keeps_two_decimal_prices(self):
+        item = self.create_item('010101', 'بتن', price=Decimal('1234.56'))
+
+        catalog_item = find_items([item.pk], [self.price_list.pk])[item.pk]
+        self.assertEqual(catalog_item.price, Decimal('1234.56'))
+
+        with memoized():
+            self.assertEqual(resolve_prices([catalog_item]), {item.pk: Decimal('1234.56')})
+            # قیمت کاتالوگ در حافظه درخواست با قیمت خود آیتم یکی است
+            self.assertEqual(resolve_price(item.pk), resolve_price(item))
+
+
+class ImportPriceListTests(PriceListTestMixin, TestCase):
+
+    def write_workbook(self, rows, header=('شماره ردیف', 'شرح', 'واحد', 'قیمت واحد (ریال)', 'ستاره‌دار')):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(header)
+        for row in rows:
+            sheet.append(row)
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'price_list.xlsx'
+        workbook.save(path)
+        return path
+
+    def test_upsert_counts_created_updated_unchanged_and_errors(self):
+        unchanged = self.create_item('010101', 'بتن', unit='متر مکعب', price=Decimal('1000'))
+        changed = self.create_item('010102', 'اندود', unit='متر مربع', price=Decimal('500'))
+        path = self.write_workbook([
+            ['010101', 'بتن', 'متر مکعب', 1000, None],
+            ['010102', 'اندود', 'متر مربع', '650.5', 'بله'],
+            ['010103', 'میلگرد', 'کیلوگرم', '1,200', None],
+            ['010104', None, 'عدد', 100, None],
+            ['010103', 'تکراری', 'عدد', 100, None],
+        ])
+
+        result = import_price_list_items(path, self.price_list)
+
+        self.assertTrue(result.success)
+        self.assertEqual((result.created, result.updated, result.unchanged), (1, 1, 1))
+        self.assertEqual([row for row, _ in result.errors], [5, 6])
+        self.assertIn('3 آیتم موفق (1 جدید، 1 به‌روزرسانی، 1 بدون تغییر)، 2 آیتم ناموفق', result.message)
+
+        changed.refresh_from_db()
+        self.assertEqual((changed.price, changed.is_starred), (Decimal('650.50'), True))
+        created = PriceListItem.objects.get(price_list=self.price_list, row_number='010103')
+        self.assertEqual((created.price, created.unit_type), (Decimal('1200.00'), UnitType.WEIGHT))
+        self.assertEqual((changed.history.count(), created.history.count()), (2, 1))
+        self.assertEqual(unchanged.history.count(), 1)
+
+        # ورود دوباره همان فایل چیزی نمی‌نویسد
+        result = import_price_list_items(path, self.price_list)
+        self.assertEqual((result.created, result.updated, result.unchanged), (0, 0, 3))
+
+    def test_missing_columns_are_fatal(self):
+        path = self.write_workbook([['010101', 'بتن']], header=('شماره ردیف', 'شرح'))
+
+        result = import_price_list_items(path, self.price_list)
+
+        self.assertFalse(result.success)
+        self.assertIn('قیمت واحد (ریال)', result.message)
+        self.assertFalse(PriceListItem.objects.exists())
+
+
+class PriceListExportTests(PriceListTestMixin, TestCase):
+
+    def setUp(self):
+        self.create_item('010102', 'اندود', unit='متر مربع', price=Decimal('650.50'))
+        self.create_item('010101', 'بتن', unit='متر مکعب')
+        PriceListItem.objects.filter(pk=self.create_item('010103', 'حذف‌شده').pk).update(is_active=False)
+        self.client.force_login(User.objects.create_superuser('admin', password='secret'))
+
+    def run_action(self, action):
+        return self.client.post(reverse('admin:fehrestbaha_pricelist_changelist'), {
+            'action': action, '_selected_action': [self.price_list.pk],
+        })
+
+    def test_csv_export_is_streamed_in_row_order(self):
+        response = self.run_action('export_to_csv')
+
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], PriceList.EXPORT_HEADERS)
+        self.assertEqual([row[0] for row in rows[1:]], ['010101', '010102'])
+        self.assertEqual(rows[2], ['010102', 'اندود', '650.5', 'متر مربع', 'خیر'])
+
+    def test_excel_export_can_be_imported_back(self):
+        response = self.run_action('export_to_excel')
+        self.assertEqual(response['Content-Type'], XLSX_CONTENT_TYPE)
+
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'export.xlsx'
+        path.write_bytes(b''.join(response.streaming_content))
+
+        self.assertEqual(
+            [row[0] for row in load_workbook(path, read_only=True).active.iter_rows(min_row=2, values_only=True)],
+            ['010101', '010102'],
+        )
+        result = import_price_list_items(path, self.price_list)
+        self.assertEqual((result.created, result.updated, result.unchanged, result.errors), (0, 0, 2, []))
+
+
+class PriceMemoTests(PriceListTestMixin, TestCase):
+
+    def setUp(self):
+        self.item = self.create_item('010101', 'بتن', price=Decimal('1000'))
+
+    def test_prices_are_kept_for_one_request(self):
+        expected = Decimal('1000.00')
+
+        def view(request):
+            # یک پرس‌وجو برای هر آیتم در کل درخواست
+            with self.assertNumQueries(1):
+                self.assertEqual(resolve_prices([self.item.pk]), {self.item.pk: expected})
+                self.assertEqual(resolve_price(self.item.pk), expected)
+            return HttpResponse()
+
+        middleware = PriceMemoMiddleware(view)
+        middleware(RequestFactory().get('/'))
+
+        # حافظه با پایان درخواست خالی می‌شود و درخواست بعدی قیمت تازه را می‌خواند
+        PriceListItem.objects.filter(pk=self.item.pk).update(price=Decimal('1100'))
+        expected = Decimal('1100.00')
+        middleware(RequestFactory().get('/'))
+
+    def test_nested_scopes_and_saved_items(self):
+        with memoized():
+            with memoized():
+                resolve_price(self.item.pk)
+            # خروج از محدوده داخلی حافظه درخواست را پاک نمی‌کند
+            with self.assertNumQueries(0):
+                self.assertEqual(resolve_price(self.item.pk), Decimal('1000.00'))
+
+            # ذخیره آیتم قیمت نگه‌داشته‌شده آن را کنار می‌گذارد
+            self.item.price = Decimal('1250.50')
+            self.item.save()
+            PriceListItem.objects.filter(pk=self.item.pk).update(price=Decimal('1300'))
+            self.assertEqual(resolve_price(self.item.pk), Decimal('1300.00'))
@@ -0,0 +1,71 @@
+# fehrestbaha/units.py
+"""
+دسته‌بندی واحد اندازه‌گیری آیتم‌های فهرست بها
+
+واحد متنی (مثلاً «متر مربع» یا «m³») یک بار هنگام ذخیره PriceListItem به
+UnitType تبدیل و در فیلد unit_type نگه داشته می‌شود؛ محاسبه مقدار آیتم‌های
+صورت جلسه فقط از جدول QUANTITY_DIMENSIONS استفاده می‌کند. برای ردیف‌هایی که
+هنوز unit_type ندارند، unit_type_expression همان دسته‌بندی را در SQL انجام می‌دهد.
+"""
+from django.db import models
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Coalesce, Lower, Replace
+from django.db.models.lookups import Contains, Exact
+
+
+class UnitType(models.TextChoices):
+    AREA = 'area', 'سطح'
+    VOLUME = 'volume', 'حجم'
+    WEIGHT = 'weight', 'وزن'
+    LENGTH = 'length', 'طول'
+    COUNT = 'count', 'تعداد'
+    LUMP_SUM = 'lump_sum', 'مقطوع'
+
+
+# ابعادی از آیتم صورت جلسه که در تعداد ضرب می‌شوند
+QUANTITY_DIMENSIONS = {
+    UnitType.AREA: ('length', 'width'),
+    UnitType.VOLUME: ('length', 'width', 'height'),
+    UnitType.WEIGHT: ('weight',),
+    UnitType.LENGTH: ('length',),
+    UnitType.COUNT: (),
+    UnitType.LUMP_SUM: (),
+}
+
+# الگوها به ترتیب بررسی می‌شوند (واحدهای ترکیبی مثل «متر مربع» قبل از «متر»)
+_UNIT_PATTERNS = (
+    (UnitType.LUMP_SUM, ('مقطوع', 'lumpsum')),
+    (UnitType.AREA, ('مترمربع', 'm²', 'm2')),
+    (UnitType.VOLUME, ('مترمکعب', 'm³', 'm3')),
+    (UnitType.WEIGHT, ('کیلوگرم', 'kg')),
+    (UnitType.LENGTH, ('متر', 'm')),
+    (UnitType.COUNT, ('عدد', 'ea')),
+)
+
+# واحدهای کوتاهی که فقط به صورت کامل معنا دارند
+_EXACT_UNITS = {'ls': UnitType.LUMP_SUM}
+
+_CHAR_MAP = str.maketrans({'ي': 'ی', 'ك': 'ک', '\u200c': None, ' ': None})
+
+
+def classify_unit(unit):
+    """UnitType متناظر با واحد متنی؛ واحد ناشناخته تعداد حساب می‌شود"""
+    text = (unit or '').strip().lower().translate(_CHAR_MAP)
+    if text in _EXACT_UNITS:
+        return _EXACT_UNITS[text]
+    for unit_type, patterns in _UNIT_PATTERNS:
+        if any(pattern in text for pattern in patterns):
+            return unit_type
+    return UnitType.COUNT
+
+
+def unit_type_expression(unit_field='unit'):
+    """نسخه SQL تابع classify_unit روی فیلد واحد متنی (با همان ترتیب الگوها)"""
+    text = Lower(Coalesce(F(unit_field), Value('')))
+    for char, replacement in _CHAR_MAP.items():
+        text = Replace(text, Value(chr(char)), Value(replacement or ''))
+
+    whens = [When(Exact(text, unit), then=Value(unit_type.value)) for unit, unit_type in _EXACT_UNITS.items()]
+    for unit_type, patterns in _UNIT_PATTERNS:
+        whens.extend(When(Contains(text, pattern), then=Value(unit_type.value)) for pattern in patterns)
+    return Case(*whens, default=Value(UnitType.COUNT.value), output_field=models.CharField())
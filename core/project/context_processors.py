@@ -1,14 +1,48 @@
 # project/context_processors.py
+from django.utils.functional import SimpleLazyObject, cached_property
+
+from accounts.permissions import permissions_for
+
+
+class UserRoles:
+    """
+    نقش‌های سیستمی کاربر، فقط وقتی قالب به آن‌ها دسترسی پیدا کند بارگذاری می‌شود
+
+    نقش‌ها از PermissionResolver همان درخواست (accounts.permissions.permissions_for)
+    خوانده می‌شوند؛ پس با بررسی‌های دسترسی view یک بار بارگذاری و با همان سیگنال‌ها باطل می‌شوند.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    @cached_property
+    def roles(self):
+        return permissions_for(self.request.user).roles
+
+    def __iter__(self):
+        return iter(sorted(self.roles))
+
+    def __len__(self):
+        return len(self.roles)
+
+    def __contains__(self, role):
+        return role in self.roles
+
+    def has(self, role):
+        return role in self.roles
+
+
 def user_roles(request):
     """
-    اضافه کردن نقش‌های کاربر به context
+    اضافه کردن نقش‌های کاربر به context (بدون پرس‌وجو تا زمان استفاده در قالب)
     """
     if request.user.is_authenticated:
+        roles = UserRoles(request)
         return {
-            'user_roles': request.user.roles.filter(is_active=True).values_list('role', flat=True),
-            'is_contractor': request.user.roles.filter(role='contractor', is_active=True).exists(),
-            'is_project_manager': request.user.roles.filter(role='project_manager', is_active=True).exists(),
-            'is_employer': request.user.roles.filter(role='employer', is_active=True).exists(),
-            'is_admin': request.user.is_superuser or request.user.roles.filter(role='admin', is_active=True).exists(),
+            'user_roles': roles,
+            'is_contractor': SimpleLazyObject(lambda: roles.has('contractor')),
+            'is_project_manager': SimpleLazyObject(lambda: roles.has('project_manager')),
+            'is_employer': SimpleLazyObject(lambda: roles.has('employer')),
+            'is_admin': SimpleLazyObject(lambda: request.user.is_superuser or roles.has('admin')),
         }
-    return {}
\ No newline at end of file
+    return {}
@@ -2,7 +2,7 @@
 from django.http import HttpResponseForbidden
 from django.contrib.auth.decorators import user_passes_test
 from functools import wraps
-from accounts.models import ProjectUser
+from accounts.permissions import permissions_for
 
 def project_access_required(required_roles=None, allow_superuser=True):
     """
@@ -43,10 +43,6 @@ def role_required(roles, allow_superuser=True):
             return True
         
         # بررسی نقش در پروژه‌ها
-        return ProjectUser.objects.filter(
-            user=user,
-            role__name__in=roles,
-            is_active=True
-        ).exists()
+        return permissions_for(user).has_any_project_role(roles)
     
     return user_passes_test(check_roles)
\ No newline at end of file
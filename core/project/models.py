@@ -2,7 +2,7 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from fehrestbaha.models import DisciplineChoices
-from simple_history.models import HistoricalRecords  # اگر django-simple-history نصب کردی
+from core.history import TrackedHistoricalRecords
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 
@@ -217,7 +217,7 @@ class Project(models.Model):
     )
     
     # تاریخچه تغییرات
-    history = HistoricalRecords(
+    history = TrackedHistoricalRecords(
         excluded_fields=['updated_at', 'is_active', 'deleted_at']
     )
 
@@ -278,42 +278,24 @@ class Project(models.Model):
         بررسی دسترسی کاربر به پروژه
         required_roles: لیست نقش‌های مورد نیاز (اختیاری)
         """
-        if user.is_superuser:
-            return True
-            
-        if required_roles is None:
-            required_roles = ['contractor', 'project_manager', 'employer', 'supervisor']
-        
-        # بررسی آیا کاربر در این پروژه نقشی دارد
-        return self.project_users.filter(
-            user=user, 
-            role__in=required_roles,
-            is_active=True
-        ).exists()
+        from accounts.permissions import permissions_for
+
+        # نقش‌های کاربر یک بار در هر درخواست خوانده می‌شوند
+        return permissions_for(user).has_project_access(self, required_roles)
     
     def can_edit(self, user):
         """آیا کاربر می‌تواند پروژه را ویرایش کند؟"""
-        if user.is_superuser:
-            return True
-            
+        from accounts.permissions import permissions_for
+
         # پیمانکار و مدیر طرح می‌توانند ویرایش کنند
-        return self.project_users.filter(
-            user=user,
-            role__in=['contractor', 'project_manager'],
-            is_active=True
-        ).exists()    
+        return permissions_for(user).can_edit_project(self)
     
     def can_edit_measurements(self, user):
         """آیا کاربر می‌تواند متره را ویرایش کند؟"""
-        if user.is_superuser:
-            return True
-            
-        user_assignment = self.project_users.filter(
-            user=user,
-            is_active=True
-        ).first()
-        
-        return user_assignment and user_assignment.role.can_edit_measurements
+        from accounts.permissions import permissions_for
+
+        # مجوز از تعریف نقش (ProjectRole.can_edit_measurements) خوانده می‌شود
+        return permissions_for(user).can_edit_measurements(self)
     
     @property
     def is_soft_deleted(self):
@@ -445,7 +427,7 @@ class StatusReport(models.Model):
         verbose_name=_("ویرایش‌کننده")
     )
     
-    history = HistoricalRecords()
+    history = TrackedHistoricalRecords(ignore_fields=['updated_at'])
 
     class Meta:
         verbose_name = _("صورت وضعیت")
@@ -1,3 +1,62 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from core.pagination import KeysetPaginator
+
+from .models import Project
+
+
+class KeysetPaginationTests(TestCase):
+    """صفحه‌بندی keyset فهرست پروژه‌ها (ترتیب مختلط نزولی/صعودی)"""
+
+    ordering = ('-execution_year', 'project_code', 'id')
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('tester', password='secret')
+        for number, year in enumerate([1403, 1402, 1403, 1401, 1402, 1403, 1402]):
+            Project.objects.create(
+                created_by=user,
+                project_name=f'پروژه {number}',
+                project_code=f'P-{number:03d}',
+                employer='کارفرما',
+                contractor='پیمانکار',
+                city='تهران',
+                province='تهران',
+                contract_number=str(number),
+                contract_date=date(2024, 3, 20),
+                execution_year=year,
+                contract_amount=Decimal('1000000'),
+            )
+
+    def paginator(self):
+        return KeysetPaginator(Project.objects.all(), 3, ordering=self.ordering, count_mode='exact')
+
+    def test_cursors_walk_all_rows_in_order(self):
+        expected = list(Project.objects.order_by(*self.ordering).values_list('pk', flat=True))
+        paginator = self.paginator()
+
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+
+        self.assertEqual([project.pk for page in pages for project in page], expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertTrue(pages[0].is_first)
+        self.assertFalse(pages[0].has_previous())
+        self.assertIsNone(pages[-1].next_cursor)
+        self.assertEqual(paginator.count, 7)
+
+        # برگشت با previous_cursor همان صفحه‌های قبلی را می‌دهد
+        back = paginator.get_page(pages[2].previous_cursor)
+        self.assertEqual(list(back), list(pages[1]))
+        first = paginator.get_page(back.previous_cursor)
+        self.assertEqual(list(first), list(pages[0]))
+        self.assertTrue(first.is_first)
+
+    def test_invalid_cursor_returns_first_page(self):
+        paginator = self.paginator()
+        self.assertEqual(list(paginator.get_page('not-a-cursor')), list(paginator.get_page()))
@@ -3,17 +3,19 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.db import transaction
-from django.db.models import Q, Sum, Max
+from django.db.models import Q, Sum, Max, Count
 from django.utils import timezone
 from datetime import timedelta, datetime
 from decimal import Decimal
 from django.core.paginator import Paginator
+from core.pagination import paginate_keyset
 import logging
+import jdatetime
 
 # Models
 from .models import Project
 from accounts.models import ProjectUser, ProjectRole, UserProfile, UserRole
-from sooratvaziat.models import ProjectFinancialSummary, MeasurementSession, MeasurementSessionItem
+from sooratvaziat.models import ProjectFinancialSummary, MeasurementSession, MeasurementSessionItem, ProjectDashboardSnapshot, ProjectMonthlyRollup
 
 # Forms and decorators
 #forms 
@@ -341,10 +343,11 @@ def project_list(request):
             Q(contractor__icontains=search_query)
         )
     
-    # ========== Pagination ==========
-    paginator = Paginator(projects, 10)  # 10 پروژه در هر صفحه
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # ========== Pagination (keyset، بدون OFFSET) ==========
+    page_obj = paginate_keyset(
+        request, projects, 10,  # 10 پروژه در هر صفحه
+        ordering=('-execution_year', 'project_code', 'id'),
+    )
     
     # ========== بهینه‌سازی آمار با ProjectFinancialSummary ==========
     pks = [project.id for project in page_obj.object_list]
@@ -390,7 +393,7 @@ def project_list(request):
     try:
         # استفاده از contract_amount به جای total_contract_amount
         total_contract_amount = projects.aggregate(
-            total=models.Sum('contract_amount')
+            total=Sum('contract_amount')
         )['total'] or Decimal('0.00')
     except Exception as e:
         print(f"Error calculating total contract amount: {e}")
@@ -537,27 +540,31 @@ def project_detail(request, pk):
         messages.error(request, 'خطا در بارگذاری پروژه.')
         return redirect('projects:project_list')
     
+    # آمار از پیش محاسبه‌شده داشبورد (یک ردیف) و خلاصه مالی پروژه
+    snapshot = ProjectDashboardSnapshot.for_project(project)
+    summary = ProjectFinancialSummary.objects.filter(project=project).first()
+    
     # محاسبه آمار
-    statistics = get_project_statistics(project)
+    statistics = get_project_statistics(project, snapshot)
     
     # محاسبه معیارهای مالی
-    financial_metrics = calculate_financial_metrics(project)
+    financial_metrics = calculate_financial_metrics(project, snapshot)
     
     # خلاصه مالی
-    financial_summary = get_financial_summary(project)
+    financial_summary = get_financial_summary(project, summary)
     
     # رویدادهای اخیر
     recent_events = get_recent_events(project)
     
     # هشدارها
-    warnings = get_project_warnings(project, financial_metrics)
+    warnings = get_project_warnings(project, financial_metrics, snapshot, summary)
     
     # داده‌های نمودار
     chart_data = get_chart_data(project)
     
     # اطلاعات اضافی
     project_duration = calculate_project_duration(project)
-    last_activity = get_last_activity(project)
+    last_activity = get_last_activity(project, snapshot, summary)
     
     context = {
         # اطلاعات اصلی
@@ -710,31 +717,21 @@ def project_edit(request, pk):
         messages.error(request, 'پروژه مورد نظر یافت نشد.')
         return redirect('projects:project_list')
 
-def calculate_financial_metrics(project):
+def calculate_financial_metrics(project, snapshot=None):
     """
-    محاسبه معیارهای مالی بر اساس مدل‌های موجود
+    محاسبه معیارهای مالی بر اساس آمار داشبورد پروژه
     """
     try:
+        snapshot = snapshot or ProjectDashboardSnapshot.for_project(project)
+        
         # مقداردهی اولیه
         total_paid = Decimal('0.00')
-        total_billed = Decimal('0.00')
-        contract_amount = getattr(project, 'total_contract_amount', Decimal('0.00'))
+        contract_amount = project.contract_amount or Decimal('0.00')
         remaining = contract_amount
         progress = Decimal('0.00')
         
-        # محاسبه مجموع متره از صورت‌جلسات
-        try:
-            session_items = MeasurementSessionItem.objects.filter(
-                measurement_session_number__project=project,
-                measurement_session_number__is_active=True,
-                is_active=True
-            )
-            total_billed = sum(
-                item.item_total for item in session_items
-            ) or Decimal('0.00')
-        except Exception as e:
-            logger.warning(f"Error calculating from session items: {e}")
-            total_billed = Decimal('0.00')
+        # مجموع متره صورت‌جلسات فعال
+        total_billed = snapshot.measured_amount or Decimal('0.00')
         
         # محاسبه درصد پیشرفت
         if contract_amount and contract_amount > 0:
@@ -756,7 +753,7 @@ def calculate_financial_metrics(project):
             'formatted_remaining': format_number_int(remaining),
             'formatted_contract_amount': format_number_int(contract_amount),
             'progress_display': f"{progress:.1f}%",
-            'progress_class': get_progress_class(progress),
+            'progress_class': _get_progress_class(progress),
             'has_financial_data': total_paid > 0 or total_billed > 0,
         }
         
@@ -765,21 +762,21 @@ def calculate_financial_metrics(project):
         return {
             'total_paid': Decimal('0.00'),
             'total_billed': Decimal('0.00'),
-            'remaining': getattr(project, 'total_contract_amount', Decimal('0.00')),
+            'remaining': project.contract_amount or Decimal('0.00'),
             'progress': Decimal('0.00'),
-            'contract_amount': getattr(project, 'total_contract_amount', Decimal('0.00')),
+            'contract_amount': project.contract_amount or Decimal('0.00'),
             'formatted_paid': '۰',
             'formatted_billed': '۰',
-            'formatted_remaining': format_number_int(getattr(project, 'total_contract_amount', Decimal('0.00'))),
-            'formatted_contract_amount': format_number_int(getattr(project, 'total_contract_amount', Decimal('0.00'))),
+            'formatted_remaining': format_number_int(project.contract_amount or Decimal('0.00')),
+            'formatted_contract_amount': format_number_int(project.contract_amount or Decimal('0.00')),
             'progress_display': '۰%',
             'progress_class': 'bg-danger',
             'has_financial_data': False,
         }
 
-def get_project_statistics(project):
+def get_project_statistics(project, snapshot=None):
     """
-    دریافت آمار کلی پروژه بر اساس مدل‌های موجود
+    دریافت آمار کلی پروژه از آمار از پیش محاسبه‌شده داشبورد
     """
     stats = {
         'sessions_count': 0,
@@ -795,33 +792,19 @@ def get_project_statistics(project):
     }
     
     try:
-        # آمار صورت‌جلسات (MeasurementSession)
-        sessions = MeasurementSession.objects.filter(
-            project=project,
-            is_active=True
-        )
+        snapshot = snapshot or ProjectDashboardSnapshot.for_project(project)
         
-        stats['sessions_count'] = sessions.count()
-        stats['approved_sessions_count'] = sessions.filter(is_approved=True).count()
-        stats['pending_sessions_count'] = sessions.filter(is_approved=False).count()
+        # آمار صورت‌جلسات (MeasurementSession)
+        stats['sessions_count'] = snapshot.sessions_count
+        stats['approved_sessions_count'] = snapshot.approved_sessions_count
+        stats['pending_sessions_count'] = snapshot.pending_sessions_count
         
         # آمار آیتم‌ها
-        session_items = MeasurementSessionItem.objects.filter(
-            measurement_session_number__project=project,
-            measurement_session_number__is_active=True,
-            is_active=True
-        )
-        
-        stats['total_items_count'] = session_items.count()
-        stats['unique_pricelist_items_count'] = session_items.values(
-            'pricelist_item'
-        ).distinct().count()
+        stats['total_items_count'] = snapshot.items_count
+        stats['unique_pricelist_items_count'] = snapshot.pricelist_items_count
         
         # مبلغ کل متره شده
-        total_amount = session_items.aggregate(
-            total=models.Sum('item_total')
-        )['total'] or Decimal('0.00')
-        stats['total_measured_amount'] = total_amount
+        stats['total_measured_amount'] = snapshot.measured_amount or Decimal('0.00')
         
         # آمار پرداخت‌ها (اگر مدل Payment موجود)
         try:
@@ -854,12 +837,12 @@ def get_project_statistics(project):
     
     return stats
     
-def get_financial_summary(project):
+def get_financial_summary(project, summary=None):
     """
     دریافت خلاصه مالی از ProjectFinancialSummary
     """
     try:
-        summary = ProjectFinancialSummary.objects.filter(project=project).first()
+        summary = summary or ProjectFinancialSummary.objects.filter(project=project).first()
         if summary:
             return {
                 'total_amount': summary.total_amount,
@@ -997,56 +980,41 @@ def get_payments_pagination(request, project):
         logger.error(f"Error in payments pagination: {e}")
         return None
 
-def get_chart_data(project):
+def get_chart_data(project, months=12):
     """
-    داده‌های نمودار بر اساس MeasurementSession
+    داده‌های نمودار ماهانه (ماه شمسی) از جدول ProjectMonthlyRollup
+    همه ماه‌های بازه با یک پرس‌وجو خوانده می‌شوند
     """
     try:
-        from datetime import date
-        import calendar
-        
+        today = jdatetime.date.today()
+
+        # ماه‌های بازه از قدیمی به جدید
+        month_keys = []
+        year, month = today.year, today.month
+        for _ in range(months):
+            month_keys.append((year, month))
+            year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+        month_keys.reverse()
+
+        totals = ProjectMonthlyRollup.monthly_totals(project, month_keys[0], month_keys[-1])
+        month_names = jdatetime.date.j_months_fa
+
         months_data = []
-        end_date = timezone.now().date()
-        
-        # 12 ماه گذشته
-        for i in range(12, 0, -1):
-            # محاسبه ماه
-            year_month = end_date.replace(day=1) - timedelta(days=30*i)
-            month_start = year_month.replace(day=1)
-            next_month = month_start.replace(day=28) + timedelta(days=4)
-            month_end = next_month - timedelta(days=next_month.day)
-            
-            # صورت‌جلسات ماهانه
-            monthly_sessions = MeasurementSession.objects.filter(
-                project=project,
-                session_date__range=[month_start, month_end],
-                is_active=True
-            )
-            
-            month_amount = Decimal('0.00')
-            for session in monthly_sessions:
-                # محاسبه مبلغ از آیتم‌ها
-                session_amount = sum(
-                    item.item_total for item in session.items.filter(is_active=True)
-                )
-                month_amount += session_amount
-            
-            # نام ماه به فارسی (ساده)
-            month_names = ['ژانویه', 'فوریه', 'مارس', 'آوریل', 'مه', 'ژوئن',
-                          'ژوئیه', 'اوت', 'سپتامبر', 'اکتبر', 'نوامبر', 'دسامبر']
-            month_name = f"{month_names[month_start.month-1]} {month_start.year}"
-            
+        for year, month in month_keys:
+            row = totals.get((year, month), {})
+            month_amount = row.get('amount', Decimal('0.00'))
+
             months_data.append({
-                'month': month_name,
+                'month': f"{month_names[month - 1]} {year}",
                 'sessions_amount': float(month_amount),
                 'payments_amount': 0.0,  # فعلاً صفر - نیاز به مدل Payment
                 'formatted_sessions': format_number_int(month_amount),
                 'formatted_payments': '۰',
-                'session_count': monthly_sessions.count(),
+                'session_count': row.get('sessions_count', 0),
             })
-        
+
         return months_data[::-1]  # معکوس کردن
-        
+
     except Exception as e:
         logger.error(f"Error generating chart data: {e}")
         return []
@@ -1062,21 +1030,25 @@ def get_recent_events(project, limit=10):
     }
     
     try:
-        # صورت‌جلسات اخیر
+        # صورت‌جلسات اخیر (مبلغ و تعداد آیتم‌های فعال در همان پرس‌وجو)
+        active_items = Q(items__is_active=True)
         recent_sessions = MeasurementSession.objects.filter(
             project=project,
             is_active=True
-        ).select_related('created_by').order_by('-session_date')[:5]
+        ).select_related('created_by', 'price_list').annotate(
+            active_items_total=Sum('items__item_total', filter=active_items),
+            active_items_count=Count('items', filter=active_items),
+        ).order_by('-session_date')[:5]
         
         for session in recent_sessions:
             session_info = {
                 'id': session.id,
                 'session_number': session.session_number,
                 'session_date': session.session_date,
-                'discipline': session.get_discipline_choice_display(),
-                'total_amount': sum(item.item_total for item in session.items.filter(is_active=True)) or Decimal('0.00'),
-                'items_count': session.items.filter(is_active=True).count(),
-                'is_approved': getattr(session, 'is_approved', False),
+                'discipline': session.price_list.get_discipline_choice_display() if session.price_list else '',
+                'total_amount': session.active_items_total or Decimal('0.00'),
+                'items_count': session.active_items_count,
+                'is_approved': session.status == 'approved',
                 'created_by': getattr(session.created_by, 'username', 'نامشخص'),
             }
             events['sessions'].append(session_info)
@@ -1112,7 +1084,7 @@ def get_recent_events(project, limit=10):
                 'date': session.session_date,
                 'description': f'صورت‌جلسه #{session.session_number} ثبت شد',
                 'icon': 'fas fa-file-contract',
-                'color': 'success' if session.is_approved else 'warning'
+                'color': 'success' if session.status == 'approved' else 'warning'
             })
         
         # اضافه کردن پرداخت‌ها به فعالیت‌ها
@@ -1129,8 +1101,8 @@ def get_recent_events(project, limit=10):
         except:
             pass
             
-        # مرتب‌سازی بر اساس تاریخ
-        activities.sort(key=lambda x: x['date'], reverse=True)
+        # مرتب‌سازی بر اساس تاریخ (تاریخ صورت‌جلسه می‌تواند خالی باشد)
+        activities.sort(key=lambda x: (x['date'] is not None, x['date'] or 0), reverse=True)
         events['activities'] = activities[:limit]
         
     except Exception as e:
@@ -1138,13 +1110,15 @@ def get_recent_events(project, limit=10):
     
     return events
     
-def get_project_warnings(project, financial_metrics):
+def get_project_warnings(project, financial_metrics, snapshot=None, summary=None):
     """
     دریافت هشدارهای پروژه
     """
     warnings = []
     
     try:
+        snapshot = snapshot or ProjectDashboardSnapshot.for_project(project)
+        
         progress = financial_metrics['progress']
         contract_amount = project.contract_amount or Decimal('0.00')
         total_billed = financial_metrics['total_billed']
@@ -1160,7 +1134,7 @@ def get_project_warnings(project, financial_metrics):
             })
         
         # 2. عدم تطابق متره و پرداخت
-        elif abs(total_billed - financial_metrics['total_paid']) > contract_amount * 0.1:
+        elif abs(total_billed - financial_metrics['total_paid']) > contract_amount * Decimal('0.1'):
             discrepancy = abs(total_billed - financial_metrics['total_paid'])
             warnings.append({
                 'type': 'warning',
@@ -1171,11 +1145,7 @@ def get_project_warnings(project, financial_metrics):
             })
         
         # 3. صورت‌جلسات تأیید نشده
-        pending_sessions = MeasurementSession.objects.filter(
-            project=project,
-            is_active=True,
-            is_approved=False
-        ).count()
+        pending_sessions = snapshot.pending_sessions_count
         
         if pending_sessions > 0:
             warnings.append({
@@ -1187,9 +1157,7 @@ def get_project_warnings(project, financial_metrics):
             })
         
         # 4. پیشرفت پایین با وجود صورت‌جلسات
-        total_sessions = MeasurementSession.objects.filter(
-            project=project, is_active=True
-        ).count()
+        total_sessions = snapshot.sessions_count
         
         if progress < 20 and total_sessions > 2:
             warnings.append({
@@ -1202,7 +1170,7 @@ def get_project_warnings(project, financial_metrics):
         
         # 5. عدم به‌روزرسانی خلاصه مالی
         try:
-            summary = ProjectFinancialSummary.objects.filter(project=project).first()
+            summary = summary or ProjectFinancialSummary.objects.filter(project=project).first()
             if summary and summary.last_updated:
                 days_since_update = (timezone.now().date() - summary.last_updated.date()).days
                 if days_since_update > 30:
@@ -1305,7 +1273,7 @@ def calculate_project_duration(project):
             'is_completed': False,
         }
 
-def get_last_activity(project):
+def get_last_activity(project, snapshot=None, summary=None):
     """
     دریافت آخرین فعالیت پروژه
     """
@@ -1315,10 +1283,8 @@ def get_last_activity(project):
         
         # آخرین صورت‌جلسه
         try:
-            last_session = MeasurementSession.objects.filter(
-                project=project,
-                is_active=True
-            ).aggregate(last=Max('updated_at'))['last']
+            snapshot = snapshot or ProjectDashboardSnapshot.for_project(project)
+            last_session = snapshot.last_session_at
             
             if last_session:
                 last_activity = last_session
@@ -1328,9 +1294,9 @@ def get_last_activity(project):
         
         # آخرین به‌روزرسانی خلاصه مالی
         try:
-            last_summary = ProjectFinancialSummary.objects.filter(
-                project=project
-            ).aggregate(last=Max('last_updated'))['last']
+            if summary is None:
+                summary = ProjectFinancialSummary.objects.filter(project=project).first()
+            last_summary = summary.last_updated if summary else None
             
             if last_summary and (not last_activity or last_summary > last_activity):
                 last_activity = last_summary
@@ -1,4 +1,4 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.admin import DateFieldListFilter
 from django.utils import timezone
 from django.utils.safestring import mark_safe
@@ -88,6 +88,7 @@ class MeasurementSessionAdmin(admin.ModelAdmin):
     
     readonly_fields = ('created_at', 'updated_at', 'session_date_jalali_display')
     inlines = [MeasurementSessionItemInline]
+    actions = ['duplicate_sessions']
     
     fieldsets = (
         ('اطلاعات اصلی', {
@@ -144,6 +145,14 @@ class MeasurementSessionAdmin(admin.ModelAdmin):
         obj.modified_by = request.user
         super().save_model(request, obj, form, change)
 
+    def duplicate_sessions(self, request, queryset):
+        count = 0
+        for session in queryset:
+            session.duplicate(user=request.user)
+            count += 1
+        self.message_user(request, f"{count} صورت جلسه به صورت پیش‌نویس کپی شد", level=messages.SUCCESS)
+    duplicate_sessions.short_description = "کپی صورت جلسه‌های انتخاب‌شده (پیش‌نویس)"
+
 
 @admin.register(MeasurementSessionItem)
 class MeasurementSessionItemAdmin(admin.ModelAdmin):
@@ -171,6 +180,7 @@ class MeasurementSessionItemAdmin(admin.ModelAdmin):
     
     readonly_fields = ('quantity', 'item_total', 'created_at', 'updated_at')
     inlines = [MeasurementRevisionInline]
+    actions = ['soft_delete_items', 'restore_items']
     
     fieldsets = (
         ('اطلاعات اصلی', {
@@ -228,6 +238,16 @@ class MeasurementSessionItemAdmin(admin.ModelAdmin):
         obj.modified_by = request.user
         super().save_model(request, obj, form, change)
 
+    def soft_delete_items(self, request, queryset):
+        count = queryset.soft_delete(user=request.user)
+        self.message_user(request, f"{count} آیتم حذف شد", level=messages.SUCCESS)
+    soft_delete_items.short_description = "حذف نرم آیتم‌های انتخاب‌شده"
+
+    def restore_items(self, request, queryset):
+        count = queryset.restore(user=request.user)
+        self.message_user(request, f"{count} آیتم بازگردانده شد", level=messages.SUCCESS)
+    restore_items.short_description = "بازگردانی آیتم‌های انتخاب‌شده"
+
 
 @admin.register(MeasurementRevision)
 class MeasurementRevisionAdmin(admin.ModelAdmin):
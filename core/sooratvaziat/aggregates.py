@@ -0,0 +1,695 @@
+# sooratvaziat/aggregates.py
+"""
+صف بازمحاسبه تأخیری و تجمیع‌شده مجموع‌ها
+(ریز متره پروژه، صورت وضعیت صورت جلسه، خلاصه مالی، آمار داشبورد و جمع‌های ماهانه پروژه)
+
+در طول یک درخواست، زوج‌های (پروژه، آیتم فهرست بها) و صورت جلسه‌های تغییر کرده فقط
+در حافظه جمع‌آوری می‌شوند. پس از commit تراکنش برای آن‌ها AggregateRefreshMarker ثبت
+می‌شود و بسته به تنظیم AGGREGATE_REFRESH_MODE پردازش می‌شوند:
+
+- 'thread': در thread pool همین پروسه، خارج از زمان پاسخ درخواست (پیش‌فرض)
+- 'sync': بلافاصله پس از commit در همین درخواست
+- 'queue': فقط ثبت نشانگر؛ پردازش با دستور manage.py refresh_aggregates
+
+هر زوج در هر دور پردازش فقط یک بار محاسبه می‌شود، هر چند بار هم که علامت خورده باشد.
+
+ویرایش آیتم‌ها (apply_item_change برای یک آیتم و apply_item_changes برای حذف/بازگردانی
+دسته‌ای) به‌جای بازمحاسبه کامل، فقط تفاضل مقدار قبلی و جدید را با F() روی ریز متره،
+خلاصه آیتم، صورت وضعیت، خلاصه مالی، آمار داشبورد و جمع ماهانه پروژه اعمال می‌کند؛ بازسازی کامل
+(rebuild_project / refresh_aggregates --full) به عنوان کنترل سازگاری باقی می‌ماند.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from decimal import Decimal
+
+import jdatetime
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.utils import timezone
+
+from core import history, loaded_state
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_pending():
+    """
+    زوج‌های علامت‌خورده در thread جاری:
+    {project_id: [price_list_item_ids, session_ids, project_totals]}
+    """
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        pending = _local.pending = {}
+    return pending
+
+
+def mark_dirty(project, price_list_items=(), sessions=()):
+    """
+    علامت‌گذاری مجموع‌های یک پروژه برای بازمحاسبه پس از commit
+
+    price_list_items و sessions می‌توانند شیء مدل یا شناسه باشند. خلاصه مالی، آمار
+    داشبورد و جمع‌های ماهانه پروژه فقط وقتی بازمحاسبه می‌شوند که صورت جلسه‌ای داده شده
+    یا هیچ آیتمی داده نشده باشد (علامت‌گذاری فقط ریز متره آیتم‌ها به آن‌ها دست نمی‌زند).
+    """
+    project_id = getattr(project, 'pk', project)
+    if project_id is None:
+        return
+
+    price_list_items = list(price_list_items)
+    sessions = list(sessions)
+    entry = _get_pending().setdefault(project_id, [set(), set(), False])
+    item_ids, session_ids = entry[0], entry[1]
+    item_ids.update(getattr(item, 'pk', item) for item in price_list_items)
+    session_ids.update(getattr(session, 'pk', session) for session in sessions)
+    item_ids.discard(None)
+    session_ids.discard(None)
+    if sessions or not price_list_items:
+        entry[2] = True
+
+    # هر فراخوانی یک callback ثبت می‌کند تا rollback یک تراکنش باعث گم شدن بقیه نشود؛
+    # اولین callback همه را می‌برد و بقیه کاری انجام نمی‌دهند
+    transaction.on_commit(_flush)
+
+
+def _flush():
+    """ثبت نشانگرهای جمع‌آوری‌شده و ارسال آن‌ها برای پردازش"""
+    pending = getattr(_local, 'pending', None)
+    if not pending:
+        return
+    _local.pending = {}
+
+    try:
+        project_ids = _write_markers(pending)
+    except Exception as e:
+        logger.error(f"خطا در ثبت نشانگرهای بازمحاسبه: {str(e)}")
+        return
+
+    if not project_ids:
+        return
+
+    mode = getattr(settings, 'AGGREGATE_REFRESH_MODE', 'thread')
+    if mode == 'sync':
+        process_markers(project_ids)
+    elif mode == 'thread':
+        _get_executor().submit(_process_in_thread, project_ids)
+    # در حالت 'queue' نشانگرها توسط دستور refresh_aggregates پردازش می‌شوند
+
+
+def _write_markers(pending):
+    """ایجاد نشانگرها با یک bulk_create؛ ردیف‌های حذف‌شده در این فاصله نادیده گرفته می‌شوند"""
+    from fehrestbaha.models import PriceListItem
+    from project.models import Project
+    from .models import AggregateRefreshMarker, MeasurementSession
+
+    all_item_ids = set().union(*(items for items, _, _ in pending.values()))
+    all_session_ids = set().union(*(sessions for _, sessions, _ in pending.values()))
+
+    existing_projects = set(
+        Project.objects.filter(pk__in=pending.keys()).values_list('pk', flat=True)
+    )
+    existing_items = set(
+        PriceListItem.objects.filter(pk__in=all_item_ids).values_list('pk', flat=True)
+    ) if all_item_ids else set()
+    existing_sessions = set(
+        MeasurementSession.objects.filter(pk__in=all_session_ids).values_list('pk', flat=True)
+    ) if all_session_ids else set()
+
+    markers = []
+    for project_id, (item_ids, session_ids, project_totals) in pending.items():
+        if project_id not in existing_projects:
+            continue
+        item_ids = item_ids & existing_items
+        session_ids = session_ids & existing_sessions
+        markers.extend(
+            AggregateRefreshMarker(project_id=project_id, price_list_item_id=item_id)
+            for item_id in item_ids
+        )
+        markers.extend(
+            AggregateRefreshMarker(project_id=project_id, measurement_session_id=session_id)
+            for session_id in session_ids
+        )
+        if project_totals or not (item_ids or session_ids):
+            # خلاصه مالی، آمار داشبورد و جمع‌های ماهانه پروژه
+            markers.append(AggregateRefreshMarker(project_id=project_id))
+
+    AggregateRefreshMarker.objects.bulk_create(markers)
+    return sorted(existing_projects)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'AGGREGATE_REFRESH_WORKERS', 2),
+                thread_name_prefix='aggregate-refresh',
+            )
+    return _executor
+
+
+def _process_in_thread(project_ids):
+    try:
+        process_markers(project_ids)
+    except Exception as e:
+        logger.error(f"خطا در بازمحاسبه مجموع‌ها در پس‌زمینه: {str(e)}", exc_info=True)
+    finally:
+        # هر thread اتصال پایگاه داده خودش را دارد
+        connection.close()
+
+
+def process_markers(project_ids=None):
+    """
+    پردازش نشانگرهای ثبت‌شده (همه یا فقط پروژه‌های داده‌شده)
+    خروجی: تعداد پروژه‌هایی که با موفقیت بازمحاسبه شدند
+    """
+    from .models import AggregateRefreshMarker
+
+    markers = AggregateRefreshMarker.objects.all()
+    if project_ids is not None:
+        markers = markers.filter(project_id__in=project_ids)
+
+    grouped = {}
+    marker_ids = {}
+    for marker_id, project_id, item_id, session_id in markers.values_list(
+        'id', 'project_id', 'price_list_item_id', 'measurement_session_id'
+    ):
+        entry = grouped.setdefault(project_id, [set(), set(), False])
+        if item_id:
+            entry[0].add(item_id)
+        if session_id:
+            entry[1].add(session_id)
+        if session_id or not item_id:
+            entry[2] = True
+        marker_ids.setdefault(project_id, []).append(marker_id)
+
+    processed = 0
+    for project_id, (item_ids, session_ids, project_totals) in grouped.items():
+        try:
+            refresh_project(project_id, item_ids, session_ids, project_totals=project_totals)
+        except Exception as e:
+            # نشانگرها باقی می‌مانند تا دور بعد دوباره تلاش شود
+            logger.error(f"خطا در بازمحاسبه مجموع‌های پروژه {project_id}: {str(e)}")
+            continue
+        AggregateRefreshMarker.objects.filter(id__in=marker_ids[project_id]).delete()
+        processed += 1
+
+    return processed
+
+
+def refresh_project(project_id, price_list_item_ids=(), session_ids=(), project_totals=True):
+    """
+    بازمحاسبه کامل ریز متره آیتم‌ها، صورت وضعیت صورت جلسه‌ها و (با project_totals)
+    یک بار خلاصه مالی، آمار داشبورد و جمع‌های ماهانه پروژه
+    """
+    from fehrestbaha.models import PriceListItem
+    from project.models import Project
+    from .models import (
+        DetailedMeasurement, FinancialStatus, MeasurementSession, MeasurementSummary,
+        ProjectDashboardSnapshot, ProjectFinancialSummary, ProjectMonthlyRollup,
+    )
+
+    project = Project.objects.get(pk=project_id)
+
+    # ردیف‌های مشتق‌شده با هر بازمحاسبه از نو ساخته می‌شوند و تاریخچه جداگانه لازم ندارند
+    with transaction.atomic(), history.suspended(DetailedMeasurement, FinancialStatus, ProjectFinancialSummary):
+        price_list_items = PriceListItem.objects.filter(
+            pk__in=price_list_item_ids
+        ).select_related('price_list')
+        for price_list_item in price_list_items:
+            try:
+                with transaction.atomic():
+                    DetailedMeasurement.update_or_create_for_project(project, price_list_item)
+                    summary, _ = MeasurementSummary.objects.get_or_create(
+                        project=project, price_list_item=price_list_item
+                    )
+                    summary.update_summary()
+            except Exception as e:
+                # خطای یک ریز متره نباید بازمحاسبه بقیه پروژه را متوقف کند
+                logger.error(
+                    f"خطا در به‌روزرسانی ریز متره آیتم {price_list_item.pk} پروژه {project_id}: {str(e)}"
+                )
+
+        for session in MeasurementSession.objects.filter(pk__in=session_ids, project=project):
+            status = (
+                FinancialStatus.objects.filter(measurement_session=session).first()
+                or FinancialStatus(measurement_session=session)
+            )
+            status.save()  # save مجموع‌ها را از آیتم‌ها محاسبه می‌کند
+
+        if not project_totals:
+            return
+
+        summary = (
+            ProjectFinancialSummary.objects.filter(project=project).first()
+            or ProjectFinancialSummary(project=project)
+        )
+        summary.save()  # save مجموع‌های پروژه را محاسبه می‌کند
+
+        ProjectDashboardSnapshot.refresh_for_project(project)
+        ProjectMonthlyRollup.rebuild_for_project(project)
+
+
+def rebuild_project(project_id):
+    """
+    بازسازی کامل همه مجموع‌های یک پروژه (کنترل سازگاری دوره‌ای برای مسیر تفاضلی)
+    خروجی: تعداد ریز متره‌هایی که با مقدار بازسازی‌شده اختلاف داشتند
+    """
+    from .models import DetailedMeasurement, MeasurementSession, MeasurementSessionItem
+
+    def measurement_totals():
+        return {
+            row[0]: row[1:]
+            for row in DetailedMeasurement.objects.filter(project_id=project_id).values_list(
+                'price_list_item_id', 'total_quantity', 'total_amount', 'items_count', 'sessions_count'
+            )
+        }
+
+    before = measurement_totals()
+    price_list_item_ids = set(before) | set(
+        MeasurementSessionItem.objects.filter(
+            measurement_session_number__project_id=project_id
+        ).values_list('pricelist_item_id', flat=True).distinct()
+    )
+    session_ids = list(
+        MeasurementSession.objects.filter(project_id=project_id).values_list('pk', flat=True)
+    )
+    for session_id in session_ids:
+        _recount_session_items(session_id)
+
+    refresh_project(project_id, price_list_item_ids, session_ids)
+
+    after = measurement_totals()
+    return sum(1 for key, totals in after.items() if before.get(key) != totals)
+
+
+# ========== مسیر تفاضلی (ویرایش تک آیتم) ==========
+
+# فیلدهای آیتم که روی مجموع‌ها اثر دارند
+ITEM_AGGREGATE_FIELDS = (
+    'measurement_session_number_id', 'pricelist_item_id', 'row_description',
+    'quantity', 'item_total', 'is_active',
+)
+
+
+def item_snapshot(item):
+    """مقادیر فعلی مؤثر بر مجموع‌ها از فیلدهای بارگذاری‌شده آیتم (بدون کوئری اضافه)"""
+    return _aggregate_values(item.__dict__)
+
+
+def loaded_item_snapshot(item):
+    """
+    مقادیر مؤثر بر مجموع‌ها در آخرین بارگذاری یا ذخیره آیتم (core.loaded_state)؛
+    dict خالی وقتی مقادیر قبلی معلوم نیست
+    """
+    return _aggregate_values(loaded_state.loaded_values(item) or {})
+
+
+def _aggregate_values(values):
+    return {
+        field: values[field]
+        for field in ITEM_AGGREGATE_FIELDS
+        if field in values
+    }
+
+
+def apply_item_change(item, previous, removed=False, user=None):
+    """
+    اعمال تغییر یک آیتم صورت جلسه روی مجموع‌ها به صورت تفاضلی
+
+    previous: item_snapshot قبل از تغییر، None برای آیتم جدید و dict ناقص وقتی
+    مقادیر قبلی معلوم نیست (در این حالت بازمحاسبه کامل زمان‌بندی می‌شود).
+    removed: آیتم به طور واقعی حذف شده است.
+    """
+    current = None if removed else item_snapshot(item)
+    if (previous is not None and len(previous) < len(ITEM_AGGREGATE_FIELDS)) or (
+        current is not None and len(current) < len(ITEM_AGGREGATE_FIELDS)
+    ):
+        _touch_sessions({item.measurement_session_number_id}, user, timezone.now())
+        _schedule_full_item_refresh(item)
+        return
+
+    apply_item_changes([(item.pk, previous, current)], user=user)
+
+
+def apply_item_changes(changes, user=None):
+    """
+    اعمال تغییر چند آیتم صورت جلسه روی مجموع‌ها با F() (پس از نوشتن خود آیتم‌ها)
+
+    changes: [(item_pk, previous, current)] با item_snapshot کامل قبل و بعد از تغییر
+    (None برای آیتم جدید یا حذف‌شده). برای هر صورت جلسه، هر ریز متره و هر پروژه یک
+    UPDATE اجرا می‌شود؛ تعداد ردیف‌ها / آیتم‌های متمایز فقط وقتی با یک پرس‌وجو بررسی
+    می‌شود که آیتمی به گروه اضافه یا از آن خارج شده باشد. زمان آخرین ویرایش (و
+    ویرایش‌کننده) صورت جلسه‌های تحت تأثیر هم به‌روز می‌شود.
+    """
+    from .models import MeasurementSession
+
+    now = timezone.now()
+    _touch_sessions({
+        values['measurement_session_number_id']
+        for _, previous, current in changes for values in (previous, current) if values
+    }, user, now)
+
+    changes = [
+        (
+            item_pk,
+            previous if previous and previous['is_active'] else None,
+            current if current and current['is_active'] else None,
+        )
+        for item_pk, previous, current in changes
+    ]
+    changes = [change for change in changes if change[1] is not None or change[2] is not None]
+    if not changes:
+        return
+
+    sessions = {
+        pk: {'project_id': project_id, 'is_active': is_active, 'discipline': discipline, 'date': session_date}
+        for pk, project_id, is_active, discipline, session_date in MeasurementSession.objects.filter(
+            pk__in={
+                values['measurement_session_number_id']
+                for _, old, new in changes for values in (old, new) if values
+            }
+        ).values_list('pk', 'project_id', 'is_active', 'price_list__discipline_choice', 'session_date')
+    }
+
+    # تفاضل هر زوج (صورت جلسه، آیتم فهرست بها): [مقدار، مبلغ، تعداد ردیف]
+    deltas = {}
+    for _, old, new in changes:
+        for values, sign in ((old, -1), (new, 1)):
+            if values is None or values['measurement_session_number_id'] not in sessions:
+                continue
+            delta = deltas.setdefault(
+                (values['measurement_session_number_id'], values['pricelist_item_id']),
+                [Decimal('0'), Decimal('0'), 0]
+            )
+            delta[0] += sign * Decimal(values['quantity'] or 0)
+            delta[1] += sign * Decimal(values['item_total'] or 0)
+            delta[2] += sign
+    if not deltas:
+        return
+
+    steps = _presence_steps(changes, sessions)
+
+    _apply_session_deltas(deltas, steps, sessions, now)
+    _apply_measurement_deltas(deltas, steps, sessions, now)
+    _apply_project_deltas(deltas, steps, sessions, now)
+    _apply_monthly_deltas(deltas, steps, sessions)
+
+
+def _touch_sessions(session_ids, user, now):
+    from .models import MeasurementSession
+
+    session_ids.discard(None)
+    if not session_ids:
+        return
+    values = {'updated_at': now}
+    if user is not None:
+        values['modified_by'] = user
+    MeasurementSession.objects.filter(pk__in=session_ids).update(**values)
+
+
+def _presence_steps(changes, sessions):
+    """
+    تغییر حضور هر گروه (۱+ وقتی اولین آیتم فعال به آن اضافه شده، ۱- وقتی آخرین آیتم آن
+    خارج شده) برای گروه‌های: زوج (صورت جلسه، آیتم فهرست بها)، (صورت جلسه، شرح ردیف)،
+    (پروژه، آیتم فهرست بها) در صورت جلسه‌های فعال و خود صورت جلسه
+    """
+    from .models import MeasurementSessionItem
+
+    def pair_key(values):
+        return values['measurement_session_number_id'], values['pricelist_item_id']
+
+    def row_key(values):
+        if not values['row_description']:
+            return None
+        return values['measurement_session_number_id'], values['row_description']
+
+    def project_item_key(values):
+        session = sessions[values['measurement_session_number_id']]
+        if not session['is_active']:
+            return None
+        return session['project_id'], values['pricelist_item_id']
+
+    def session_key(values):
+        return values['measurement_session_number_id']
+
+    key_functions = {
+        'pair': pair_key, 'row': row_key, 'project_item': project_item_key, 'session': session_key,
+    }
+    before = {name: set() for name in key_functions}
+    after = {name: set() for name in key_functions}
+    for _, old, new in changes:
+        for values, keys in ((old, before), (new, after)):
+            if values is None or values['measurement_session_number_id'] not in sessions:
+                continue
+            for name, key_function in key_functions.items():
+                key = key_function(values)
+                if key is not None:
+                    keys[name].add(key)
+
+    # گروه‌هایی که آیتم تغییرکرده در هر دو طرف آن‌ها هست حضورشان عوض نمی‌شود
+    candidates = {name: before[name] ^ after[name] for name in key_functions}
+    others = {name: set() for name in key_functions}
+    if any(candidates.values()):
+        active = MeasurementSessionItem.objects.filter(is_active=True).exclude(
+            pk__in=[item_pk for item_pk, _, _ in changes]
+        )
+        if candidates['pair']:
+            others['pair'] = set(active.filter(
+                measurement_session_number_id__in={key[0] for key in candidates['pair']},
+                pricelist_item_id__in={key[1] for key in candidates['pair']},
+            ).values_list('measurement_session_number_id', 'pricelist_item_id').distinct())
+        if candidates['row']:
+            others['row'] = set(active.filter(
+                measurement_session_number_id__in={key[0] for key in candidates['row']},
+                row_description__in={key[1] for key in candidates['row']},
+            ).values_list('measurement_session_number_id', 'row_description').distinct())
+        if candidates['project_item']:
+            others['project_item'] = set(active.filter(
+                measurement_session_number__project_id__in={key[0] for key in candidates['project_item']},
+                measurement_session_number__is_active=True,
+                pricelist_item_id__in={key[1] for key in candidates['project_item']},
+            ).values_list('measurement_session_number__project_id', 'pricelist_item_id').distinct())
+        if candidates['session']:
+            others['session'] = set(active.filter(
+                measurement_session_number_id__in=candidates['session'],
+            ).values_list('measurement_session_number_id', flat=True).distinct())
+
+    steps = {}
+    for name, keys in candidates.items():
+        steps[name] = {
+            key: (key in after[name]) - (key in before[name])
+            for key in keys
+            if key not in others[name]
+        }
+    return steps
+
+
+def _apply_session_deltas(deltas, steps, sessions, now):
+    """تعداد آیتم‌های صورت جلسه و صورت وضعیت آن (همه آیتم‌های صورت جلسه، حتی اگر غیرفعال باشد)"""
+    from .models import FinancialStatus, MeasurementSession
+
+    per_session = {}
+    for (session_id, price_list_item_id), (quantity, amount, count) in deltas.items():
+        totals = per_session.setdefault(session_id, [Decimal('0'), Decimal('0'), 0, 0, 0])
+        totals[0] += quantity
+        totals[1] += amount
+        totals[2] += count
+        totals[3] += steps['pair'].get((session_id, price_list_item_id), 0)
+    for (session_id, _), step in steps['row'].items():
+        per_session.setdefault(session_id, [Decimal('0'), Decimal('0'), 0, 0, 0])[4] += step
+
+    for session_id, (quantity, amount, count, pair_step, row_step) in per_session.items():
+        if not (quantity or amount or count or pair_step or row_step):
+            continue
+        if count:
+            MeasurementSession.objects.filter(pk=session_id).update(
+                items_count=F('items_count') + count
+            )
+
+        updated = FinancialStatus.objects.filter(measurement_session_id=session_id).update(
+            total_quantity=F('total_quantity') + quantity,
+            total_amount=F('total_amount') + amount,
+            total_with_vat=F('total_with_vat') + Value(amount) * (
+                Value(Decimal('1')) + F('vat_rate') * Value(Decimal('0.01'))
+            ),
+            active_items_count=F('active_items_count') + count,
+            unique_pricelist_items_count=F('unique_pricelist_items_count') + pair_step,
+            row_descriptions_count=F('row_descriptions_count') + row_step,
+            last_calculated_at=now,
+            updated_at=now,
+        )
+        if not updated:
+            # صورت وضعیت هنوز ساخته نشده؛ یک بار به‌طور کامل محاسبه می‌شود
+            mark_dirty(sessions[session_id]['project_id'], sessions=[session_id])
+
+
+def _apply_measurement_deltas(deltas, steps, sessions, now):
+    """ریز متره و خلاصه آیتم هر (پروژه، آیتم فهرست بها)؛ فقط صورت جلسه‌های فعال"""
+    from .models import DetailedMeasurement, MeasurementSummary
+
+    per_item = {}
+    for (session_id, price_list_item_id), (quantity, amount, count) in deltas.items():
+        session = sessions[session_id]
+        if not session['is_active']:
+            continue
+        totals = per_item.setdefault(
+            (session['project_id'], price_list_item_id), [Decimal('0'), Decimal('0'), 0, 0]
+        )
+        totals[0] += quantity
+        totals[1] += amount
+        totals[2] += count
+        totals[3] += steps['pair'].get((session_id, price_list_item_id), 0)
+
+    for (project_id, price_list_item_id), (quantity, amount, count, sessions_step) in per_item.items():
+        if not (quantity or amount or count or sessions_step):
+            continue
+        values = {
+            'total_quantity': F('total_quantity') + quantity,
+            'total_amount': F('total_amount') + amount,
+            'items_count': F('items_count') + count,
+            'sessions_count': F('sessions_count') + sessions_step,
+        }
+        pair_filter = {'project_id': project_id, 'price_list_item_id': price_list_item_id}
+        updated = DetailedMeasurement.objects.filter(**pair_filter).update(last_updated=now, **values)
+        updated_summary = MeasurementSummary.objects.filter(**pair_filter).update(updated_at=now, **values)
+        if not updated or not updated_summary:
+            # ردیف هنوز ساخته نشده؛ یک بار به‌طور کامل محاسبه می‌شود
+            mark_dirty(project_id, [price_list_item_id])
+
+
+def _apply_project_deltas(deltas, steps, sessions, now):
+    """خلاصه مالی و آمار داشبورد پروژه (فقط صورت جلسه‌های فعال)"""
+    from .models import ProjectDashboardSnapshot, ProjectFinancialSummary
+
+    per_project = {}
+    for (session_id, _), (quantity, amount, count) in deltas.items():
+        session = sessions[session_id]
+        if not session['is_active']:
+            continue
+        totals = per_project.setdefault(session['project_id'], {
+            'quantity': Decimal('0'), 'amount': Decimal('0'), 'count': 0, 'items_step': 0,
+            'disciplines': {},
+        })
+        totals['quantity'] += quantity
+        totals['amount'] += amount
+        totals['count'] += count
+        discipline = totals['disciplines'].setdefault(session['discipline'], [Decimal('0'), Decimal('0')])
+        discipline[0] += quantity
+        discipline[1] += amount
+    for (project_id, _), step in steps['project_item'].items():
+        if project_id in per_project:
+            per_project[project_id]['items_step'] += step
+
+    for project_id, totals in per_project.items():
+        # صورت جلسه‌های ویرایش‌شده همین الان updated_at = now گرفته‌اند
+        ProjectDashboardSnapshot.objects.filter(project_id=project_id).update(
+            items_count=F('items_count') + totals['count'],
+            pricelist_items_count=F('pricelist_items_count') + totals['items_step'],
+            measured_amount=F('measured_amount') + totals['amount'],
+            last_session_at=now,
+            refreshed_at=now,
+        )
+
+        if not (totals['quantity'] or totals['amount'] or totals['count'] or totals['items_step']):
+            continue
+        values = {
+            'total_quantity': F('total_quantity') + totals['quantity'],
+            'total_amount': F('total_amount') + totals['amount'],
+            'total_with_vat': F('total_with_vat') + Value(totals['amount']) * (
+                Value(Decimal('1')) + F('vat_rate') * Value(Decimal('0.01'))
+            ),
+            'total_items_count': F('total_items_count') + totals['count'],
+            'unique_pricelist_items_count': F('unique_pricelist_items_count') + totals['items_step'],
+        }
+        for discipline, (quantity, amount) in totals['disciplines'].items():
+            fields = ProjectFinancialSummary.DISCIPLINE_FIELDS.get(discipline)
+            if fields:
+                values[fields[0]] = F(fields[0]) + quantity
+                values[fields[1]] = F(fields[1]) + amount
+
+        summaries = ProjectFinancialSummary.objects.filter(project_id=project_id)
+        updated = summaries.update(last_updated=now, **values)
+        if not updated:
+            # خلاصه مالی هنوز ساخته نشده؛ یک بار به‌طور کامل محاسبه می‌شود
+            mark_dirty(project_id)
+            continue
+
+        # درصد پیشرفت به مبلغ قرارداد پروژه وابسته است
+        for total_amount, contract_amount in summaries.values_list('total_amount', 'project__contract_amount'):
+            summaries.update(progress_percentage=ProjectFinancialSummary.progress_for(
+                total_amount, contract_amount
+            ))
+
+
+def _apply_monthly_deltas(deltas, steps, sessions):
+    """جمع ماهانه پروژه: فقط ردیف ماه و رشته صورت جلسه‌های ویرایش‌شده (فعال و تاریخ‌دار)"""
+    from django.db import IntegrityError
+    from .models import ProjectMonthlyRollup
+
+    per_month = {}
+    for (session_id, _), (quantity, amount, _count) in deltas.items():
+        session = sessions[session_id]
+        if not session['is_active'] or session['date'] is None:
+            continue
+        jalali = jdatetime.date.fromgregorian(date=session['date'])
+        key = (session['project_id'], jalali.year, jalali.month, session['discipline'] or '')
+        totals = per_month.setdefault(key, [Decimal('0'), Decimal('0'), set()])
+        totals[0] += quantity
+        totals[1] += amount
+        totals[2].add(session_id)
+
+    for (project_id, year, month, discipline), (quantity, amount, session_ids) in per_month.items():
+        sessions_step = sum(steps['session'].get(session_id, 0) for session_id in session_ids)
+        if not (quantity or amount or sessions_step):
+            continue
+        rollups = ProjectMonthlyRollup.objects.filter(
+            project_id=project_id, year=year, month=month, discipline_choice=discipline
+        )
+        values = {
+            'total_quantity': F('total_quantity') + quantity,
+            'total_amount': F('total_amount') + amount,
+            'sessions_count': F('sessions_count') + sessions_step,
+        }
+        if rollups.update(**values):
+            continue
+        if sessions_step < 0 or quantity < 0 or amount < 0:
+            # ردیف ماه وجود ندارد ولی چیزی از آن کم می‌شود؛ جمع‌های ماهانه پروژه بازسازی می‌شوند
+            mark_dirty(project_id)
+            continue
+        try:
+            with transaction.atomic():
+                ProjectMonthlyRollup.objects.create(
+                    project_id=project_id, year=year, month=month, discipline_choice=discipline,
+                    total_quantity=quantity, total_amount=amount, sessions_count=sessions_step,
+                )
+        except IntegrityError:
+            # درخواست همزمان ردیف را ساخته است
+            rollups.update(**values)
+
+
+def _recount_session_items(session_id):
+    from .models import MeasurementSession, MeasurementSessionItem
+
+    items_count = MeasurementSessionItem.objects.filter(
+        measurement_session_number_id=session_id, is_active=True
+    ).count()
+    MeasurementSession.objects.filter(pk=session_id).update(items_count=items_count)
+
+
+def _schedule_full_item_refresh(item):
+    """مسیر جایگزین وقتی مقادیر قبلی آیتم در دسترس نیست"""
+    from .models import MeasurementSession
+
+    session_id = item.measurement_session_number_id
+    _recount_session_items(session_id)
+    project_id = MeasurementSession.objects.filter(pk=session_id).values_list(
+        'project_id', flat=True
+    ).first()
+    mark_dirty(project_id, [item.pricelist_item_id], [session_id])
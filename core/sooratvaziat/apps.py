@@ -8,4 +8,9 @@ class SooratvaziatConfig(AppConfig):
     name = 'sooratvaziat'
     
     def ready(self):
-        import sooratvaziat.signals  # Import signals
\ No newline at end of file
+        import sooratvaziat.signals  # Import signals
+        from core import loaded_state
+        from .models import MeasurementSessionItem
+
+        # مقادیر بارگذاری‌شده آیتم‌ها مبنای اعمال تفاضلی مجموع‌هاست
+        loaded_state.track(MeasurementSessionItem)
\ No newline at end of file
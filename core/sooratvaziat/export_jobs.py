@@ -0,0 +1,144 @@
+# sooratvaziat/export_jobs.py
+"""
+اجرای کارهای خروجی گزارش مالی (ExportJob) خارج از worker وب
+
+درخواست خروجی فقط یک ExportJob ثبت می‌کند؛ پس از commit شناسه کار به یک process pool
+سپرده می‌شود تا رندر PDF (xhtml2pdf) و اکسل، worker وب را مشغول نکند.
+پردازه‌ها با روش spawn ساخته می‌شوند و هر کدام یک بار django.setup() اجرا می‌کنند.
+
+تنظیمات:
+- EXPORT_JOB_WORKERS: تعداد پردازه‌ها (0 یعنی اجرای همزمان پس از commit، مناسب توسعه)
+- EXPORT_JOB_TTL_HOURS: مدت نگهداری فایل‌های آماده؛ پاکسازی با دستور cleanup_export_jobs
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'EXPORT_JOB_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+    return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        _executor = None
+
+
+def start_export_job(job):
+    """ارسال کار برای اجرا پس از commit تراکنش جاری"""
+    job_id = job.pk
+    transaction.on_commit(lambda: _submit(job_id))
+
+
+def _submit(job_id):
+    if getattr(settings, 'EXPORT_JOB_WORKERS', 2) <= 0:
+        run_export_job(job_id)
+        return
+
+    try:
+        future = _get_executor().submit(run_export_job, job_id)
+    except BrokenProcessPool:
+        # پردازه‌ای به طور غیرعادی بسته شده؛ pool جدید ساخته می‌شود
+        _reset_executor()
+        future = _get_executor().submit(run_export_job, job_id)
+    future.add_done_callback(lambda f: _on_done(job_id, f))
+
+
+def _on_done(job_id, future):
+    error = future.exception()
+    if error is None:
+        return
+    logger.error(f"اجرای کار خروجی {job_id} متوقف شد: {error}")
+    if isinstance(error, BrokenProcessPool):
+        _reset_executor()
+    _set_status(job_id, status='failed', error=str(error), finished_at=timezone.now(),
+                expires_at=_expires_at())
+
+
+def _expires_at():
+    return timezone.now() + timedelta(hours=getattr(settings, 'EXPORT_JOB_TTL_HOURS', 24))
+
+
+def _set_status(job_id, **fields):
+    from .models import ExportJob
+    ExportJob.objects.filter(pk=job_id).update(**fields)
+
+
+def run_export_job(job_id):
+    """
+    رندر فایل یک کار خروجی و ذخیره آن زیر PRIVATE_MEDIA_ROOT
+    در پردازه پس‌زمینه اجرا می‌شود؛ خطاها روی خود کار ثبت می‌شوند.
+    """
+    from .models import ExportJob
+    from .reports import cached_financial_report
+
+    close_old_connections()
+    try:
+        # فقط کارهای در صف برداشته می‌شوند تا یک کار دو بار اجرا نشود
+        claimed = ExportJob.objects.filter(pk=job_id, status=ExportJob.STATUS_PENDING).update(
+            status=ExportJob.STATUS_RUNNING, started_at=timezone.now(), progress=5
+        )
+        if not claimed:
+            return
+
+        job = ExportJob.objects.select_related('project', 'requested_by').get(pk=job_id)
+        project = job.project
+
+        try:
+            # اگر همین نسخه قبلاً ساخته شده باشد، فایل از کش دیسکی برداشته می‌شود
+            path = cached_financial_report(
+                project,
+                job.export_format,
+                progress=lambda percent: _set_status(job_id, progress=percent),
+            )
+            with open(path, 'rb') as cached:
+                job.file.save(job.download_name, File(cached), save=False)
+
+            _set_status(
+                job_id,
+                file=job.file.name,
+                status=ExportJob.STATUS_DONE,
+                progress=100,
+                finished_at=timezone.now(),
+                expires_at=_expires_at(),
+            )
+            logger.info(f"Export job {job_id} finished: {job.file.name}")
+
+        except Exception as e:
+            logger.error(f"خطا در اجرای کار خروجی {job_id}: {str(e)}")
+            _set_status(
+                job_id,
+                status=ExportJob.STATUS_FAILED,
+                error=str(e),
+                finished_at=timezone.now(),
+                expires_at=_expires_at(),
+            )
+    finally:
+        close_old_connections()
@@ -0,0 +1,12 @@
+# sooratvaziat/management/commands/cleanup_export_jobs.py
+from django.core.management.base import BaseCommand
+
+from sooratvaziat.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = 'حذف فایل‌ها و رکوردهای کارهای خروجی منقضی‌شده (EXPORT_JOB_TTL_HOURS)'
+
+    def handle(self, *args, **options):
+        removed = ExportJob.cleanup_expired()
+        self.stdout.write(self.style.SUCCESS(f'{removed} کار خروجی منقضی‌شده حذف شد'))
@@ -0,0 +1,73 @@
+# sooratvaziat/management/commands/recalculate_item_quantities.py
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.management.base import BaseCommand
+
+from sooratvaziat.aggregates import rebuild_project
+from sooratvaziat.models import MeasurementSessionItem
+
+# دقت ستون‌های quantity و item_total
+CENTS = Decimal('0.01')
+
+
+class Command(BaseCommand):
+    help = (
+        'بازمحاسبه مقدار و مبلغ ذخیره‌شده آیتم‌های صورت جلسه از روی نوع واحد فعلی فهرست بها '
+        'و بازسازی کامل مجموع‌های پروژه‌های تغییرکرده (پس از تعیین یا تغییر نوع واحدها)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--project',
+            type=int,
+            action='append',
+            dest='projects',
+            help='فقط آیتم‌های این پروژه (قابل تکرار)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='تعداد آیتم‌های هر دسته به‌روزرسانی',
+        )
+
+    def handle(self, *args, **options):
+        items = MeasurementSessionItem.objects.select_related(
+            'pricelist_item', 'measurement_session_number'
+        ).only(
+            'id', 'count', 'length', 'width', 'height', 'weight', 'unit_price', 'quantity', 'item_total',
+            'pricelist_item__unit', 'pricelist_item__unit_type',
+            'measurement_session_number__project_id',
+        ).order_by('pk')
+        if options.get('projects'):
+            items = items.filter(measurement_session_number__project_id__in=options['projects'])
+
+        batch_size = options['batch_size']
+        checked = 0
+        updated = 0
+        changed = []
+        project_ids = set()
+        for item in items.iterator(chunk_size=batch_size):
+            checked += 1
+            # همان محاسبه MeasurementSessionItem.save با گرد کردن به دقت ستون‌ها
+            quantity = Decimal(item.get_total_item_amount()).quantize(CENTS, rounding=ROUND_HALF_UP)
+            item_total = (quantity * item.unit_price).quantize(CENTS, rounding=ROUND_HALF_UP)
+            if (quantity, item_total) != (item.quantity, item.item_total):
+                item.quantity = quantity
+                item.item_total = item_total
+                changed.append(item)
+                project_ids.add(item.measurement_session_number.project_id)
+            if len(changed) >= batch_size:
+                updated += MeasurementSessionItem.objects.bulk_update(changed, ['quantity', 'item_total'])
+                changed = []
+
+        if changed:
+            updated += MeasurementSessionItem.objects.bulk_update(changed, ['quantity', 'item_total'])
+
+        # مجموع‌های ذخیره‌شده (ریز متره، صورت وضعیت، خلاصه مالی، داشبورد و ماهانه) از نو ساخته می‌شوند
+        for project_id in sorted(project_ids):
+            rebuild_project(project_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{checked} آیتم بررسی، مقدار {updated} آیتم اصلاح و مجموع‌های {len(project_ids)} پروژه بازسازی شد'
+        ))
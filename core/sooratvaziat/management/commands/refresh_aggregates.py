@@ -0,0 +1,63 @@
+# sooratvaziat/management/commands/refresh_aggregates.py
+from django.core.management.base import BaseCommand
+
+from project.models import Project
+from sooratvaziat.aggregates import process_markers, rebuild_project
+from sooratvaziat.models import AggregateRefreshMarker
+
+
+class Command(BaseCommand):
+    help = 'پردازش نشانگرهای بازمحاسبه ریز متره‌ها و خلاصه‌های مالی (صف بازمحاسبه تأخیری)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--project',
+            type=int,
+            action='append',
+            dest='projects',
+            help='فقط نشانگرهای این پروژه (قابل تکرار)',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='بازسازی کامل همه مجموع‌ها (کنترل سازگاری مسیر تفاضلی)',
+        )
+
+    def handle(self, *args, **options):
+        project_ids = options.get('projects')
+
+        if options['full']:
+            self.rebuild(project_ids)
+            return
+
+        pending = AggregateRefreshMarker.objects.all()
+        if project_ids:
+            pending = pending.filter(project_id__in=project_ids)
+        markers_count = pending.count()
+
+        if not markers_count:
+            self.stdout.write('نشانگری برای پردازش وجود ندارد')
+            return
+
+        processed = process_markers(project_ids or None)
+        self.stdout.write(self.style.SUCCESS(
+            f'{markers_count} نشانگر بررسی و مجموع‌های {processed} پروژه بازمحاسبه شد'
+        ))
+
+    def rebuild(self, project_ids):
+        projects = Project.objects.all()
+        if project_ids:
+            projects = projects.filter(pk__in=project_ids)
+
+        drifted_total = 0
+        for project_id in projects.values_list('pk', flat=True):
+            drifted = rebuild_project(project_id)
+            drifted_total += drifted
+            if drifted:
+                self.stdout.write(self.style.WARNING(
+                    f'پروژه {project_id}: {drifted} ریز متره با مقدار بازسازی‌شده اختلاف داشت'
+                ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'بازسازی کامل انجام شد ({drifted_total} ریز متره اصلاح شد)'
+        ))
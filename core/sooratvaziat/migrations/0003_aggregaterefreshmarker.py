@@ -0,0 +1,30 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fehrestbaha', '0002_alter_historicalpricelist_options_and_more'),
+        ('project', '0002_historicalproject_vat_percentage_and_more'),
+        ('sooratvaziat', '0002_alter_detailedmeasurement_price_list_item'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AggregateRefreshMarker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='زمان ثبت')),
+                ('measurement_session', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sooratvaziat.measurementsession', verbose_name='صورت‌جلسه')),
+                ('price_list_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='fehrestbaha.pricelistitem', verbose_name='آیتم فهرست بها')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aggregate_refresh_markers', to='project.project', verbose_name='پروژه')),
+            ],
+            options={
+                'verbose_name': 'نشانگر بازمحاسبه',
+                'verbose_name_plural': 'نشانگرهای بازمحاسبه',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['project', 'created_at'], name='sooratvazia_project_cdbf76_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fehrestbaha', '0002_alter_historicalpricelist_options_and_more'),
+        ('project', '0002_historicalproject_vat_percentage_and_more'),
+        ('sooratvaziat', '0003_aggregaterefreshmarker'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeasurementSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_quantity', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='مجموع مقدار')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='مجموع مبلغ')),
+                ('unit_price', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='قیمت واحد')),
+                ('sessions_count', models.PositiveIntegerField(default=0, verbose_name='تعداد صورت‌جلسات')),
+                ('items_count', models.PositiveIntegerField(default=0, verbose_name='تعداد ردیف‌ها')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('price_list_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='project_summaries', to='fehrestbaha.pricelistitem', verbose_name='آیتم فهرست بها')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_list_summaries', to='project.project', verbose_name='پروژه')),
+            ],
+            options={
+                'verbose_name': 'خلاصه آیتم فهرست بها',
+                'verbose_name_plural': 'خلاصه آیتم‌های فهرست بها',
+                'ordering': ['price_list_item__row_number'],
+                'unique_together': {('project', 'price_list_item')},
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+import django.db.models.deletion
+import sooratvaziat.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0002_historicalproject_vat_percentage_and_more'),
+        ('sooratvaziat', '0004_measurementsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('export_format', models.CharField(choices=[('pdf', 'PDF'), ('xlsx', 'اکسل')], max_length=10, verbose_name='فرمت')),
+                ('status', models.CharField(choices=[('pending', 'در صف'), ('running', 'در حال تولید'), ('done', 'آماده'), ('failed', 'ناموفق')], default='pending', max_length=20, verbose_name='وضعیت')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='درصد پیشرفت')),
+                ('file', models.FileField(blank=True, upload_to=sooratvaziat.models.export_job_upload_to, verbose_name='فایل خروجی')),
+                ('error', models.TextField(blank=True, verbose_name='خطا')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='زمان ثبت')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان شروع')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان پایان')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان انقضا')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='project.project', verbose_name='پروژه')),
+                ('requested_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL, verbose_name='درخواست‌دهنده')),
+            ],
+            options={
+                'verbose_name': 'کار خروجی گزارش',
+                'verbose_name_plural': 'کارهای خروجی گزارش',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='sooratvazia_status_c193ee_idx')],
+            },
+        ),
+    ]
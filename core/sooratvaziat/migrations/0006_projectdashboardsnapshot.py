@@ -0,0 +1,31 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0002_historicalproject_vat_percentage_and_more'),
+        ('sooratvaziat', '0005_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectDashboardSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sessions_count', models.PositiveIntegerField(default=0, verbose_name='تعداد صورت‌جلسات')),
+                ('approved_sessions_count', models.PositiveIntegerField(default=0, verbose_name='صورت‌جلسات تایید‌شده')),
+                ('items_count', models.PositiveIntegerField(default=0, verbose_name='تعداد ردیف‌ها')),
+                ('pricelist_items_count', models.PositiveIntegerField(default=0, verbose_name='تعداد آیتم‌های فهرست بها')),
+                ('measured_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='مبلغ کل متره')),
+                ('last_session_at', models.DateTimeField(blank=True, null=True, verbose_name='آخرین تغییر صورت‌جلسه')),
+                ('refreshed_at', models.DateTimeField(auto_now=True, verbose_name='زمان به‌روزرسانی')),
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_snapshot', to='project.project', verbose_name='پروژه')),
+            ],
+            options={
+                'verbose_name': 'آمار داشبورد پروژه',
+                'verbose_name_plural': 'آمار داشبورد پروژه‌ها',
+            },
+        ),
+    ]
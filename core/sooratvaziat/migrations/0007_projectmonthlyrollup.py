@@ -0,0 +1,32 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0002_historicalproject_vat_percentage_and_more'),
+        ('sooratvaziat', '0006_projectdashboardsnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='سال (شمسی)')),
+                ('month', models.PositiveSmallIntegerField(verbose_name='ماه (شمسی)')),
+                ('discipline_choice', models.CharField(choices=[('AB', 'ابنیه'), ('ME', 'مکانیک'), ('EL', 'برق'), ('OT', 'سایر')], max_length=2, verbose_name='رشته')),
+                ('total_quantity', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='مجموع مقدار')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='مجموع مبلغ')),
+                ('sessions_count', models.PositiveIntegerField(default=0, verbose_name='تعداد صورت‌جلسات')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to='project.project', verbose_name='پروژه')),
+            ],
+            options={
+                'verbose_name': 'جمع ماهانه پروژه',
+                'verbose_name_plural': 'جمع‌های ماهانه پروژه',
+                'ordering': ['year', 'month', 'discipline_choice'],
+                'unique_together': {('project', 'year', 'month', 'discipline_choice')},
+            },
+        ),
+    ]
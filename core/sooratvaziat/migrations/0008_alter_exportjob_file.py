@@ -0,0 +1,18 @@
+import core.private_files
+import sooratvaziat.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sooratvaziat', '0007_projectmonthlyrollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='file',
+            field=models.FileField(blank=True, storage=core.private_files.private_storage, upload_to=sooratvaziat.models.export_job_upload_to, verbose_name='فایل خروجی'),
+        ),
+    ]
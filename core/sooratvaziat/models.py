@@ -2,12 +2,18 @@
 from django.db import models
 from django.utils import timezone
 from fehrestbaha.models import PriceListItem, DisciplineChoices
+from fehrestbaha.pricing import resolve_price, resolve_related_price
+from fehrestbaha.units import QUANTITY_DIMENSIONS, classify_unit, unit_type_expression
 from django.core.validators import MinValueValidator
 from decimal import Decimal
-from simple_history.models import HistoricalRecords
+from core import loaded_state
+from core.private_files import private_storage
+from core.history import TrackedHistoricalRecords, is_enabled as history_enabled
 from django.contrib.auth.models import User
 from project.models import Project  # import Project
-from django.db.models import Sum, Count, Q
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, NullIf
+from django.db.models.lookups import Exact
 from collections import OrderedDict
 import jdatetime
 import logging
@@ -16,6 +22,9 @@ from accounts.models import ProjectRole
 logger = logging.getLogger(__name__)
 from django.utils.translation import gettext_lazy as _
 
+# نوع خروجی عبارت‌های مقدار/مبلغ محاسبه‌شده در پایگاه داده
+QUANTITY_OUTPUT = DecimalField(max_digits=30, decimal_places=2)
+
 # حالا متد update_detailed_measurements در MeasurementSession
 class MeasurementSession(models.Model):
     """
@@ -113,7 +122,7 @@ class MeasurementSession(models.Model):
         verbose_name="ویرایش‌کننده"
     )
     
-    history = HistoricalRecords()
+    history = TrackedHistoricalRecords(ignore_fields=['items_count', 'updated_at'])
 
     class Meta:
         verbose_name = "صورت جلسه"
@@ -142,32 +151,33 @@ class MeasurementSession(models.Model):
         
         super().save(*args, **kwargs)
         
-        # به‌روزرسانی DetailedMeasurement پس از ذخیره
-        self.update_detailed_measurements()
+        # بازمحاسبه ریز متره‌ها و خلاصه مالی پس از commit (تأخیری و تجمیع‌شده)
+        self.schedule_aggregate_refresh()
+
+    def schedule_aggregate_refresh(self, price_list_item_ids=None):
+        """
+        ثبت بازمحاسبه تأخیری ریز متره‌ها، صورت وضعیت و خلاصه مالی این صورت جلسه
+        (به‌صورت پیش‌فرض همه آیتم‌های فهرست بهای صورت جلسه، حتی غیرفعال‌ها)
+        """
+        from .aggregates import mark_dirty
+
+        if price_list_item_ids is None:
+            price_list_item_ids = self.items.values_list('pricelist_item_id', flat=True).distinct()
+        mark_dirty(self.project_id, price_list_item_ids, [self.pk])
 
     def update_detailed_measurements(self):
         """
-        به‌روزرسانی ریز متره‌های دقیق (DetailedMeasurement) برای این صورت جلسه
-        این متد پس از ذخیره/به‌روزرسانی صورت جلسه فراخوانی می‌شود
+        به‌روزرسانی همزمان ریز متره‌های دقیق (DetailedMeasurement) برای این صورت جلسه
+        (مسیر عادی ذخیره از schedule_aggregate_refresh استفاده می‌کند)
         """
         try:
-            from sooratvaziat.models import DetailedMeasurement
-            
-            # دریافت تمام آیتم‌های فهرست بهایی که در این صورت جلسه استفاده شده‌اند
-            price_list_items = PriceListItem.objects.filter(
-                session_items__measurement_session_number=self,
-                session_items__is_active=True
-            ).distinct()
-            
-            for price_list_item in price_list_items:
-                # ایجاد یا به‌روزرسانی ریز متره برای این آیتم و پروژه
-                DetailedMeasurement.update_or_create_for_project(
-                    project=self.project,
-                    price_list_item=price_list_item
-                )
+            from .aggregates import refresh_project
             
-            # همچنین به‌روزرسانی خلاصه مالی پروژه
-            self.update_project_financial_summary()
+            # تمام آیتم‌های فهرست بهایی که در این صورت جلسه استفاده شده‌اند
+            price_list_item_ids = set(
+                self.items.values_list('pricelist_item_id', flat=True).distinct()
+            )
+            refresh_project(self.project_id, price_list_item_ids, [self.pk])
             
             return True
             
@@ -195,6 +205,141 @@ class MeasurementSession(models.Model):
             logger.error(f"خطا در به‌روزرسانی خلاصه مالی پروژه {self.project.id}: {str(e)}")
             return False
 
+    def add_items_bulk(self, rows, user=None, batch_size=500):
+        """
+        افزودن دسته‌ای آیتم‌ها به صورت جلسه (برای ورود اطلاعات اکسل یا کپی صورت جلسه)
+
+        هر ردیف یک dict با کلیدهای pricelist_item (یا pricelist_item_id)، row_description،
+        length، width، height، weight، count، notes و به‌صورت اختیاری unit_price است.
+        مقدار و مبلغ هر ردیف در حافظه محاسبه می‌شود، آیتم‌ها با bulk_create ذخیره می‌شوند،
+        تاریخچه و لاگ ممیزی به‌صورت دسته‌ای نوشته می‌شود و ریز متره‌ها و خلاصه مالی
+        فقط یک بار در انتهای کار به‌روزرسانی می‌شوند.
+        ردیف‌های تکراری (همان آیتم فهرست بها و شرح ردیف، در دسته یا صورت جلسه) مانند
+        بقیه خطاها پیش از ذخیره برای همان ردیف گزارش می‌شوند.
+        """
+        from django.core.exceptions import ValidationError
+        from django.db import transaction
+        from simple_history.utils import bulk_create_with_history
+
+        rows = list(rows)
+        if not rows:
+            return []
+
+        # دریافت همه آیتم‌های فهرست بها با یک کوئری
+        pricelist_ids = set()
+        for row in rows:
+            pricelist_item = row.get('pricelist_item')
+            pricelist_ids.add(
+                pricelist_item.pk if isinstance(pricelist_item, PriceListItem)
+                else row.get('pricelist_item_id', pricelist_item)
+            )
+        pricelist_items = PriceListItem.objects.in_bulk(pricelist_ids)
+
+        # ردیف‌های موجود صورت جلسه (حتی غیرفعال) برای کنترل unique_together پیش از bulk_create
+        taken = set(
+            self.items.filter(pricelist_item_id__in=pricelist_items.keys()).values_list(
+                'pricelist_item_id', 'row_description'
+            )
+        )
+
+        items = []
+        errors = {}
+        dimension_fields = ('length', 'width', 'height', 'weight')
+        for index, row in enumerate(rows):
+            pricelist_item = row.get('pricelist_item')
+            if not isinstance(pricelist_item, PriceListItem):
+                pricelist_item = pricelist_items.get(row.get('pricelist_item_id', pricelist_item))
+            if pricelist_item is None:
+                errors[index] = ["آیتم فهرست بها یافت نشد"]
+                continue
+
+            key = (pricelist_item.pk, row.get('row_description', ''))
+            if key in taken:
+                errors[index] = ["این شرح ردیف برای این آیتم فهرست بها در صورت جلسه تکراری است"]
+                continue
+            taken.add(key)
+
+            item = MeasurementSessionItem(
+                measurement_session_number=self,
+                pricelist_item=pricelist_item,
+                row_description=row.get('row_description', ''),
+                # فقط تعداد نامشخص 1 است؛ صفر و منفی را MinValueValidator فیلد رد می‌کند
+                count=Decimal('1') if row.get('count') is None else row.get('count'),
+                notes=row.get('notes', ''),
+                unit_price=row.get('unit_price') or Decimal('0'),
+                created_by=user,
+                modified_by=user,
+                **{field: row.get(field) for field in dimension_fields},
+            )
+            try:
+                item.clean_fields(exclude=[
+                    'measurement_session_number', 'pricelist_item', 'created_by', 'modified_by',
+                ])
+            except ValidationError as e:
+                errors[index] = e.messages
+                continue
+
+            # همان محاسبات MeasurementSessionItem.save بدون ذخیره تک‌تک
+            if not item.unit_price:
+                item.unit_price = item._get_price_from_pricelist()
+            item.quantity = item.get_total_item_amount()
+            item.item_total = item.quantity * item.unit_price
+            items.append(item)
+
+        if errors:
+            raise ValidationError(
+                [f"ردیف {index + 1}: {'، '.join(messages)}" for index, messages in errors.items()]
+            )
+
+        with transaction.atomic():
+            created = bulk_create_with_history(
+                items, MeasurementSessionItem,
+                batch_size=batch_size,
+                default_user=user,
+            )
+
+            try:
+                from ProjectLog.models import AuditLog
+                AuditLog.log_bulk(created, 'create', user=user, batch_size=batch_size)
+            except Exception as e:
+                logger.error(f"خطا در ثبت لاگ ممیزی دسته‌ای برای صورت جلسه {self.id}: {str(e)}")
+
+            self.items_count = self.items.filter(is_active=True).count()
+            MeasurementSession.objects.filter(pk=self.pk).update(items_count=self.items_count)
+
+            # یک بار بازمحاسبه ریز متره‌ها و خلاصه مالی برای کل دسته (پس از commit)
+            self.schedule_aggregate_refresh({item.pricelist_item_id for item in created})
+
+        return created
+
+    def duplicate(self, user=None):
+        """
+        کپی صورت جلسه به صورت پیش‌نویس با همه آیتم‌های فعال آن (از مسیر add_items_bulk)
+        خروجی: صورت جلسه جدید
+        """
+        from django.db import transaction
+
+        copy_fields = ('length', 'width', 'height', 'weight', 'count', 'notes', 'unit_price')
+        rows = [
+            dict(zip(('pricelist_item_id', 'row_description') + copy_fields, values))
+            for values in self.items.filter(is_active=True).order_by('id').values_list(
+                'pricelist_item_id', 'row_description', *copy_fields
+            )
+        ]
+
+        with transaction.atomic():
+            session = MeasurementSession(
+                project_id=self.project_id,
+                price_list_id=self.price_list_id,
+                session_date=self.session_date,
+                description=self.description,
+                notes=self.notes,
+                status='draft',
+            )
+            session.save(user=user)
+            session.add_items_bulk(rows, user=user)
+        return session
+
     def recalculate_session_totals(self):
         """
         محاسبه مجدد مجموع‌های این صورت جلسه
@@ -261,7 +406,7 @@ class MeasurementSession(models.Model):
                 }
             
             item_amount = item.get_total_item_amount()
-            item_total = item_amount * self._get_unit_price(pl)
+            item_total = item_amount * groups[key]['unit_price']
             
             # اضافه کردن به زیرگروه
             groups[key]['sub_rows'][row_key]['items'].append({
@@ -333,15 +478,7 @@ class MeasurementSession(models.Model):
     
     def _get_unit_price(self, pricelist_item):
         """استخراج قیمت واحد از PriceListItem"""
-        for field in ['price', 'unit_price', 'rate', 'baha']:
-            if hasattr(pricelist_item, field):
-                value = getattr(pricelist_item, field)
-                if value is not None:
-                    try:
-                        return Decimal(str(value)).quantize(Decimal('0.00'))
-                    except (ValueError, TypeError):
-                        continue
-        return Decimal('0.00')
+        return resolve_price(pricelist_item)
     
     @staticmethod
     def _format_number(value):
@@ -382,10 +519,107 @@ class MeasurementSession(models.Model):
     def delete(self, *args, **kwargs):
         """حذف نرم"""
         self.is_active = False
-        self.save()
-        
-        # به‌روزرسانی ریز متره‌ها پس از حذف
-        self.update_detailed_measurements()
+        self.save()  # save بازمحاسبه ریز متره‌ها را زمان‌بندی می‌کند
+
+def item_quantity_expression():
+    """
+    عبارت SQL مقدار کل آیتم صورت جلسه (همان get_total_item_amount)
+    بر اساس نوع واحد آیتم فهرست بها؛ نوع واحد آیتم‌هایی که هنوز unit_type
+    ندارند مانند classify_unit از روی واحد متنی تعیین می‌شود.
+    """
+    zero = Value(Decimal('0'))
+    unit_type_value = Coalesce(F('pricelist_item__unit_type'), unit_type_expression('pricelist_item__unit'))
+    whens = []
+    for unit_type, dimensions in QUANTITY_DIMENSIONS.items():
+        quantity = F('count')
+        for dimension in dimensions:
+            quantity = quantity * Coalesce(F(dimension), zero)
+        whens.append(When(Exact(unit_type_value, unit_type.value), then=quantity))
+    return Case(*whens, default=F('count'), output_field=QUANTITY_OUTPUT)
+
+
+class MeasurementSessionItemQuerySet(models.QuerySet):
+    """محاسبه مقدار و مبلغ آیتم‌ها در پایگاه داده، بدون بارگذاری نمونه‌ها"""
+
+    def with_quantities(self):
+        """
+        افزودن computed_quantity (مقدار از روی ابعاد و نوع واحد) و
+        computed_amount (مقدار × قیمت واحد خود آیتم، همان item_total)؛ مانند save
+        قیمت واحد خالی یا صفر با قیمت فهرست بها جایگزین می‌شود
+        """
+        zero = Value(Decimal('0'))
+        return self.annotate(computed_quantity=item_quantity_expression()).annotate(
+            computed_amount=ExpressionWrapper(
+                F('computed_quantity') * Coalesce(NullIf(F('unit_price'), zero), F('pricelist_item__price'), zero),
+                output_field=QUANTITY_OUTPUT,
+            )
+        )
+
+    def quantity_totals(self):
+        """جمع مقدار، جمع مبلغ و تعداد آیتم‌ها با یک پرس‌وجو"""
+        totals = self.with_quantities().aggregate(
+            total_quantity=Sum('computed_quantity'),
+            total_amount=Sum('computed_amount'),
+            items_count=Count('id'),
+        )
+        totals['total_quantity'] = totals['total_quantity'] or Decimal('0')
+        totals['total_amount'] = totals['total_amount'] or Decimal('0')
+        return totals
+
+    def soft_delete(self, user=None, batch_size=500):
+        """حذف نرم دسته‌ای آیتم‌ها؛ خروجی: تعداد آیتم‌های حذف‌شده"""
+        return self._set_active(False, user=user, batch_size=batch_size)
+
+    def restore(self, user=None, batch_size=500):
+        """بازگردانی دسته‌ای آیتم‌های حذف‌شده؛ خروجی: تعداد آیتم‌های بازگردانده‌شده"""
+        return self._set_active(True, user=user, batch_size=batch_size)
+
+    def _set_active(self, active, user=None, batch_size=500):
+        """
+        تغییر وضعیت فعال آیتم‌ها با یک UPDATE، ثبت دسته‌ای تاریخچه و لاگ ممیزی و
+        اعمال تفاضل آیتم‌ها روی تعداد آیتم‌های صورت جلسه‌ها، ریز متره‌ها، صورت وضعیت‌ها
+        و خلاصه مالی پروژه‌های تحت تأثیر (بدون بازمحاسبه کامل)
+        """
+        from django.db import transaction
+        from .aggregates import apply_item_changes, item_snapshot
+
+        items = list(self.filter(is_active=not active).select_related('pricelist_item'))
+        if not items:
+            return 0
+
+        now = timezone.now()
+        values = {'is_active': active, 'updated_at': now}
+        if user is not None:
+            values['modified_by'] = user
+
+        with transaction.atomic():
+            MeasurementSessionItem.objects.filter(pk__in=[item.pk for item in items]).update(**values)
+
+            changes = []
+            for item in items:
+                previous = item_snapshot(item)
+                for field, value in values.items():
+                    setattr(item, field, value)
+                loaded_state.remember(item, values)
+                changes.append((item.pk, previous, item_snapshot(item)))
+
+            if history_enabled(MeasurementSessionItem):
+                MeasurementSessionItem.history.bulk_history_create(
+                    items, batch_size=batch_size, update=True, default_user=user, default_date=now,
+                )
+
+            try:
+                from ProjectLog.models import AuditLog
+                AuditLog.log_bulk(
+                    items, 'update', user=user, changed_data={'is_active': {'old': str(not active), 'new': str(active)}}, batch_size=batch_size
+                )
+            except Exception as e:
+                logger.error(f"خطا در ثبت لاگ ممیزی دسته‌ای آیتم‌های صورت جلسه: {str(e)}")
+
+            apply_item_changes(changes, user=user)
+
+        return len(items)
+
 
 class MeasurementSessionItem(models.Model):
     """
@@ -523,7 +757,8 @@ class MeasurementSessionItem(models.Model):
         verbose_name="ویرایش‌کننده"
     )
     
-    history = HistoricalRecords()
+    objects = MeasurementSessionItemQuerySet.as_manager()
+    history = TrackedHistoricalRecords(ignore_fields=['quantity', 'item_total', 'updated_at'])
     
     class Meta:
         verbose_name = "آیتم صورت‌جلسه"
@@ -536,7 +771,11 @@ class MeasurementSessionItem(models.Model):
     
     def save(self, *args, **kwargs):
         """Override save برای محاسبات خودکار هر ردیف"""
+        from .aggregates import loaded_item_snapshot
+
         user = kwargs.pop('user', None)
+        # مقادیر قبلی برای محاسبه تفاضل (None برای آیتم جدید)
+        previous = None if self._state.adding else loaded_item_snapshot(self)
         
         if not self.created_by:
             self.created_by = user
@@ -552,36 +791,42 @@ class MeasurementSessionItem(models.Model):
         
         super().save(*args, **kwargs)
         
-        # به‌روزرسانی تعداد آیتم‌های صورت‌جلسه و ریز متره‌ها
-        if self.measurement_session_number:
-            # به‌روزرسانی تعداد آیتم‌ها در صورت جلسه
-            session = self.measurement_session_number
-            session.items_count = session.items.filter(is_active=True).count()
-            session.save(user=user)
+        # اعمال تفاضل روی تعداد آیتم‌های صورت‌جلسه، ریز متره و صورت وضعیت
+        if self.measurement_session_number_id:
+            self.update_aggregates(previous, user=user)
+
+    def update_aggregates(self, previous, user=None, removed=False):
+        """
+        اعمال تغییر این آیتم روی مجموع‌ها به صورت تفاضلی (بدون save کامل صورت جلسه)
+        و به‌روزرسانی زمان آخرین ویرایش صورت جلسه
+        """
+        from .aggregates import apply_item_change
+
+        apply_item_change(self, previous, removed=removed, user=user)
     
-    def delete(self, *args, **kwargs):
-        """حذف نرم"""
-        session = self.measurement_session_number
+    def delete(self, *args, user=None, **kwargs):
+        """
+        حذف نرم؛ فقط وضعیت فعال، ویرایش‌کننده و زمان ویرایش ذخیره می‌شود
+        (تاریخچه و لاگ ممیزی با همان کاربر) و تغییر به صورت تفاضلی روی مجموع‌ها اعمال می‌شود
+        """
+        from .aggregates import loaded_item_snapshot
+
+        if not self.is_active:
+            return
+
+        previous = loaded_item_snapshot(self)
         self.is_active = False
-        self.save()
-        
-        # به‌روزرسانی صورت جلسه و ریز متره‌ها پس از حذف
-        if session:
-            session.items_count = session.items.filter(is_active=True).count()
-            session.save()
+        if user is not None:
+            self.modified_by = user
+            self._history_user = user
+        super().save(update_fields=['is_active', 'modified_by', 'updated_at'])
+
+        if self.measurement_session_number_id:
+            self.update_aggregates(previous, user=user)
 
     def _get_price_from_pricelist(self):
         """استخراج قیمت از PriceListItem"""
-        pl = self.pricelist_item
-        for field in ['price', 'unit_price', 'rate', 'baha']:
-            if hasattr(pl, field):
-                value = getattr(pl, field)
-                if value is not None:
-                    try:
-                        return Decimal(str(value)).quantize(Decimal('0.00'))
-                    except (ValueError, TypeError):
-                        continue
-        return Decimal('0.00')
+        return resolve_related_price(self, 'pricelist_item')
     
     def get_total_item_amount(self):
         """
@@ -591,21 +836,14 @@ class MeasurementSessionItem(models.Model):
         if not self.pricelist_item:
             return Decimal('0.00')
         
-        unit = getattr(self.pricelist_item, 'unit', '').strip().lower()
-        
-        if 'متر مربع' in unit or 'm²' in unit:
-            return self.count * (self.length or 0) * (self.width or 0)
-        elif 'متر مکعب' in unit or 'm³' in unit:
-            return self.count * (self.length or 0) * (self.width or 0) * (self.height or 0)
-        elif 'کیلوگرم' in unit or 'kg' in unit:
-            return self.count * (self.weight or 0)
-        elif 'متر' in unit or 'm' in unit:
-            return self.count * (self.length or 0)
-        elif 'عدد' in unit or 'ea' in unit or 'عدد' in unit:
-            return self.count
-        else:
-            # واحد نامشخص - فقط تعداد
-            return self.count
+        pricelist_item = self.pricelist_item
+        # نوع واحد هنگام ذخیره آیتم فهرست بها تعیین شده است (واحد نامشخص = فقط تعداد)
+        unit_type = pricelist_item.unit_type or classify_unit(pricelist_item.unit)
+
+        quantity = self.count
+        for dimension in QUANTITY_DIMENSIONS.get(unit_type, ()):
+            quantity *= getattr(self, dimension) or 0
+        return quantity
     
     @property
     def get_unit_price(self):
@@ -818,7 +1056,9 @@ class DetailedMeasurement(models.Model):
     
     # لاگ‌گیری
     created_at = models.DateTimeField(auto_now_add=True)
-    history = HistoricalRecords()
+    history = TrackedHistoricalRecords(ignore_fields=[
+        'total_quantity', 'total_amount', 'sessions_count', 'items_count', 'unit_price', 'last_updated',
+    ])
     
     class Meta:
         verbose_name = "ریز متره پروژه"
@@ -840,36 +1080,19 @@ class DetailedMeasurement(models.Model):
             is_active=True
         )
         
-        # محاسبه مجموع‌ها
-        total_qty = Decimal('0.00')
-        total_amt = Decimal('0.00')
-        
-        for item in items:
-            item_qty = item.get_total_item_amount() or Decimal('0.00')
-            item_amt = item.item_total or Decimal('0.00')
-            total_qty += item_qty
-            total_amt += item_amt
-        
-        # آمار
-        sessions_count = items.values('measurement_session_number').distinct().count()
-        items_count = items.count()
-        
-        # به‌روزرسانی فیلدها
-        self.total_quantity = total_qty
-        self.total_amount = total_amt
-        self.sessions_count = sessions_count
-        self.items_count = items_count
-        self.unit_price = self._get_unit_price()
-        self.discipline = self.price_list_item.price_list.discipline_choice
-        self.last_updated = timezone.now()
-        
-        self.save()
+        # محاسبه مجموع‌ها با یک کوئری تجمیعی (مقدار هر ردیف در quantity ذخیره شده است)
+        totals = items.aggregate(
+            total_qty=Sum('quantity'),
+            total_amt=Sum('item_total'),
+            sessions_count=Count('measurement_session_number', distinct=True),
+            items_count=Count('id'),
+        )
         
         # به‌روزرسانی فیلدها
-        self.total_quantity = total_qty
-        self.total_amount = total_amt
-        self.sessions_count = sessions_count
-        self.items_count = items_count
+        self.total_quantity = totals['total_qty'] or Decimal('0.00')
+        self.total_amount = totals['total_amt'] or Decimal('0.00')
+        self.sessions_count = totals['sessions_count']
+        self.items_count = totals['items_count']
         self.unit_price = self._get_unit_price()
         self.discipline = self.price_list_item.price_list.discipline_choice
         self.last_updated = timezone.now()
@@ -904,16 +1127,7 @@ class DetailedMeasurement(models.Model):
     
     def _get_unit_price(self):
         """استخراج قیمت واحد از PriceListItem"""
-        pl = self.price_list_item
-        for field in ['price', 'unit_price', 'rate', 'baha']:
-            if hasattr(pl, field):
-                value = getattr(pl, field)
-                if value is not None:
-                    try:
-                        return Decimal(str(value)).quantize(Decimal('0.00'))
-                    except (ValueError, TypeError):
-                        continue
-        return Decimal('0.00')
+        return resolve_related_price(self, 'price_list_item')
     
     def get_breakdown_by_session(self):
         """تفکیک بر اساس صورت‌جلسات این پروژه"""
@@ -1049,16 +1263,7 @@ class MeasurementSummary(models.Model):
     
     def _get_unit_price(self):
         """استخراج قیمت واحد"""
-        pl = self.price_list_item
-        for field in ['price', 'unit_price', 'rate', 'baha']:
-            if hasattr(pl, field):
-                value = getattr(pl, field)
-                if value is not None:
-                    try:
-                        return Decimal(str(value)).quantize(Decimal('0.00'))
-                    except:
-                        continue
-        return Decimal('0.00')
+        return resolve_related_price(self, 'price_list_item')
     
     def get_absolute_url(self):
         """لینک به صفحه ریز متره جزئیات"""
@@ -1202,7 +1407,10 @@ class FinancialStatus(models.Model):
         verbose_name="آخرین محاسبه"
     )
     
-    history = HistoricalRecords()
+    history = TrackedHistoricalRecords(ignore_fields=[
+        'total_quantity', 'total_amount', 'active_items_count', 'unique_pricelist_items_count',
+        'row_descriptions_count', 'total_with_vat', 'updated_at', 'last_calculated_at',
+    ])
     
     class Meta:
         verbose_name = "صورت وضعیت مالی"
@@ -1224,7 +1432,7 @@ class FinancialStatus(models.Model):
             total_amt=Sum('item_total'),
             items_count=Count('id'),
             unique_pl_count=Count('pricelist_item', distinct=True),
-            unique_row_count=Count('row_description', filter=models.Q(row_description__isnull=False) & models.Q(row_description__neq=''), distinct=True)
+            unique_row_count=Count('row_description', filter=~models.Q(row_description=''), distinct=True)
         )
         
         # به‌روزرسانی فیلدها
@@ -1234,8 +1442,9 @@ class FinancialStatus(models.Model):
         self.unique_pricelist_items_count = summary['unique_pl_count'] or 0
         self.row_descriptions_count = summary['unique_row_count'] or 0
         
-        # محاسبه مالیات
-        self.total_with_vat = self.total_amount * (1 + (self.vat_rate / 100))
+        # محاسبه مالیات (مقدار پیش‌فرض vat_rate در شیء جدید float است)
+        vat_rate = Decimal(str(self.vat_rate or 0))
+        self.total_with_vat = self.total_amount * (1 + (vat_rate / 100))
         
         self.last_calculated_at = timezone.now()
     
@@ -1279,7 +1488,7 @@ class FinancialStatus(models.Model):
         
         self.total_quantity = Decimal('0')
         self.total_amount = Decimal('0')
-        self.item_count = 0
+        self.active_items_count = 0
         
         # محاسبه از آیتم‌ها
         self.recalculate_totals()
@@ -1296,35 +1505,20 @@ class FinancialStatus(models.Model):
             is_active=True
         )
         
-        self.total_quantity = sum(
-            item.get_total_item_amount() or 0 for item in active_items
-        )
-        self.total_amount = Decimal('0')
-        self.item_count = active_items.count()
-        
-        # محاسبه مبلغ کل
-        for item in active_items:
-            if item.pricelist_item:
-                qty = item.get_total_item_amount() or 0
-                unit_price = self._get_unit_price(item.pricelist_item)
-                self.total_amount += Decimal(qty) * Decimal(unit_price or 0)
+        # مقدار و مبلغ در پایگاه داده محاسبه و جمع می‌شوند
+        totals = active_items.quantity_totals()
+        self.total_quantity = totals['total_quantity']
+        self.total_amount = totals['total_amount']
+        self.active_items_count = totals['items_count']
         
         self.updated_at = timezone.now()
         self.save(update_fields=[
-            'total_quantity', 'total_amount', 'item_count', 'updated_at'
+            'total_quantity', 'total_amount', 'active_items_count', 'updated_at'
         ])
     
     def _get_unit_price(self, price_list_item):
         """استخراج قیمت واحد"""
-        for field in ['price', 'unit_price', 'rate', 'baha']:
-            if hasattr(price_list_item, field):
-                value = getattr(price_list_item, field)
-                if value is not None:
-                    try:
-                        return Decimal(str(value))
-                    except:
-                        continue
-        return Decimal('0')
+        return resolve_price(price_list_item)
 
     def recalculate_from_items(self, projects=None):
         """Recalculate totals from session items"""
@@ -1422,7 +1616,12 @@ class ProjectFinancialSummary(models.Model):
     last_updated = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
-    history = HistoricalRecords()
+    history = TrackedHistoricalRecords(ignore_fields=[
+        'total_quantity', 'total_amount', 'total_with_vat',
+        'total_quantity_abnieh', 'total_amount_abnieh', 'total_quantity_mekanik', 'total_amount_mekanik',
+        'total_quantity_bargh', 'total_amount_bargh', 'sessions_count', 'approved_sessions_count',
+        'total_items_count', 'unique_pricelist_items_count', 'progress_percentage', 'last_updated',
+    ])
     
     class Meta:
         verbose_name = "خلاصه مالی پروژه"
@@ -1432,62 +1631,76 @@ class ProjectFinancialSummary(models.Model):
     def __str__(self):
         return f"خلاصه مالی - {self.project.project_name}"
     
+    # نگاشت کد رشته به فیلدهای تفکیکی خلاصه مالی
+    DISCIPLINE_FIELDS = {
+        DisciplineChoices.ABANIE: ('total_quantity_abnieh', 'total_amount_abnieh'),
+        DisciplineChoices.MECHANIC: ('total_quantity_mekanik', 'total_amount_mekanik'),
+        DisciplineChoices.ELECTRIC: ('total_quantity_bargh', 'total_amount_bargh'),
+    }
+
     def calculate_project_totals(self):
-        """محاسبه مجموع‌های پروژه از تمام صورت‌جلسات"""
+        """محاسبه مجموع‌های پروژه از آیتم‌های فعال تمام صورت‌جلسات فعال"""
+        items = MeasurementSessionItem.objects.filter(
+            measurement_session_number__project=self.project,
+            measurement_session_number__is_active=True,
+            is_active=True
+        )
+        
         # مجموع کل
-        total_summary = FinancialStatus.objects.filter(
-            measurement_session__project=self.project,
-            measurement_session__is_active=True
+        total_summary = items.aggregate(
+            total_qty=Sum('quantity'),
+            total_amt=Sum('item_total'),
+            items_count=Count('id'),
+            unique_items=Count('pricelist_item', distinct=True)
+        )
+        sessions_summary = MeasurementSession.objects.filter(
+            project=self.project,
+            is_active=True
         ).aggregate(
-            total_qty=Sum('total_quantity'),
-            total_amt=Sum('total_amount'),
-            total_vat=Sum('total_with_vat'),
             sessions_count=Count('id'),
-            approved_count=Count('id', filter=models.Q(is_approved=True)),
-            items_count=Sum('active_items_count'),
-            unique_items=Count('measurement_session__items__pricelist_item', distinct=True, filter=models.Q(measurement_session__items__is_active=True))
+            approved_count=Count('id', filter=models.Q(status='approved'))
         )
         
+        self.vat_rate = Decimal('9.00')  # ثابت یا از تنظیمات
         self.total_quantity = total_summary['total_qty'] or Decimal('0.00')
         self.total_amount = total_summary['total_amt'] or Decimal('0.00')
-        self.total_with_vat = total_summary['total_vat'] or Decimal('0.00')
-        self.sessions_count = total_summary['sessions_count'] or 0
-        self.approved_sessions_count = total_summary['approved_count'] or 0
+        self.total_with_vat = self.total_amount * (1 + (self.vat_rate / 100))
+        self.sessions_count = sessions_summary['sessions_count'] or 0
+        self.approved_sessions_count = sessions_summary['approved_count'] or 0
         self.total_items_count = total_summary['items_count'] or 0
         self.unique_pricelist_items_count = total_summary['unique_items'] or 0
         
-        # تفکیک بر اساس رشته‌ها
-        disciplines_summary = FinancialStatus.objects.filter(
-            measurement_session__project=self.project,
-            measurement_session__is_active=True
-        ).values('measurement_session__discipline_choice').annotate(
-            total_qty=Sum('total_quantity'),
-            total_amt=Sum('total_amount')
-        )
+        # تفکیک بر اساس رشته‌ها (رشته از فهرست بهای صورت جلسه گرفته می‌شود)
+        for quantity_field, amount_field in self.DISCIPLINE_FIELDS.values():
+            setattr(self, quantity_field, Decimal('0.00'))
+            setattr(self, amount_field, Decimal('0.00'))
+        
+        disciplines_summary = items.values(
+            'measurement_session_number__price_list__discipline_choice'
+        ).annotate(
+            total_qty=Sum('quantity'),
+            total_amt=Sum('item_total')
+        ).order_by()
         
         for disc in disciplines_summary:
-            discipline = disc['measurement_session__discipline_choice']
-            qty = disc['total_qty'] or Decimal('0.00')
-            amt = disc['total_amt'] or Decimal('0.00')
-            
-            if discipline == 'ab':
-                self.total_quantity_abnieh = qty
-                self.total_amount_abnieh = amt
-            elif discipline == 'mk':
-                self.total_quantity_mekanik = qty
-                self.total_amount_mekanik = amt
-            elif discipline == 'br':
-                self.total_quantity_bargh = qty
-                self.total_amount_bargh = amt
+            fields = self.DISCIPLINE_FIELDS.get(disc['measurement_session_number__price_list__discipline_choice'])
+            if fields:
+                setattr(self, fields[0], disc['total_qty'] or Decimal('0.00'))
+                setattr(self, fields[1], disc['total_amt'] or Decimal('0.00'))
         
         # محاسبه درصد پیشرفت (نسبت به مبلغ قرارداد)
-        contract_amount = self.project.total_contract_amount or Decimal('0.00')
-        if contract_amount > 0:
-            self.progress_percentage = (self.total_amount / contract_amount) * 100
-        else:
-            self.progress_percentage = Decimal('0.00')
-        
-        self.vat_rate = Decimal('9.00')  # ثابت یا از تنظیمات
+        self.progress_percentage = self.progress_for(self.total_amount, self.project.contract_amount)
+
+    @staticmethod
+    def progress_for(total_amount, contract_amount):
+        """درصد پیشرفت: نسبت مبلغ متره به مبلغ قرارداد (حداکثر 999.99)"""
+        contract_amount = Decimal(contract_amount or 0)
+        if contract_amount <= 0:
+            return Decimal('0.00')
+        return min(
+            (Decimal(total_amount or 0) / contract_amount * 100).quantize(Decimal('0.01')),
+            Decimal('999.99')
+        )
     
     def get_discipline_breakdown(self):
         """تفکیک رشته‌ها برای نمایش"""
@@ -1517,7 +1730,7 @@ class ProjectFinancialSummary(models.Model):
     
     def get_progress_info(self):
         """اطلاعات پیشرفت"""
-        contract_amount = self.project.total_contract_amount or Decimal('0.00')
+        contract_amount = self.project.contract_amount or Decimal('0.00')
         remaining_amount = contract_amount - self.total_amount
         
         return {
@@ -1602,17 +1815,6 @@ class ProjectFinancialSummary(models.Model):
         self.last_updated = timezone.now()
         self.save(update_fields=['total_quantity', 'total_amount', 'last_updated'])
 
-    def calculate_project_totals(self):
-        """محاسبه آمار اضافی"""
-        # تعداد آیتم‌ها
-        self.item_count = self.project.measurementsessionitem_set.filter(
-            is_active=True
-        ).count()
-        
-        # به‌روزرسانی زمان
-        if not self.last_updated:
-            self.last_updated = timezone.now()
-    
     @property
     def formatted_total_amount(self):
         """نمایش فرمت‌شده مبلغ کل"""
@@ -1758,16 +1960,7 @@ class DetailedFinancialReport(models.Model):
     
     def _get_unit_price(self):
         """استخراج قیمت واحد"""
-        pl = self.price_list_item
-        for field in ['price', 'unit_price', 'rate', 'baha']:
-            if hasattr(pl, field):
-                value = getattr(pl, field)
-                if value is not None:
-                    try:
-                        return Decimal(str(value)).quantize(Decimal('0.00'))
-                    except:
-                        continue
-        return Decimal('0.00')
+        return resolve_related_price(self, 'price_list_item')
     
     def get_session_breakdown(self):
         """تفکیک بر اساس صورت‌جلسات"""
@@ -1812,6 +2005,323 @@ class DetailedFinancialReport(models.Model):
         self.calculate_item_financials()
         super().save(*args, **kwargs)
 
+class AggregateRefreshMarker(models.Model):
+    """
+    نشانگر بازمحاسبه تأخیری مجموع‌ها (صف کار sooratvaziat.aggregates)
+    هر ردیف یعنی ریز متره یک آیتم فهرست بها یا صورت وضعیت یک صورت جلسه در این پروژه
+    باید دوباره محاسبه شود؛ خلاصه مالی پروژه برای هر پروژه فقط یک بار محاسبه می‌شود
+    """
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='aggregate_refresh_markers',
+        verbose_name="پروژه"
+    )
+    price_list_item = models.ForeignKey(
+        PriceListItem,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="آیتم فهرست بها"
+    )
+    measurement_session = models.ForeignKey(
+        MeasurementSession,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="صورت‌جلسه"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="زمان ثبت")
+
+    class Meta:
+        verbose_name = "نشانگر بازمحاسبه"
+        verbose_name_plural = "نشانگرهای بازمحاسبه"
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['project', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"بازمحاسبه پروژه {self.project_id} - آیتم {self.price_list_item_id} - صورت جلسه {self.measurement_session_id}"
+
+
+def export_job_upload_to(instance, filename):
+    return f"exports/{instance.project_id}/{filename}"
+
+
+class ExportJob(models.Model):
+    """
+    کار خروجی پس‌زمینه گزارش مالی (PDF / اکسل)
+    فایل نهایی زیر PRIVATE_MEDIA_ROOT/exports ذخیره می‌شود (آدرس عمومی ندارد و فقط
+    درخواست‌دهنده از export_job_download آن را می‌گیرد) و پس از expires_at پاک می‌شود
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'در صف'),
+        (STATUS_RUNNING, 'در حال تولید'),
+        (STATUS_DONE, 'آماده'),
+        (STATUS_FAILED, 'ناموفق'),
+    ]
+
+    FORMAT_PDF = 'pdf'
+    FORMAT_XLSX = 'xlsx'
+    FORMAT_CHOICES = [
+        (FORMAT_PDF, 'PDF'),
+        (FORMAT_XLSX, 'اکسل'),
+    ]
+
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='export_jobs',
+        verbose_name="پروژه"
+    )
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='export_jobs',
+        verbose_name="درخواست‌دهنده"
+    )
+    export_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, verbose_name="فرمت")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="وضعیت")
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name="درصد پیشرفت")
+    file = models.FileField(
+        upload_to=export_job_upload_to, storage=private_storage, blank=True, verbose_name="فایل خروجی"
+    )
+    error = models.TextField(blank=True, verbose_name="خطا")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="زمان ثبت")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="زمان شروع")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="زمان پایان")
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name="زمان انقضا")
+
+    class Meta:
+        verbose_name = "کار خروجی گزارش"
+        verbose_name_plural = "کارهای خروجی گزارش"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"خروجی {self.get_export_format_display()} پروژه {self.project_id} - {self.get_status_display()}"
+
+    @property
+    def download_name(self):
+        return f"financial_report_{self.project.project_code}.{self.export_format}"
+
+    def as_status_dict(self):
+        """وضعیت کار برای پاسخ JSON"""
+        from django.urls import reverse
+
+        data = {
+            'job_id': self.pk,
+            'status': self.status,
+            'status_display': self.get_status_display(),
+            'progress': self.progress,
+            'status_url': reverse('sooratvaziat:export_job_status', args=[self.pk]),
+            'download_url': None,
+            'error': self.error or None,
+        }
+        if self.status == self.STATUS_DONE:
+            data['download_url'] = reverse('sooratvaziat:export_job_download', args=[self.pk])
+        return data
+
+    @classmethod
+    def cleanup_expired(cls, now=None):
+        """
+        حذف فایل و ردیف کارهای منقضی‌شده
+        خروجی: تعداد کارهای حذف‌شده
+        """
+        now = now or timezone.now()
+        expired = cls.objects.filter(expires_at__lte=now)
+
+        removed = 0
+        for job in expired.iterator():
+            if job.file:
+                try:
+                    job.file.delete(save=False)
+                except OSError as e:
+                    logger.warning(f"حذف فایل خروجی {job.pk} ناموفق بود: {e}")
+            job.delete()
+            removed += 1
+        return removed
+
+
+class ProjectDashboardSnapshot(models.Model):
+    """
+    آمار از پیش محاسبه‌شده داشبورد پروژه (صفحه جزئیات پروژه)
+    ویرایش آیتم‌ها تفاضل خود را با F() روی آن اعمال می‌کند (sooratvaziat.aggregates)؛
+    تغییرات صورت جلسه‌ها آن را همراه خلاصه مالی در refresh_project بازمحاسبه می‌کنند
+    """
+    project = models.OneToOneField(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='dashboard_snapshot',
+        verbose_name="پروژه"
+    )
+    sessions_count = models.PositiveIntegerField(default=0, verbose_name="تعداد صورت‌جلسات")
+    approved_sessions_count = models.PositiveIntegerField(default=0, verbose_name="صورت‌جلسات تایید‌شده")
+    items_count = models.PositiveIntegerField(default=0, verbose_name="تعداد ردیف‌ها")
+    pricelist_items_count = models.PositiveIntegerField(default=0, verbose_name="تعداد آیتم‌های فهرست بها")
+    measured_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="مبلغ کل متره")
+    last_session_at = models.DateTimeField(null=True, blank=True, verbose_name="آخرین تغییر صورت‌جلسه")
+    refreshed_at = models.DateTimeField(auto_now=True, verbose_name="زمان به‌روزرسانی")
+
+    class Meta:
+        verbose_name = "آمار داشبورد پروژه"
+        verbose_name_plural = "آمار داشبورد پروژه‌ها"
+
+    def __str__(self):
+        return f"داشبورد پروژه {self.project_id}"
+
+    @property
+    def pending_sessions_count(self):
+        return self.sessions_count - self.approved_sessions_count
+
+    @classmethod
+    def for_project(cls, project):
+        """snapshot پروژه؛ اگر هنوز ساخته نشده باشد همین‌جا محاسبه می‌شود"""
+        snapshot = cls.objects.filter(project=project).first()
+        if snapshot is None:
+            snapshot = cls.refresh_for_project(project)
+        return snapshot
+
+    @classmethod
+    def refresh_for_project(cls, project):
+        """بازمحاسبه آمار با دو پرس‌وجوی تجمیعی"""
+        snapshot = cls.objects.filter(project=project).first() or cls(project=project)
+
+        sessions = MeasurementSession.objects.filter(project=project, is_active=True).aggregate(
+            total=Count('id'),
+            approved=Count('id', filter=Q(status='approved')),
+            last=models.Max('updated_at'),
+        )
+        items = MeasurementSessionItem.objects.filter(
+            measurement_session_number__project=project,
+            measurement_session_number__is_active=True,
+            is_active=True,
+        ).aggregate(
+            total=Count('id'),
+            pricelist_items=Count('pricelist_item', distinct=True),
+            amount=Sum('item_total'),
+        )
+
+        snapshot.sessions_count = sessions['total'] or 0
+        snapshot.approved_sessions_count = sessions['approved'] or 0
+        snapshot.last_session_at = sessions['last']
+        snapshot.items_count = items['total'] or 0
+        snapshot.pricelist_items_count = items['pricelist_items'] or 0
+        snapshot.measured_amount = items['amount'] or Decimal('0')
+        snapshot.save()
+        return snapshot
+
+
+
+class ProjectMonthlyRollup(models.Model):
+    """
+    جمع ماهانه (ماه شمسی) متره پروژه به تفکیک رشته برای نمودارها
+    ویرایش آیتم‌ها فقط ردیف ماه خودشان را با F() تغییر می‌دهند (sooratvaziat.aggregates)؛
+    تغییرات صورت جلسه‌ها (مثلاً تاریخ) آن را همراه آمار داشبورد در refresh_project بازسازی می‌کنند
+    """
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='monthly_rollups',
+        verbose_name="پروژه"
+    )
+    year = models.PositiveSmallIntegerField(verbose_name="سال (شمسی)")
+    month = models.PositiveSmallIntegerField(verbose_name="ماه (شمسی)")
+    discipline_choice = models.CharField(
+        max_length=2,
+        choices=DisciplineChoices.choices,
+        verbose_name="رشته"
+    )
+    total_quantity = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="مجموع مقدار")
+    total_amount = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="مجموع مبلغ")
+    sessions_count = models.PositiveIntegerField(default=0, verbose_name="تعداد صورت‌جلسات")
+
+    class Meta:
+        verbose_name = "جمع ماهانه پروژه"
+        verbose_name_plural = "جمع‌های ماهانه پروژه"
+        ordering = ['year', 'month', 'discipline_choice']
+        unique_together = [['project', 'year', 'month', 'discipline_choice']]
+
+    def __str__(self):
+        return f"پروژه {self.project_id} - {self.year}/{self.month:02d} - {self.discipline_choice}"
+
+    @classmethod
+    def rebuild_for_project(cls, project):
+        """
+        بازسازی جمع‌های ماهانه پروژه از یک پرس‌وجوی گروه‌بندی‌شده بر اساس تاریخ صورت‌جلسه
+        (صورت‌جلسات بدون تاریخ در نمودار ماهانه شمرده نمی‌شوند)
+        """
+        rows = MeasurementSessionItem.objects.filter(
+            measurement_session_number__project=project,
+            measurement_session_number__is_active=True,
+            measurement_session_number__session_date__isnull=False,
+            is_active=True,
+        ).values(
+            'measurement_session_number__session_date',
+            'measurement_session_number__price_list__discipline_choice',
+        ).annotate(
+            quantity=Sum('quantity'),
+            amount=Sum('item_total'),
+            sessions=Count('measurement_session_number', distinct=True),
+        ).order_by()
+
+        buckets = {}
+        for row in rows:
+            jalali = jdatetime.date.fromgregorian(date=row['measurement_session_number__session_date'])
+            key = (jalali.year, jalali.month, row['measurement_session_number__price_list__discipline_choice'])
+            bucket = buckets.setdefault(key, [Decimal('0'), Decimal('0'), 0])
+            bucket[0] += row['quantity'] or Decimal('0')
+            bucket[1] += row['amount'] or Decimal('0')
+            bucket[2] += row['sessions']
+
+        cls.objects.filter(project=project).delete()
+        cls.objects.bulk_create([
+            cls(
+                project=project,
+                year=year,
+                month=month,
+                discipline_choice=discipline or '',
+                total_quantity=quantity,
+                total_amount=amount,
+                sessions_count=sessions,
+            )
+            for (year, month, discipline), (quantity, amount, sessions) in buckets.items()
+        ])
+
+    @classmethod
+    def monthly_totals(cls, project, start, end):
+        """
+        جمع همه رشته‌ها برای هر ماه در بازه (سال، ماه) شروع تا پایان، با یک پرس‌وجو
+        خروجی: {(year, month): {'amount', 'quantity', 'sessions_count'}}
+        """
+        (start_year, start_month), (end_year, end_month) = start, end
+        in_range = (
+            (Q(year__gt=start_year) | Q(year=start_year, month__gte=start_month))
+            & (Q(year__lt=end_year) | Q(year=end_year, month__lte=end_month))
+        )
+        rows = cls.objects.filter(in_range, project=project).values('year', 'month').annotate(
+            amount=Sum('total_amount'),
+            quantity=Sum('total_quantity'),
+            sessions=Sum('sessions_count'),
+        ).order_by()
+        return {
+            (row['year'], row['month']): {
+                'amount': row['amount'] or Decimal('0'),
+                'quantity': row['quantity'] or Decimal('0'),
+                'sessions_count': row['sessions'] or 0,
+            }
+            for row in rows
+        }
+
 class FinancialReportGenerator:
     """
     کلاس کمکی برای تولید گزارش‌های مالی
@@ -0,0 +1,108 @@
+# sooratvaziat/report_cache.py
+"""
+کش دیسکی فایل‌های رندرشده گزارش مالی (PDF / اکسل)
+
+کلید هر فایل: شناسه پروژه، رشته، فرمت و یک نسخه (hash) که از آخرین updated_at و تعداد
+صورت جلسات، آیتم‌ها و آیتم‌های فهرست بهای استفاده‌شده و updated_at خود پروژه ساخته می‌شود.
+تا وقتی داده‌ای تغییر نکرده، دانلودهای بعدی (کارفرما، مشاور، پیمانکار) مستقیماً از دیسک
+خوانده می‌شوند؛ با هر تغییر نسخه عوض می‌شود و فایل‌های نسخه قبلی پاک می‌شوند.
+
+مسیر: REPORT_CACHE_ROOT (پیش‌فرض PRIVATE_MEDIA_ROOT/report_cache)/<project_id>/ که مانند
+بقیه فایل‌های خصوصی نباید داخل MEDIA_ROOT یا STATIC_ROOT باشد (core.private_files)
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from core.private_files import private_root
+
+logger = logging.getLogger(__name__)
+
+ALL_DISCIPLINES = 'all'
+
+
+def cache_root():
+    return private_root('REPORT_CACHE_ROOT', 'report_cache')
+
+
+def report_version(project):
+    """نسخه داده‌های گزارش یک پروژه (با هر تغییر صورت جلسه، آیتم یا قیمت عوض می‌شود)"""
+    from fehrestbaha.models import PriceListItem
+    from .models import MeasurementSession, MeasurementSessionItem
+
+    sessions = MeasurementSession.objects.filter(project=project).aggregate(
+        last=Max('updated_at'), count=Count('id')
+    )
+    items = MeasurementSessionItem.objects.filter(
+        measurement_session_number__project=project
+    ).aggregate(last=Max('updated_at'), count=Count('id'))
+    prices = PriceListItem.objects.filter(
+        session_items__measurement_session_number__project=project
+    ).aggregate(last=Max('updated_at'))
+
+    parts = [
+        project.pk,
+        project.updated_at,
+        sessions['last'], sessions['count'],
+        items['last'], items['count'],
+        prices['last'],
+    ]
+    raw = '|'.join('' if part is None else str(part) for part in parts)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:20]
+
+
+def _file_prefix(discipline, export_format):
+    return f"financial_{discipline}_{export_format}_"
+
+
+def cached_report_path(project, export_format, discipline=ALL_DISCIPLINES, version=None):
+    """مسیر فایل کش برای نسخه فعلی داده‌ها (ممکن است هنوز وجود نداشته باشد)"""
+    version = version or report_version(project)
+    name = f"{_file_prefix(discipline, export_format)}{version}.{export_format}"
+    return cache_root() / str(project.pk) / name
+
+
+def get_or_render_report(project, export_format, render, discipline=ALL_DISCIPLINES):
+    """
+    مسیر فایل گزارش از کش؛ در صورت نبود، render(file) فراخوانی و نتیجه ذخیره می‌شود
+
+    render باید فایل را در شیء فایل‌مانند داده‌شده بنویسد و در صورت خطا exception بدهد
+    (فایل ناقص هیچ‌وقت در کش قرار نمی‌گیرد).
+    """
+    path = cached_report_path(project, export_format, discipline)
+    if path.exists():
+        logger.info(f"Report cache hit: {path.name} (project {project.pk})")
+        return path
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            render(tmp)
+        # جایگزینی اتمیک تا درخواست همزمان فایل نیمه‌کاره نبیند
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+
+    _prune_old_versions(path, discipline, export_format)
+    logger.info(f"Report cached: {path.name} (project {project.pk})")
+    return path
+
+
+def _prune_old_versions(current, discipline, export_format):
+    """حذف فایل‌های نسخه‌های قبلی همین پروژه، رشته و فرمت"""
+    prefix = _file_prefix(discipline, export_format)
+    for old in current.parent.glob(f"{prefix}*.{export_format}"):
+        if old != current:
+            try:
+                old.unlink()
+            except OSError as e:
+                logger.warning(f"حذف فایل کش قدیمی {old} ناموفق بود: {e}")
+
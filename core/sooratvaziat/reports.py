@@ -0,0 +1,252 @@
+# sooratvaziat/reports.py
+"""
+ساخت داده و فایل‌های گزارش مالی پروژه
+
+این توابع به request وابسته نیستند تا هم در view و هم در پردازه‌های
+پس‌زمینه (export_jobs) قابل استفاده باشند. فایل‌های نهایی از طریق
+report_cache روی دیسک نگه داشته می‌شوند.
+"""
+from collections import OrderedDict, defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import chain
+
+import jdatetime
+from django.template.loader import render_to_string
+from xhtml2pdf import pisa
+
+from core.exports import new_workbook, append_table
+from fehrestbaha.models import DisciplineChoices
+from fehrestbaha.catalog import find_items
+from fehrestbaha.pricing import resolve_prices
+from fehrestbaha.units import QUANTITY_DIMENSIONS
+from sooratvaziat.models import MeasurementSession, MeasurementSessionItem
+from sooratvaziat.report_cache import get_or_render_report
+from sooratvaziat.utils import _to_decimal, format_number_int
+
+# ستون‌های آیتم صورت جلسه که در محاسبه مقدار لازم‌اند
+ITEM_DIMENSIONS = ('length', 'width', 'height', 'weight', 'count')
+
+
+def build_financial_report_data(project):
+    """
+    داده‌های ریز مالی پروژه به تفکیک رشته
+
+    خروجی: دیکشنری شامل data_by_discipline، جمع‌های کل و تاریخ شمسی قرارداد
+    """
+    disciplines_dict = {choice.value: choice.label for choice in DisciplineChoices}
+
+    # تبدیل تاریخ قرارداد به شمسی
+    if project.contract_date:
+        gregorian_date = project.contract_date
+        jalali_date = jdatetime.date.fromgregorian(
+            year=gregorian_date.year,
+            month=gregorian_date.month,
+            day=gregorian_date.day
+        )
+        contract_date_jalali = jalali_date.strftime("%Y/%m/%d")
+    else:
+        contract_date_jalali = "تعیین نشده"
+
+    # آیتم‌های فعال پروژه بدون join با فهرست بها؛ مشخصات آیتم‌ها از کاتالوگ خوانده می‌شود
+    item_rows = MeasurementSessionItem.objects.filter(
+        measurement_session_number__project=project,
+        is_active=True
+    ).order_by('id').values_list('pricelist_item_id', *ITEM_DIMENSIONS)
+    price_list_ids = MeasurementSession.objects.filter(project=project).values_list('price_list_id', flat=True)
+    catalog_items = find_items({row[0] for row in item_rows}, price_list_ids)
+    prices = resolve_prices(catalog_items.values())
+
+    # رشته ← {شماره ردیف: ردیف گزارش}
+    rows_by_discipline = defaultdict(dict)
+    for pricelist_item_id, *dimensions in item_rows:
+        pl = catalog_items.get(pricelist_item_id)
+        if pl is None:
+            continue
+        rows = rows_by_discipline[pl.discipline_choice]
+        key = pl.row_number or f"_id_{pl.pk}"
+        if key not in rows:
+            rows[key] = {
+                'pricelist_item': pl,
+                'row_number': pl.row_number or '',
+                'unit': pl.unit or '',
+                'total_qty': Decimal('0'),
+                'unit_price': prices[pl.pk],
+                'line_total': Decimal('0'),
+            }
+        # همان محاسبه MeasurementSessionItem.get_total_item_amount
+        values = dict(zip(ITEM_DIMENSIONS, dimensions))
+        qty = values['count']
+        for dimension in QUANTITY_DIMENSIONS.get(pl.unit_type, ()):
+            qty *= values[dimension] or 0
+        rows[key]['total_qty'] += _to_decimal(qty, places=0)
+
+    data_by_discipline = {}
+    grand_total_quantity = Decimal('0')
+    grand_total_amount = Decimal('0')
+    total_items_count = 0
+
+    for discipline in sorted(rows_by_discipline):
+        rows = rows_by_discipline[discipline]
+
+        # محاسبه قیمت و جمع‌ها
+        total_quantity = Decimal('0')
+        total_amount = Decimal('0')
+        items_count = len(rows)
+
+        for r in rows.values():
+            r['line_total'] = (r['total_qty'] * r['unit_price']).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+            total_amount += r['line_total']
+            total_quantity += r['total_qty']
+            r['formatted_total_qty'] = format_number_int(r['total_qty'])
+            r['formatted_unit_price'] = format_number_int(r['unit_price'])
+            r['formatted_line_total'] = format_number_int(r['line_total'])
+
+        # شماره‌گذاری فصل‌ها
+        chapter_counters = defaultdict(int)
+        numbered_rows = []
+        prev_chapter = None
+        for r in sorted(rows.values(), key=lambda r: (r['row_number'], r['pricelist_item'].pk)):
+            rn = str(r['row_number'])
+            chapter = rn[:2] if len(rn) >= 2 else "00"
+            chapter_counters[chapter] += 1
+            display_number = f"{chapter}-{chapter_counters[chapter]}"
+            r['display_number'] = display_number
+            r['chapter'] = chapter
+            r['is_new_chapter'] = (chapter != prev_chapter)
+            prev_chapter = chapter
+            numbered_rows.append(r)
+
+        if numbered_rows:
+            # فقط صورت جلسات مربوط به این پروژه و رشته
+            sessions = MeasurementSession.objects.filter(
+                project=project,
+                items__pricelist_item__price_list__discipline_choice=discipline,
+                items__is_active=True
+            ).distinct()
+
+            data_by_discipline[discipline] = {
+                'label': disciplines_dict.get(discipline, 'نامشخص'),
+                'year': project.execution_year,
+                'rows': numbered_rows,
+                'total_quantity': total_quantity,
+                'total_amount': total_amount,
+                'items_count': items_count,
+                'formatted_total_quantity': format_number_int(total_quantity),
+                'formatted_total_amount': format_number_int(total_amount),
+                'sessions': sessions,  # فقط صورت جلسات مرتبط با این پروژه و رشته
+            }
+
+            total_items_count += items_count
+
+        grand_total_quantity += total_quantity
+        grand_total_amount += total_amount
+
+    return {
+        'contract_date_jalali': contract_date_jalali,
+        'data_by_discipline': data_by_discipline,
+        'grand_total_quantity': grand_total_quantity.quantize(Decimal('1'), rounding=ROUND_HALF_UP),
+        'grand_total_amount': grand_total_amount.quantize(Decimal('1'), rounding=ROUND_HALF_UP),
+        'total_items_count': total_items_count,
+    }
+
+
+def build_financial_report_workbook(project, data_by_discipline, grand_total_quantity, grand_total_amount):
+    """ساخت workbook گزارش مالی (شیت خلاصه + یک شیت برای هر رشته)"""
+    wb = new_workbook()
+    # شیت کلی
+    summary_rows = [
+        ['پروژه', project.project_name],
+        ['کد پروژه', project.project_code],
+        [''],
+        ['دیسیپلین', 'سال', 'جمع مقدار', 'جمع مبلغ (ریال)'],
+    ]
+    summary_rows.extend(
+        [data['label'], data['year'], data['total_quantity'], data['total_amount']]
+        for data in data_by_discipline.values()
+    )
+    summary_rows.append(['جمع کل', '', grand_total_quantity, grand_total_amount])
+    append_table(wb, "خلاصه پروژه", summary_rows)
+
+    # شیت برای هر دیسیپلین (ریز مالی)
+    headers = ['ردیف', 'شماره آیتم', 'شرح', 'واحد', 'مقدار', 'قیمت واحد', 'مبلغ کل']
+    for data in data_by_discipline.values():
+        rows = (
+            [
+                r['display_number'],
+                r['row_number'],
+                r['pricelist_item'].description,
+                r['unit'],
+                r['total_qty'],
+                r['unit_price'],
+                r['line_total'],
+            ]
+            for r in data['rows']
+        )
+        footer = [['', '', '', '', 'جمع', '', data['total_amount']]]
+        append_table(wb, data['label'], chain(rows, footer), header=headers, column_width=20)
+
+    return wb
+
+
+def render_financial_report_pdf(project, data_by_discipline, grand_total_quantity, grand_total_amount,
+                                dest, request=None):
+    """
+    رندر PDF گزارش مالی در dest (هر شیء فایل‌مانند)
+
+    request اختیاری است؛ بدون آن نام کاربر در پاورقی گزارش درج نمی‌شود.
+    خروجی: وضعیت pisa (در صورت خطا pisa_status.err مقدار دارد)
+    """
+    context = {
+        'project': project,
+        'data_by_discipline': data_by_discipline,
+        'grand_total_quantity': grand_total_quantity,
+        'grand_total_amount': grand_total_amount,
+        'formatted_grand_total_quantity': format_number_int(grand_total_quantity),
+        'formatted_grand_total_amount': format_number_int(grand_total_amount),
+    }
+
+    # اضافه کردن request به render_to_string برای دسترسی به request.user در template
+    html = render_to_string('sooratvaziat/project_financial_report.html', context, request=request)
+
+    # تبدیل HTML به PDF با xhtml2pdf
+    return pisa.CreatePDF(
+        html.encode('utf-8'),  # مطمئن شوید HTML به UTF-8 انکود شده برای پشتیبانی پارسی
+        dest=dest,
+        encoding='utf-8'  # برای پشتیبانی از کاراکترهای پارسی
+    )
+
+
+def render_financial_report(project, export_format, dest, progress=None):
+    """
+    رندر کامل گزارش مالی پروژه (xlsx یا pdf) در dest
+    progress اختیاری است و با درصد پیشرفت فراخوانی می‌شود.
+    """
+    report = build_financial_report_data(project)
+    if progress:
+        progress(40)
+
+    args = (
+        project,
+        report['data_by_discipline'],
+        report['grand_total_quantity'],
+        report['grand_total_amount'],
+    )
+    if export_format == 'pdf':
+        # فایل بین کاربران مشترک است، پس نام کاربر در آن درج نمی‌شود
+        pisa_status = render_financial_report_pdf(*args, dest=dest)
+        if pisa_status.err:
+            raise RuntimeError(f"خطا در تولید PDF: {pisa_status.err}")
+    else:
+        build_financial_report_workbook(*args).save(dest)
+
+    if progress:
+        progress(90)
+
+
+def cached_financial_report(project, export_format, progress=None):
+    """مسیر فایل گزارش مالی از کش دیسکی؛ فقط در صورت تغییر داده‌ها دوباره رندر می‌شود"""
+    return get_or_render_report(
+        project,
+        export_format,
+        lambda dest: render_financial_report(project, export_format, dest, progress=progress),
+    )
@@ -1,3 +1,706 @@
-from django.test import TestCase
+import csv
+from datetime import date
+from io import BytesIO, StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from openpyxl import load_workbook
+
+from core import loaded_state
+from core.exports import XLSX_CONTENT_TYPE
+from core.history import suspended
+from fehrestbaha.models import DisciplineChoices, PriceList, PriceListItem
+from fehrestbaha.pricing import resolve_price
+from ProjectLog.models import AuditLog
+from project.models import Project
+
+from .aggregates import _process_in_thread, mark_dirty, process_markers, rebuild_project
+from .export_jobs import run_export_job
+from .report_cache import cache_root, get_or_render_report
+from .reports import build_financial_report_data
+from .models import (
+    AggregateRefreshMarker, DetailedMeasurement, ExportJob, FinancialStatus, MeasurementSession,
+    MeasurementSessionItem, MeasurementSummary, ProjectDashboardSnapshot, ProjectFinancialSummary,
+    ProjectMonthlyRollup,
+)
+
+
+class MeasurementTestMixin:
+    """پروژه، فهرست بها و صورت جلسه نمونه برای تست‌ها"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        cls.project = Project.objects.create(
+            created_by=cls.user,
+            project_name='پروژه آزمایشی',
+            project_code='T-001',
+            employer='کارفرما',
+            contractor='پیمانکار',
+            city='تهران',
+            province='تهران',
+            contract_number='100',
+            contract_date=date(2024, 3, 20),
+            execution_year=1403,
+            contract_amount=Decimal('100000000'),
+        )
+        cls.price_list = PriceList.objects.create(
+            discipline_choice=DisciplineChoices.ABANIE, discipline='ابنیه ۱۴۰۳', year=1403
+        )
+        cls.volume_item = PriceListItem.objects.create(
+            price_list=cls.price_list, row_number='010101', description='بتن',
+            price=Decimal('1000'), unit='متر مکعب',
+        )
+        cls.count_item = PriceListItem.objects.create(
+            price_list=cls.price_list, row_number='010102', description='دریچه',
+            price=Decimal('500'), unit='عدد',
+        )
+
+    def create_session(self, **values):
+        values.setdefault('session_date', date(2024, 4, 10))
+        return MeasurementSession.objects.create(
+            project=self.project, price_list=self.price_list, **values
+        )
+
+    def create_item(self, session, pricelist_item=None, row_description='ردیف', **values):
+        item = MeasurementSessionItem(
+            measurement_session_number=session,
+            pricelist_item=pricelist_item or self.volume_item,
+            row_description=row_description,
+            **values
+        )
+        item.save(user=self.user)
+        return item
+
+
+class AddItemsBulkTests(MeasurementTestMixin, TestCase):
+
+    def test_creates_items_with_computed_totals(self):
+        session = self.create_session()
+        created = session.add_items_bulk([
+            {'pricelist_item': self.volume_item, 'row_description': 'الف', 'length': 5, 'width': 3, 'height': 4},
+            {'pricelist_item_id': self.count_item.pk, 'row_description': 'ب', 'count': 2},
+        ], user=self.user)
+
+        self.assertEqual(len(created), 2)
+        session.refresh_from_db()
+        self.assertEqual(session.items_count, 2)
+        item = session.items.get(row_description='الف')
+        self.assertEqual(item.quantity, Decimal('60'))
+        self.assertEqual(item.item_total, Decimal('60000'))
+
+    def test_duplicate_rows_are_reported_per_row(self):
+        session = self.create_session()
+        self.create_item(session, row_description='الف', length=1, width=1, height=1)
+
+        with self.assertRaises(ValidationError) as raised:
+            session.add_items_bulk([
+                {'pricelist_item': self.volume_item, 'row_description': 'الف'},
+                {'pricelist_item': self.count_item, 'row_description': 'ب'},
+                {'pricelist_item': self.count_item, 'row_description': 'ب'},
+            ], user=self.user)
+
+        messages = raised.exception.messages
+        self.assertEqual(len(messages), 2)
+        self.assertTrue(messages[0].startswith('ردیف 1:'))
+        self.assertTrue(messages[1].startswith('ردیف 3:'))
+        self.assertEqual(session.items.count(), 1)
+
+    def test_zero_or_negative_count_is_rejected(self):
+        session = self.create_session()
+
+        with self.assertRaises(ValidationError) as raised:
+            session.add_items_bulk([
+                {'pricelist_item': self.count_item, 'row_description': 'الف', 'count': 0},
+                {'pricelist_item': self.count_item, 'row_description': 'ب', 'count': Decimal('-2')},
+                {'pricelist_item': self.count_item, 'row_description': 'ج', 'count': None},
+            ], user=self.user)
+
+        messages = raised.exception.messages
+        self.assertEqual([message.split(':')[0] for message in messages], ['ردیف 1', 'ردیف 2'])
+        self.assertFalse(session.items.exists())
+
+    def test_duplicate_copies_active_items_into_draft(self):
+        session = self.create_session()
+        self.create_item(session, row_description='الف', length=2, width=2, height=2)
+        removed = self.create_item(session, self.count_item, row_description='ب')
+        removed.delete(user=self.user)
+
+        copy = session.duplicate(user=self.user)
+
+        self.assertEqual(copy.status, 'draft')
+        self.assertEqual(
+            list(copy.items.values_list('row_description', 'quantity')),
+            [('الف', Decimal('8.00'))]
+        )
+
+
+class ItemQuantityExpressionTests(MeasurementTestMixin, TestCase):
+
+    def test_items_without_unit_type_use_their_unit(self):
+        session = self.create_session()
+        item = self.create_item(session, row_description='الف', length=5, width=3, height=4)
+        PriceListItem.objects.filter(pk=self.volume_item.pk).update(unit_type=None)
+
+        item = MeasurementSessionItem.objects.with_quantities().get(pk=item.pk)
+        self.assertEqual(item.computed_quantity, Decimal('60'))
+        self.assertEqual(item.computed_amount, Decimal('60000'))
+
+    def test_amount_uses_the_item_unit_price(self):
+        session = self.create_session()
+        self.create_item(session, row_description='الف', length=5, width=3, height=4)
+        self.create_item(session, self.count_item, row_description='ب', count=2, unit_price=Decimal('750'))
+        self.volume_item.price = Decimal('2000')
+        self.volume_item.save()
+
+        items = session.items.all()
+        self.assertEqual(items.quantity_totals()['total_amount'], Decimal('61500'))
+        self.assertEqual(
+            items.quantity_totals()['total_amount'],
+            sum(items.values_list('item_total', flat=True)),
+        )
+
+
+class RecalculateItemQuantitiesTests(MeasurementTestMixin, TestCase):
+
+    def test_stale_stored_quantities_and_totals_are_rebuilt(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            session = self.create_session()
+            item = self.create_item(session, row_description='الف', length=5, width=3, height=4)
+            self.create_item(session, self.count_item, row_description='ب', count=2)
+
+        # مقدار ذخیره‌شده با دسته‌بندی قدیمی واحد (فقط تعداد) و مجموع‌های متناظر
+        MeasurementSessionItem.objects.filter(pk=item.pk).update(quantity=1, item_total=1000)
+        with self.captureOnCommitCallbacks(execute=True):
+            rebuild_project(self.project.pk)
+        self.assertEqual(ProjectFinancialSummary.objects.get(project=self.project).total_amount, Decimal('2000'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('recalculate_item_quantities', stdout=StringIO())
+
+        item.refresh_from_db()
+        self.assertEqual((item.quantity, item.item_total), (Decimal('60'), Decimal('60000')))
+        self.assertEqual(ProjectFinancialSummary.objects.get(project=self.project).total_amount, Decimal('61000'))
+        self.assertEqual(
+            ProjectFinancialSummary.objects.get(project=self.project).total_amount,
+            session.items.quantity_totals()['total_amount'],
+        )
+
+
+class AggregateRefreshQueueTests(MeasurementTestMixin, TestCase):
+    """نشانگرهای بازمحاسبه پس از commit و پردازش آن‌ها در حالت‌های AGGREGATE_REFRESH_MODE"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            session = self.create_session()
+            self.create_item(session, row_description='الف', length=2, width=1, height=1)
+        # ریز متره قدیمی که بازمحاسبه باید اصلاحش کند
+        DetailedMeasurement.objects.filter(project=self.project).update(total_quantity=0)
+
+    def stored_quantity(self):
+        return DetailedMeasurement.objects.get(project=self.project, price_list_item=self.volume_item).total_quantity
+
+    def mark_twice(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_dirty(self.project, price_list_items=[self.volume_item])
+            mark_dirty(self.project.pk, price_list_items=[self.volume_item.pk])
+
+    @override_settings(AGGREGATE_REFRESH_MODE='queue')
+    def test_queue_mode_coalesces_markers_until_the_command_runs(self):
+        self.mark_twice()
+
+        self.assertEqual(
+            list(AggregateRefreshMarker.objects.values_list('price_list_item_id', 'measurement_session_id')),
+            [(self.volume_item.pk, None)],
+        )
+        self.assertEqual(self.stored_quantity(), 0)
+
+        call_command('refresh_aggregates', stdout=StringIO())
+        self.assertFalse(AggregateRefreshMarker.objects.exists())
+        self.assertEqual(self.stored_quantity(), Decimal('2'))
+
+    @override_settings(AGGREGATE_REFRESH_MODE='sync')
+    def test_sync_mode_refreshes_after_commit(self):
+        self.mark_twice()
+
+        self.assertFalse(AggregateRefreshMarker.objects.exists())
+        self.assertEqual(self.stored_quantity(), Decimal('2'))
+
+    @override_settings(AGGREGATE_REFRESH_MODE='thread')
+    def test_thread_mode_hands_the_projects_to_the_pool(self):
+        executor = mock.Mock()
+        with mock.patch('sooratvaziat.aggregates._get_executor', return_value=executor):
+            self.mark_twice()
+
+        executor.submit.assert_called_once_with(_process_in_thread, [self.project.pk])
+        self.assertEqual(AggregateRefreshMarker.objects.count(), 1)
+
+        self.assertEqual(process_markers([self.project.pk]), 1)
+        self.assertFalse(AggregateRefreshMarker.objects.exists())
+        self.assertEqual(self.stored_quantity(), Decimal('2'))
+
+
+class IncrementalAggregateTests(MeasurementTestMixin, TestCase):
+    """مسیر تفاضلی F() باید همان نتیجه بازسازی کامل (rebuild_project) را بدهد"""
+
+    def totals(self):
+        return {
+            'measurements': sorted(DetailedMeasurement.objects.filter(project=self.project).values_list(
+                'price_list_item_id', 'total_quantity', 'total_amount', 'items_count', 'sessions_count'
+            )),
+            'summaries': sorted(MeasurementSummary.objects.filter(project=self.project).values_list(
+                'price_list_item_id', 'total_quantity', 'total_amount', 'items_count', 'sessions_count'
+            )),
+            'statuses': sorted(FinancialStatus.objects.filter(
+                measurement_session__project=self.project
+            ).values_list(
+                'measurement_session_id', 'total_quantity', 'total_amount', 'total_with_vat',
+                'active_items_count', 'unique_pricelist_items_count', 'row_descriptions_count'
+            )),
+            'sessions': sorted(MeasurementSession.objects.filter(project=self.project).values_list(
+                'pk', 'items_count'
+            )),
+            'project': list(ProjectFinancialSummary.objects.filter(project=self.project).values_list(
+                'total_quantity', 'total_amount', 'total_with_vat', 'total_quantity_abnieh',
+                'total_amount_abnieh', 'total_items_count', 'unique_pricelist_items_count',
+                'progress_percentage'
+            )),
+            'dashboard': list(ProjectDashboardSnapshot.objects.filter(project=self.project).values_list(
+                'sessions_count', 'items_count', 'pricelist_items_count', 'measured_amount', 'last_session_at'
+            )),
+            # ردیف‌های خالی‌شده در مسیر تفاضلی صفر می‌مانند و در بازسازی حذف می‌شوند
+            'monthly': sorted(ProjectMonthlyRollup.objects.filter(project=self.project).exclude(
+                total_quantity=0, total_amount=0, sessions_count=0
+            ).values_list('year', 'month', 'discipline_choice', 'total_quantity', 'total_amount', 'sessions_count')),
+        }
+
+    def assertMatchesRebuild(self):
+        incremental = self.totals()
+        with self.captureOnCommitCallbacks(execute=True):
+            rebuild_project(self.project.pk)
+        self.assertEqual(incremental, self.totals())
+
+    def test_item_edits_match_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.create_session()
+            second = self.create_session(session_date=date(2024, 6, 1))
+            item = self.create_item(first, row_description='الف', length=5, width=3, height=4)
+            self.create_item(first, self.count_item, row_description='ب', count=3)
+            self.create_item(second, row_description='ج', length=1, width=1, height=1)
+
+        # ویرایش ابعاد، جابه‌جایی بین آیتم‌های فهرست بها و شرح ردیف
+        item = MeasurementSessionItem.objects.get(pk=item.pk)
+        item.length = Decimal('2')
+        item.save(user=self.user)
+        self.assertMatchesRebuild()
+
+        item = MeasurementSessionItem.objects.get(pk=item.pk)
+        item.pricelist_item = self.count_item
+        item.row_description = 'د'
+        item.count = Decimal('4')
+        item.save(user=self.user)
+        self.assertMatchesRebuild()
+
+    def test_single_edit_does_not_schedule_full_refresh(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            session = self.create_session()
+            item = self.create_item(session, row_description='الف', length=5, width=3, height=4)
+
+        item = MeasurementSessionItem.objects.get(pk=item.pk)
+        item.width = Decimal('1')
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save(user=self.user)
+
+        self.assertFalse(AggregateRefreshMarker.objects.exists())
+        summary = ProjectFinancialSummary.objects.get(project=self.project)
+        self.assertEqual(summary.total_amount, Decimal('20000'))
+        self.assertMatchesRebuild()
+
+    def test_monthly_rollup_updates_only_the_item_month(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            april = self.create_session()
+            june = self.create_session(session_date=date(2024, 6, 1))
+            self.create_item(april, row_description='الف', length=1, width=1, height=1)
+            item = self.create_item(june, row_description='ب', length=2, width=1, height=1)
+
+        item = MeasurementSessionItem.objects.get(pk=item.pk)
+        item.height = Decimal('3')
+        item.save(user=self.user)
+        self.assertEqual(
+            ProjectMonthlyRollup.monthly_totals(self.project, (1403, 1), (1403, 12)),
+            {
+                (1403, 1): {'amount': Decimal('1000'), 'quantity': Decimal('1'), 'sessions_count': 1},
+                (1403, 3): {'amount': Decimal('6000'), 'quantity': Decimal('6'), 'sessions_count': 1},
+            }
+        )
+
+        # حذف آخرین آیتم صورت جلسه، آن را از شمار ماه خارج می‌کند
+        MeasurementSessionItem.objects.filter(pk=item.pk).soft_delete(user=self.user)
+        self.assertEqual(
+            ProjectMonthlyRollup.monthly_totals(self.project, (1403, 3), (1403, 3))[(1403, 3)]['sessions_count'], 0
+        )
+        self.assertMatchesRebuild()
+
+    def test_single_delete_keeps_user_and_applies_delta(self):
+        editor = User.objects.create_user('editor', password='secret')
+        with self.captureOnCommitCallbacks(execute=True):
+            session = self.create_session()
+            self.create_item(session, row_description='الف', length=1, width=1, height=1)
+            item = self.create_item(session, row_description='ب', length=2, width=1, height=1)
+
+        item = MeasurementSessionItem.objects.get(pk=item.pk)
+        loaded_at = item.updated_at
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete(user=editor)
+
+        self.assertFalse(AggregateRefreshMarker.objects.exists())
+        self.assertGreater(item.updated_at, loaded_at)
+        stored = MeasurementSessionItem.objects.get(pk=item.pk)
+        self.assertEqual((stored.is_active, stored.modified_by, stored.updated_at), (False, editor, item.updated_at))
+        self.assertEqual(item.history.latest().history_user, editor)
+        self.assertEqual(
+            AuditLog.objects.filter(object_id=item.pk, action='update').latest('id').user, editor
+        )
+        session.refresh_from_db()
+        self.assertEqual(session.items_count, 1)
+        self.assertMatchesRebuild()
+
+    def test_soft_delete_and_restore_counts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            session = self.create_session()
+            self.create_item(session, row_description='الف', length=1, width=1, height=1)
+            self.create_item(session, row_description='ب', length=2, width=1, height=1)
+            self.create_item(session, self.count_item, row_description='ج')
+
+        volume_items = session.items.filter(pricelist_item=self.volume_item)
+        self.assertEqual(volume_items.soft_delete(user=self.user), 2)
+        self.assertEqual(volume_items.soft_delete(user=self.user), 0)
+        session.refresh_from_db()
+        self.assertEqual(session.items_count, 1)
+        self.assertMatchesRebuild()
+
+        self.assertEqual(session.items.all().restore(user=self.user), 2)
+        self.assertEqual(session.items.all().restore(user=self.user), 0)
+        session.refresh_from_db()
+        self.assertEqual(session.items_count, 3)
+        self.assertEqual(
+            set(session.items.values_list('modified_by', flat=True)), {self.user.pk}
+        )
+        self.assertMatchesRebuild()
+
+
+class FinancialViewTests(MeasurementTestMixin, TestCase):
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_riz_metre_financial_uses_current_price(self):
+        session = self.create_session()
+        self.create_item(session, row_description='الف', length=5, width=3, height=4)
+        self.volume_item.price = Decimal('2000')
+        self.volume_item.save()
+
+        response = self.client.get(reverse('sooratvaziat:riz_financial', args=[self.project.pk, DisciplineChoices.ABANIE]))
+
+        [row] = response.context['rows']
+        self.assertEqual(row['unit_price'], Decimal('2000'))
+        self.assertEqual(row['line_total'], row['total_qty'] * row['unit_price'])
+        self.assertEqual(row['line_total'], Decimal('120000'))
+
+        response = self.client.get(reverse('sooratvaziat:riz_financial_discipline_list', args=[self.project.pk]))
+        [discipline] = response.context['disciplines']
+        self.assertEqual(discipline['total_amount'], row['line_total'])
+
+    def test_financial_report_prices_through_pricing(self):
+        session = self.create_session()
+        self.create_item(session, row_description='الف', length=5, width=3, height=4)
+        self.create_item(session, self.count_item, row_description='ب', count=3)
+
+        report = build_financial_report_data(self.project)
+
+        rows = report['data_by_discipline'][DisciplineChoices.ABANIE]['rows']
+        self.assertEqual(
+            [(row['unit_price'], row['line_total']) for row in rows],
+            [(resolve_price(self.volume_item), Decimal('60000')), (resolve_price(self.count_item), Decimal('1500'))],
+        )
+
+
+    def test_riz_metre_financial_csv_is_streamed(self):
+        session = self.create_session()
+        self.create_item(session, row_description='الف', length=5, width=3, height=4)
+        url = reverse('sooratvaziat:riz_financial', args=[self.project.pk, DisciplineChoices.ABANIE])
+
+        response = self.client.get(url, {'export': 'csv'})
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn(f'soorat_mali_project_{self.project.pk}_{DisciplineChoices.ABANIE}.csv', response['Content-Disposition'])
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][0], 'شماره ردیف')
+        self.assertEqual(rows[1], ['01-1', '010101', 'بتن', 'متر مکعب', '60', '1,000', '60,000'])
+
+    def test_riz_metre_financial_xlsx_keeps_styles(self):
+        session = self.create_session()
+        self.create_item(session, row_description='الف', length=5, width=3, height=4)
+        url = reverse('sooratvaziat:riz_financial', args=[self.project.pk, DisciplineChoices.ABANIE])
+
+        response = self.client.get(url, {'export': 'xlsx'})
+
+        self.assertEqual(response['Content-Type'], XLSX_CONTENT_TYPE)
+        ws = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual(
+            [cell.value for cell in ws[2]],
+            ['01-1', '010101', 'بتن', 'متر مکعب', 60, 1000, 60000],
+        )
+        self.assertTrue(ws['A1'].font.bold)
+        self.assertEqual(ws['A2'].border.left.style, 'thin')
+        self.assertEqual(ws.column_dimensions['G'].width, 20)
+
+class HistoryPolicyTests(MeasurementTestMixin, TestCase):
+    """ثبت تاریخچه فقط برای تغییر فیلدهای اصلی (core.history)"""
+
+    def test_derived_fields_do_not_write_history(self):
+        session = self.create_session()
+        recorded = session.history.count()
+
+        # تعداد آیتم‌ها با F() به‌روز می‌شود و ذخیره بدون تغییر تاریخچه نمی‌نویسد
+        self.create_item(session, row_description='الف', length=1, width=1, height=1)
+        session = MeasurementSession.objects.get(pk=session.pk)
+        session.save()
+        self.assertEqual(session.items_count, 1)
+        self.assertEqual(session.history.count(), recorded)
+
+        session.description = 'شرح جدید'
+        session.save()
+        self.assertEqual(session.history.count(), recorded + 1)
+
+    def test_suspended_and_disabled_models(self):
+        session = self.create_session()
+        recorded = MeasurementSession.history.count()
+
+        with suspended(MeasurementSession):
+            session.description = 'در بازمحاسبه'
+            session.save()
+        self.assertEqual(MeasurementSession.history.count(), recorded)
+
+        with override_settings(HISTORY_TRACKING_POLICY={'sooratvaziat.MeasurementSession': {'enabled': False}}):
+            session.description = 'با تاریخچه خاموش'
+            session.save()
+            self.create_session(session_date=date(2024, 5, 1))
+        self.assertEqual(MeasurementSession.history.count(), recorded)
+
+        # مدل‌های دیگر با suspended یک مدل متوقف نمی‌شوند
+        with suspended(MeasurementSession):
+            item = self.create_item(session, row_description='الف')
+        self.assertEqual(item.history.count(), 1)
+
+    def test_one_loaded_state_for_history_audit_and_aggregates(self):
+        session = self.create_session()
+        with self.captureOnCommitCallbacks(execute=True):
+            item = self.create_item(session, row_description='الف', length=1, width=1, height=1)
+
+        item = MeasurementSessionItem.objects.get(pk=item.pk)
+        self.assertEqual(loaded_state.loaded_values(item)['row_description'], 'الف')
+        self.assertFalse({'_history_state', '_audit_snapshot', '_aggregate_snapshot'} & set(item.__dict__))
+
+        recorded = item.history.count()
+        item.row_description = 'ب'
+        item.length = 3
+        self.assertEqual(set(loaded_state.changed_fields(item)), {'row_description', 'length'})
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+
+        # همه مصرف‌کننده‌ها مقدار پیش از همین ذخیره را دیده‌اند
+        self.assertEqual(item.history.count(), recorded + 1)
+        self.assertEqual(
+            AuditLog.objects.filter(object_id=item.pk, action='update').latest('id').changed_data['row_description'],
+            {'old': 'الف', 'new': 'ب'},
+        )
+        self.assertEqual(
+            DetailedMeasurement.objects.get(project=self.project, price_list_item=self.volume_item).total_quantity,
+            Decimal('3'),
+        )
+
+        # پس از ذخیره مقادیر ذخیره‌شده مبنای مقایسه بعدی هستند
+        self.assertEqual(loaded_state.changed_fields(item), {})
+
+
+class ConditionalResponseTests(MeasurementTestMixin, TestCase):
+    """پاسخ 304 برای داده‌های بدون تغییر فهرست بها"""
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_pricelist_items_not_modified(self):
+        url = reverse('sooratvaziat:get_pricelist_items')
+        params = {'price_list_id': self.price_list.pk}
+
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+        etag = response['ETag']
+
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        self.count_item.price = Decimal('700')
+        self.count_item.save()
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('700', {str(item['price']).split('.')[0] for item in response.json()})
+
+    def test_pricelist_search_not_modified(self):
+        url = reverse('sooratvaziat:search_pricelist_items')
+        params = {'price_list_id': self.price_list.pk, 'q': 'بتن'}
+
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.volume_item.pk])
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # پارامترهای دیگر ETag دیگری دارند
+        self.assertEqual(self.client.get(url, {**params, 'q': 'دریچه'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.volume_item.description = 'بتن مسلح'
+        self.volume_item.save()
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # تغییر خود فهرست بها (نسخه کاتالوگ) هم پاسخ را تازه می‌کند
+        self.price_list.save()
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ReportCacheTests(MeasurementTestMixin, TestCase):
+    """فایل کش‌شده گزارش تا تغییر داده‌های پروژه دوباره ساخته نمی‌شود"""
+
+    def setUp(self):
+        private_dir = TemporaryDirectory()
+        self.addCleanup(private_dir.cleanup)
+        settings_override = override_settings(PRIVATE_MEDIA_ROOT=private_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.session = self.create_session()
+        self.item = self.create_item(self.session, row_description='الف', length=5, width=3, height=4)
+        self.renders = 0
+
+    def render(self, dest):
+        self.renders += 1
+        dest.write(f'نسخه {self.renders}'.encode())
+
+    def cached(self):
+        return get_or_render_report(self.project, 'pdf', self.render)
+
+    def assertRerendered(self, previous):
+        path = self.cached()
+        self.assertNotEqual(path, previous)
+        self.assertFalse(previous.exists())
+        self.assertEqual(list(path.parent.iterdir()), [path])
+        return path
+
+    def test_unchanged_data_is_served_from_disk(self):
+        path = self.cached()
+        self.assertEqual(self.cached(), path)
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(path.read_bytes(), 'نسخه 1'.encode())
+
+    def test_data_changes_invalidate_the_cached_file(self):
+        path = self.cached()
+
+        self.create_item(self.session, self.count_item, row_description='ب', count=2)
+        path = self.assertRerendered(path)
+
+        self.item.length = 6
+        self.item.save(user=self.user)
+        path = self.assertRerendered(path)
+
+        self.volume_item.price = Decimal('1200')
+        self.volume_item.save()
+        path = self.assertRerendered(path)
+
+        self.item.delete(user=self.user)
+        self.assertRerendered(path)
+        self.assertEqual(self.renders, 5)
+
+
+# close_old_connections کار پس‌زمینه اتصال تراکنش تست را می‌بست
+@mock.patch('sooratvaziat.export_jobs.close_old_connections')
+class ExportJobTests(MeasurementTestMixin, TestCase):
+    """فایل‌های خروجی و کش گزارش‌ها خصوصی‌اند و فقط به درخواست‌دهنده داده می‌شوند"""
+
+    def setUp(self):
+        self.private_dir = TemporaryDirectory()
+        self.addCleanup(self.private_dir.cleanup)
+        settings_override = override_settings(PRIVATE_MEDIA_ROOT=self.private_dir.name, EXPORT_JOB_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        session = self.create_session()
+        self.create_item(session, row_description='الف', length=5, width=3, height=4)
+        self.client.force_login(self.user)
+
+    def request_export(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('sooratvaziat:export_job_create', args=[self.project.pk]), {'format': 'xlsx'}
+            )
+        self.assertEqual(response.status_code, 202)
+        return ExportJob.objects.get(pk=response.json()['job_id'])
+
+    def test_files_are_private_and_downloaded_by_requester_only(self, close_connections):
+        job = self.request_export()
+
+        self.assertEqual(job.status, ExportJob.STATUS_DONE)
+        private_root = Path(self.private_dir.name).resolve()
+        self.assertTrue(Path(job.file.path).resolve().is_relative_to(private_root / 'exports'))
+        self.assertTrue(cache_root().resolve().is_relative_to(private_root))
+        self.assertFalse(Path(job.file.path).resolve().is_relative_to(Path(settings.MEDIA_ROOT).resolve()))
+
+        download_url = reverse('sooratvaziat:export_job_download', args=[job.pk])
+        response = self.client.get(download_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+        response.close()
+
+        other = User.objects.create_user('other', password='secret')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(download_url).status_code, 404)
+
+    def test_job_is_claimed_only_once(self, close_connections):
+        job = self.request_export()
+        finished_at = job.finished_at
+
+        # اجرای دوباره کار انجام‌شده یا در حال اجرا چیزی را دوباره نمی‌سازد
+        with mock.patch('sooratvaziat.reports.cached_financial_report') as render:
+            run_export_job(job.pk)
+            ExportJob.objects.filter(pk=job.pk).update(status=ExportJob.STATUS_RUNNING)
+            run_export_job(job.pk)
+        render.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.finished_at), (ExportJob.STATUS_RUNNING, finished_at))
+
+        status_url = reverse('sooratvaziat:export_job_status', args=[job.pk])
+        self.assertEqual(self.client.get(status_url).json()['status'], ExportJob.STATUS_RUNNING)
+        self.client.force_login(User.objects.create_user('other', password='secret'))
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+
+    def test_served_roots_are_refused(self, close_connections):
+        with override_settings(REPORT_CACHE_ROOT=Path(settings.MEDIA_ROOT) / 'report_cache'):
+            with self.assertRaises(ImproperlyConfigured):
+                cache_root()
+        with override_settings(PRIVATE_MEDIA_ROOT=Path(settings.STATIC_ROOT) / 'private'):
+            with self.assertRaises(ImproperlyConfigured):
+                cache_root()
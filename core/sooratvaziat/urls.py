@@ -39,10 +39,15 @@ urlpatterns = [
     # گزارش‌های مالی کلی (لیست پروژه‌ها)
     path('financial-reports/', views.project_financial_report_list, name='project_financial_report_list'),
     path('project/<int:pk>/financial-report/', views.project_financial_report, name='project_financial_report'),
+    path('project/<int:pk>/financial-report/export/', views.export_job_create, name='export_job_create'),
+    path('exports/<int:job_id>/', views.export_job_status, name='export_job_status'),
+    path('exports/<int:job_id>/download/', views.export_job_download, name='export_job_download'),
 
     # جستجو
     path('search/', views.search, name='search'),
     
     # AJAX URLs
     path('get-price-lists/', views.get_price_lists_by_discipline, name='get_price_lists'),
+    path('get-pricelist-items/', views.get_pricelist_items, name='get_pricelist_items'),
+    path('pricelist-items/search/', views.search_pricelist_items, name='search_pricelist_items'),
 ]
\ No newline at end of file
@@ -4,7 +4,7 @@ from django.core.exceptions import PermissionDenied
 from django.db.models import Q
 from decimal import Decimal, ROUND_HALF_UP
 from project.models import Project
-from accounts.models import UserRole, ProjectUser
+from accounts.permissions import permissions_for
 import jdatetime
 from collections import OrderedDict, defaultdict
 
@@ -365,18 +365,7 @@ def get_project_with_access(user, project_id):
     """
     project = get_object_or_404(Project, pk=project_id, is_active=True)
     
-    has_access = (
-        user.is_superuser or
-        UserRole.objects.filter(user=user, role='admin', is_active=True).exists() or
-        project.created_by == user or
-        ProjectUser.objects.filter(
-            project=project, 
-            user=user, 
-            is_active=True
-        ).exists()
-    )
-    
-    if not has_access:
+    if not permissions_for(user).can_access_project(project):
         raise PermissionDenied("شما دسترسی به این پروژه را ندارید")
     
     return project
@@ -385,25 +374,8 @@ def get_user_project_role(user, project):
     """
     دریافت نقش کاربر در پروژه - نسخه اصلاح شده
     """
-    if user.is_superuser:
-        return 'superuser'
-    
-    # بررسی نقش ادمین در UserRole
-    if UserRole.objects.filter(user=user, role='admin', is_active=True).exists():
-        return 'admin'
-    
-    if project.created_by == user:
-        return 'creator'
-    
-    try:
-        project_user = ProjectUser.objects.get(
-            project=project, 
-            user=user, 
-            is_active=True
-        )
-        return project_user.role
-    except ProjectUser.DoesNotExist:
-        return None
+    # superuser، admin، creator یا نقش کاربر در پروژه
+    return permissions_for(user).project_role(project)
 
 def can_edit_directly(user, project):
     """
@@ -15,13 +15,12 @@ from collections import OrderedDict
 from django.views.generic import ListView
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
-from django.db.models import Prefetch, Sum, Count, Q
+from django.db.models import F, Prefetch, Sum, Count, Max, Q
 from django.db import transaction
-from django.http import HttpResponse, JsonResponse
-import csv
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment, Font, Border, Side
+from django.http import HttpResponse, JsonResponse, FileResponse, Http404
+from itertools import chain
+from core.conditional import conditional_json_response, make_etag
+from core.exports import XLSX_CONTENT_TYPE, new_workbook, append_table, xlsx_response, stream_csv_response
 from collections import defaultdict
 from datetime import date
 
@@ -32,9 +31,11 @@ from .forms import MeasurementSessionForm, MeasurementSessionItemForm
 
 #models
 from .models import MeasurementSummary, MeasurementSessionItem,DetailedMeasurement,ProjectFinancialSummary, MeasurementSession, MeasurementSessionItem
+from .models import ExportJob
 from project.models import Project, StatusReport
 from fehrestbaha.models import DisciplineChoices
 from fehrestbaha.models import PriceList, PriceListItem, DisciplineChoices
+from fehrestbaha.pricing import resolve_prices
 from accounts.models import ProjectUser
 
 #PDF
@@ -42,14 +43,21 @@ from io import BytesIO
 from django.template.loader import render_to_string  # برای PDF
 from xhtml2pdf import pisa
 
+# گزارش‌ها و خروجی پس‌زمینه
+from .reports import build_financial_report_data, cached_financial_report
+from .export_jobs import start_export_job
+
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from .mixins import UserProjectMixin
 
 #search
 from django.views.decorators.http import require_http_methods
+from fehrestbaha.catalog import catalog_version
+from fehrestbaha.search import search_items
 import json
 from django.core.paginator import Paginator
+from core.pagination import paginate_keyset
 #logging
 import logging
 # utils
@@ -79,90 +87,53 @@ logger = logging.getLogger(__name__)
 
 @login_required
 def riz_metre_financial(request, pk, discipline_choice=None):
-    # فقط پروژه‌های کاربر جاری
-    project = get_object_or_404(Project, pk=project_id, is_active=True)
-
-    # سوپریوزر و ادمین به همه پروژه‌ها دسترسی دارند
-    if user.is_superuser:
-        return project
-    
-    if UserRole.objects.filter(user=user, role='admin', is_active=True).exists():
-        return project
-
-    # کاربران عادی
-    has_access = (
-        project.created_by == user or
-        ProjectUser.objects.filter(
-            project=project, 
-            user=user, 
-            is_active=True
-        ).exists()
-    )
-    
-    if not has_access:
-        raise PermissionDenied("شما دسترسی به این پروژه را ندارید")
+    # فقط پروژه‌های کاربر جاری (سوپریوزر و ادمین به همه پروژه‌ها دسترسی دارند)
+    project = get_project_with_access(request.user, pk)
 
     # فیلتر کردن بر اساس پروژه و فهرست بها (اگر مشخص شده باشد)
     qs = MeasurementSessionItem.objects.filter(
         measurement_session_number__project=project,
         is_active=True
-    ).select_related('pricelist_item').order_by('pricelist_item__row_number', 'id')
+    )
     
     if discipline_choice:
         qs = qs.filter(pricelist_item__price_list__discipline_choice=discipline_choice)
     
-    rows = OrderedDict()
-    for item in qs:
-        pl = item.pricelist_item
-        key = getattr(pl, 'row_number', None) or f"_id_{pl.pk}"
-        if key not in rows:
-            rows[key] = {
-                'pricelist_item': pl,
-                'row_number': getattr(pl, 'row_number', ''),
-                'unit': getattr(pl, 'unit', '') or '',
-                'description': getattr(pl, 'row_description', '') or '',
-                'total_qty': Decimal('0.00'),
-                'unit_price': Decimal('0.00'),
-                'line_total': Decimal('0.00'),
-            }
-        try:
-            raw_amount = item.get_total_item_amount()
-        except Exception:
-            raw_amount = getattr(item, 'total', 0)
-        qty = Decimal(str(raw_amount or 0))
-        rows[key]['total_qty'] += qty
-
-    # 📘 مرحله بعد: تعیین قیمت و جمع‌ها
-    for r in rows.values():
-        pl = r['pricelist_item']
-        unit_price = None
-        for cand in ('price', 'unit_price', 'rate', 'baha'):
-            if hasattr(pl, cand):
-                val = getattr(pl, cand)
-                if val is not None:
-                    try:
-                        unit_price = Decimal(str(val))
-                        break
-                    except Exception:
-                        unit_price = Decimal('0')
-        if unit_price is None:
-            unit_price = Decimal('0')
-
-        # ذخیره اعداد به‌صورت Decimal (برای محاسبات) و رشته‌ی فرمت‌شده برای نمایش
-        r['unit_price'] = unit_price.quantize(Decimal('1'), rounding=ROUND_HALF_UP)
-        r['line_total'] = (r['total_qty'] * r['unit_price']).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
-
-        # اضافه کردن فیلدهای نمایش فرمت‌شده:
-        r['formatted_total_qty'] = format_number_int(r['total_qty'])
-        r['formatted_unit_price'] = format_number_int(r['unit_price'])
-        r['formatted_line_total'] = format_number_int(r['line_total'])
+    # گروه‌بندی و جمع مقدار در پایگاه داده (quantity هر ردیف ذخیره شده است)
+    grouped = qs.values(
+        'pricelist_item',
+        'pricelist_item__row_number',
+        'pricelist_item__description',
+        'pricelist_item__unit',
+    ).annotate(
+        total_qty=Sum('quantity'),
+    ).order_by('pricelist_item__row_number', 'pricelist_item')
+
+    # 📘 مرحله بعد: قیمت و جمع‌ها (روی نتیجه گروه‌بندی‌شده که بسیار کوچک‌تر است)
+    # جمع ریالی مانند ریز مالی و گزارش مالی از قیمت فعلی فهرست بها محاسبه می‌شود
+    grouped = list(grouped)
+    prices = resolve_prices(g['pricelist_item'] for g in grouped)
+    rows = []
+    for g in grouped:
+        total_qty = g['total_qty'] or Decimal('0.00')
+        unit_price = prices.get(g['pricelist_item'], Decimal('0')).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+        r = {
+            'pricelist_item_id': g['pricelist_item'],
+            'row_number': g['pricelist_item__row_number'] or '',
+            'description': g['pricelist_item__description'] or '',
+            'unit': g['pricelist_item__unit'] or '',
+            'total_qty': total_qty,
+            'unit_price': unit_price,
+            'line_total': (total_qty * unit_price).quantize(Decimal('1'), rounding=ROUND_HALF_UP),
+        }
+        rows.append(r)
 
     # 📗 حالا شماره‌گذاری فصل‌ها و ردیف‌ها
     chapter_counters = defaultdict(int)
     numbered_rows = []
     prev_chapter = None
 
-    for r in rows.values():
+    for r in rows:
         rn = str(r['row_number'])
         # استخراج فصل: دو کاراکتر اول (اگر کمتر باشه "00")
         chapter = rn[:2] if len(rn) >= 2 else "00"
@@ -190,76 +161,52 @@ def riz_metre_financial(request, pk, discipline_choice=None):
     if discipline_choice:
         discipline_label = dict(DisciplineChoices.choices).get(discipline_choice, 'نامشخص')
 
+    filename = f"soorat_mali_project_{project.id}"
+    if discipline_choice:
+        filename += f"_{discipline_choice}"
+    headers = ['شماره ردیف', 'شماره آیتم', 'شرح آیتم', 'واحد', 'جمع مقدار', 'قیمت واحد (ریال)', 'جمع ریالی (ریال)']
+
     # ----------------- خروجی CSV -----------------
     if request.GET.get('export') == 'csv':
-        response = HttpResponse(content_type='text/csv')
-        filename = f"soorat_mali_project_{project.id}"
-        if discipline_choice:
-            filename += f"_{discipline_choice}"
-        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['شماره ردیف', 'شماره آیتم', 'شرح آیتم', 'واحد', 'جمع مقدار', 'قیمت واحد (ریال)', 'جمع ریالی (ریال)'])
-
-        for r in numbered_rows:
-            description = getattr(r['pricelist_item'], 'description', '') or r.get('description', '')
-            writer.writerow([
+        csv_rows = (
+            [
                 r['display_number'],
                 r['row_number'],
-                description,
+                r['description'],
                 r['unit'],
                 f"{int(r['total_qty']):,}",
                 f"{int(r['unit_price']):,}",
                 f"{int(r['line_total']):,}",
-            ])
-
-        writer.writerow([])
-        return response
+            ]
+            for r in numbered_rows
+        )
+        return stream_csv_response(chain(csv_rows, [[]]), f"{filename}.csv", header=headers)
 
     # ----------------- خروجی Excel -----------------
     if request.GET.get('export') == 'xlsx':
-        wb = Workbook()
-        ws = wb.active
-        ws.title = f"صورت مالی پروژه {project.project_name}"
+        title = f"صورت مالی پروژه {project.project_name}"
         if discipline_label:
-            ws.title += f" - {discipline_label}"
-        headers = ['شماره ردیف', 'شماره آیتم', 'شرح آیتم', 'واحد', 'جمع مقدار', 'قیمت واحد (ریال)', 'جمع ریالی (ریال)']
-        ws.append(headers)
-
-        for r in numbered_rows:
-            description = getattr(r['pricelist_item'], 'description', '') or r.get('description', '')
-            ws.append([
-                r['display_number'],
-                r['row_number'],
-                description,
-                r['unit'],
-                int(r['total_qty']),
-                int(r['unit_price']),
-                int(r['line_total']),
-            ])
-
-        # استایل جدول
-        for col in range(1, len(headers) + 1):
-            ws.column_dimensions[get_column_letter(col)].width = 20
-
-        border = Border(left=Side(style='thin'),
-                        right=Side(style='thin'),
-                        top=Side(style='thin'),
-                        bottom=Side(style='thin'))
-
-        for row in ws.iter_rows(min_row=1, max_row=ws.max_row, min_col=1, max_col=len(headers)):
-            for cell in row:
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-                cell.border = border
-                if cell.row == 1:
-                    cell.font = Font(bold=True)
-
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        filename = f"soorat_mali_project_{project.id}"
-        if discipline_choice:
-            filename += f"_{discipline_choice}"
-        response['Content-Disposition'] = f'attachment; filename="{filename}.xlsx"'
-        wb.save(response)
-        return response
+            title += f" - {discipline_label}"
+
+        wb = new_workbook()
+        append_table(
+            wb, title,
+            (
+                [
+                    r['display_number'],
+                    r['row_number'],
+                    r['description'],
+                    r['unit'],
+                    int(r['total_qty']),
+                    int(r['unit_price']),
+                    int(r['line_total']),
+                ]
+                for r in numbered_rows
+            ),
+            header=headers,
+            column_width=20,
+        )
+        return xlsx_response(wb, f"{filename}.xlsx")
 
     # ----------------- خروجی HTML -----------------
     context = {
@@ -273,48 +220,30 @@ def riz_metre_financial(request, pk, discipline_choice=None):
 
 @login_required
 def riz_financial_discipline_list(request, pk):
-    project = get_project_with_access(request.user, project_pk)
+    project = get_project_with_access(request.user, pk)
     
-    # استخراج رشته‌های منحصر به فرد از آیتم‌های موجود برای پروژه
+    # تعداد آیتم‌ها و جمع مبالغ هر رشته با یک پرس‌وجوی گروه‌بندی‌شده (مقدار در پایگاه داده محاسبه می‌شود)
+    # مبلغ مانند صفحه ریز مالی هر رشته با قیمت فعلی فهرست بها است
     disciplines = MeasurementSessionItem.objects.filter(
         measurement_session_number__project=project,
         is_active=True
-    ).values_list(
-        'pricelist_item__price_list__discipline_choice', 
-        flat=True
-    ).distinct()
+    ).with_quantities().values(
+        'pricelist_item__price_list__discipline_choice'
+    ).annotate(
+        items_count=Count('id'),
+        total_amount=Sum(F('computed_quantity') * F('pricelist_item__price')),
+    ).order_by('pricelist_item__price_list__discipline_choice')
 
     # تبدیل به لیست از tuples برای استفاده در تمپلیت
+    labels = dict(DisciplineChoices.choices)
     discipline_choices = []
-    for discipline in disciplines:
-        label = dict(DisciplineChoices.choices).get(discipline, 'نامشخص')
-        # محاسبه تعداد آیتم‌ها و جمع مبالغ برای هر فهرست بها
-        items = MeasurementSessionItem.objects.filter(
-            measurement_session_number__project=project,
-            pricelist_item__price_list__discipline_choice=discipline,
-            is_active=True
-        )
-        
-        total_amount = Decimal('0')
-        for item in items:
-            try:
-                qty = Decimal(str(item.get_total_item_amount() or 0))
-                pl = item.pricelist_item
-                unit_price = Decimal('0')
-                for cand in ('price', 'unit_price', 'rate', 'baha'):
-                    if hasattr(pl, cand):
-                        val = getattr(pl, cand)
-                        if val is not None:
-                            unit_price = Decimal(str(val))
-                            break
-                total_amount += qty * unit_price
-            except:
-                continue
-        
+    for row in disciplines:
+        discipline = row['pricelist_item__price_list__discipline_choice']
+        total_amount = row['total_amount'] or Decimal('0')
         discipline_choices.append({
             'value': discipline,
-            'label': label,
-            'count': items.count(),
+            'label': labels.get(discipline, 'نامشخص'),
+            'count': row['items_count'],
             'total_amount': total_amount.quantize(Decimal('1'), rounding=ROUND_HALF_UP),
             'formatted_total_amount': format_number_int(total_amount),
         })
@@ -379,7 +308,7 @@ def riz_metre(request, pk, discipline):
         measurement_session_number__is_active=True,
         measurement_session_number__price_list__discipline_choice=discipline,
         is_active=True
-    ).select_related(
+    ).with_quantities().select_related(
         'pricelist_item',
         'pricelist_item__price_list',
         'measurement_session_number'
@@ -404,7 +333,7 @@ def riz_metre(request, pk, discipline):
                 'group_total': Decimal('0.00')
             }
         
-        item_amount = item.get_total_item_amount() or Decimal('0.00')
+        item_amount = item.computed_quantity or Decimal('0.00')
         item_total = item.item_total or Decimal('0.00')
         
         # اطلاعات صورت جلسه برای لینک
@@ -620,42 +549,30 @@ def session_list(request, pk):
     )
     if not has_access:
         raise PermissionDenied("شما دسترسی به این پروژه را ندارید")
-    try:
-        # دریافت صورت جلسات مربوط به این پروژه
-        sessions = MeasurementSession.objects.filter(
-            project=project, 
-            is_active=True
-        ).annotate(
-            items_count=Count('items', filter=Q(items__is_active=True))
-        ).order_by('-created_at')
+    # صورت جلسات پروژه (تعداد آیتم‌های فعال در items_count خود صورت جلسه نگه داشته می‌شود)
+    sessions = MeasurementSession.objects.filter(
+        project=project,
+        is_active=True
+    ).select_related('price_list')
 
-        # محاسبه آمار کلی
-        total_sessions = sessions.count()
-        approved_sessions = sessions.filter(status='approved').count()
-        draft_sessions = sessions.filter(status='draft').count()
+    # آمار کلی با یک پرس‌وجو
+    stats = sessions.aggregate(
+        total=Count('id'),
+        approved=Count('id', filter=Q(status='approved')),
+        draft=Count('id', filter=Q(status='draft')),
+    )
+    total_sessions = stats['total']
+    approved_sessions = stats['approved']
+    draft_sessions = stats['draft']
 
-    except Exception as e:
-        # اگر خطایی رخ داد، از مقادیر پیش‌فرض استفاده کن
-        sessions = MeasurementSession.objects.filter(
-            project=project, 
-            is_active=True
-        ).order_by('-created_at')
-        
-        # محاسبه دستی تعداد آیتم‌ها
-        for session in sessions:
-            session.items_count = session.items.filter(is_active=True).count()
-            # مقدار پیش‌فرض برای status اگر وجود ندارد
-            if not hasattr(session, 'status'):
-                session.status = 'draft'
-        
-        total_sessions = sessions.count()
-        approved_sessions = sessions.filter(status='approved').count() if hasattr(sessions.first(), 'status') else 0
-        draft_sessions = sessions.filter(status='draft').count() if hasattr(sessions.first(), 'status') else total_sessions
+    # صفحه‌بندی keyset بر اساس (-created_at, -id)
+    sessions = paginate_keyset(request, sessions, 20, count_mode=None)
 
     context = {
         'title': f'لیست صورت‌جلسات - {project.project_name}',
         'project': project,
         'sessions': sessions,
+        'page_obj': sessions,
         'total_sessions': total_sessions,
         'approved_sessions': approved_sessions,
         'draft_sessions': draft_sessions,
@@ -837,14 +754,14 @@ def MeasurementSessionView(request, pk):
     """
     نمایش صورت جلسه با گروه‌بندی آیتم‌ها
     """
-    project = get_project_with_access(request.user, project_pk)
+    project = get_project_with_access(request.user, pk)
     
     try:
         # پیش‌فرض کردن آیتم‌ها
         item_queryset = MeasurementSessionItem.objects.filter(
             measurement_session_number__project=project,
             is_active=True
-        ).select_related('pricelist_item').order_by('pricelist_item__row_number')
+        ).with_quantities().select_related('pricelist_item').order_by('pricelist_item__row_number')
 
         sessions_qs = MeasurementSession.objects.filter(
             project=project,
@@ -873,7 +790,7 @@ def MeasurementSessionView(request, pk):
                     
                     # محاسبه مبلغ آیتم
                     try:
-                        item_amount = item.get_total_item_amount()
+                        item_amount = item.computed_quantity
                         if not isinstance(item_amount, Decimal):
                             item_amount = Decimal(str(item_amount))
                         item_amount = item_amount.quantize(Decimal('1.00'), rounding=ROUND_HALF_UP)
@@ -920,7 +837,7 @@ def session_detail(request, project_pk, pk):
     user_can_edit_directly = can_edit_directly(request.user, project)
     
     # دریافت مستقیم آیتم‌ها
-    active_items = session.items.filter(is_active=True).select_related('pricelist_item')
+    active_items = session.items.filter(is_active=True).with_quantities().select_related('pricelist_item')
     
     # گروه‌بندی مستقیم در ویو
     grouped_items = []
@@ -948,7 +865,7 @@ def session_detail(request, project_pk, pk):
             
             # محاسبه مقدار آیتم
             try:
-                quantity = item.get_total_item_amount()
+                quantity = item.computed_quantity
                 if not isinstance(quantity, Decimal):
                     quantity = Decimal(str(quantity))
             except Exception as e:
@@ -1064,11 +981,7 @@ def add_session_item(request, project_pk, session_pk):
                     item.quantity = item.get_total_item_amount()
                     item.item_total = item.quantity * item.unit_price
                     
-                    item.save()
-                    
-                    # به‌روزرسانی تعداد آیتم‌های صورت جلسه
-                    session.items_count = session.items.filter(is_active=True).count()
-                    session.save(update_fields=['items_count'])
+                    item.save()  # تعداد آیتم‌های صورت جلسه در save به‌روز می‌شود
                     
                     messages.success(request, 'آیتم با موفقیت اضافه شد')
                     return redirect('sooratvaziat:session_detail', project_pk=project.pk, pk=session.pk)
@@ -1117,8 +1030,8 @@ def edit_session_item(request, project_pk, session_pk, item_pk):
                     item.quantity = item.get_total_item_amount()
                     
                     # اگر unit_price وجود ندارد، از فهرست بها بگیر
-                    if not item.unit_price and item.pricelist_item:
-                        item.unit_price = item.pricelist_item.price
+                    if not item.unit_price and item.pricelist_item_id:
+                        item.unit_price = item._get_price_from_pricelist()
                     
                     item.item_total = item.quantity * item.unit_price
                     item.save()
@@ -1192,13 +1105,8 @@ def delete_session_item(request, project_pk, session_pk, item_pk):
             with transaction.atomic():
                 print(f"Deleting item: {item.pk} - {item.row_description}")
                 
-                item.is_active = False
-                item.modified_by = request.user
-                item.save()
-                
-                # به‌روزرسانی تعداد آیتم‌های صورت جلسه
-                session.items_count = session.items.filter(is_active=True).count()
-                session.save(update_fields=['items_count'])
+                # تعداد آیتم‌ها، تاریخچه، لاگ و مجموع‌ها در delete به‌روز می‌شوند
+                item.delete(user=request.user)
                 
                 print("Item deleted successfully")
                 messages.success(request, 'آیتم با موفقیت حذف شد')
@@ -1232,7 +1140,7 @@ def group_items_detail(request, project_pk, session_pk, pricelist_number):
         print(f"   تعداد آیتم‌های یافت شده: {group_items.count()}")
         
         # محاسبه جمع‌های گروه
-        total_quantity = sum(item.get_total_item_amount() for item in group_items)
+        total_quantity = group_items.quantity_totals()['total_quantity']
         
         context = {
             'group_items': group_items,
@@ -1261,11 +1169,10 @@ def delete_session_items_by_pricelist(request, project_pk, session_pk, pricelist
     session = get_object_or_404(MeasurementSession, pk=session_pk, project=project, is_active=True)
     
     if request.method == 'POST':
-        # حذف تمام آیتم‌های این گروه
-        deleted_count, _ = session.items.filter(
-            pricelist_item__row_number=pricelist_number,
-            is_active=True
-        ).update(is_active=False)
+        # حذف نرم تمام آیتم‌های این گروه با یک UPDATE و یک بار بازمحاسبه مجموع‌ها
+        deleted_count = session.items.filter(
+            pricelist_item__row_number=pricelist_number
+        ).soft_delete(user=request.user)
         
         messages.success(request, f'{deleted_count} آیتم از گروه {pricelist_number} حذف شد.')
         return redirect('sooratvaziat:session_detail', project_pk=project_pk, pk=session_pk)
@@ -1301,52 +1208,112 @@ def get_item_revisions(request, item_pk):
 def get_price_lists_by_discipline(request):
     """
     دریافت فهرست‌های بها بر اساس رشته (AJAX)
+    با ETag از بیشترین updated_at فهرست‌های بها؛ پاسخ بدون تغییر 304 است
     """
     discipline = request.GET.get('discipline')
     
-    print(f"🔍 درخواست AJAX برای رشته: {discipline}")
-    
-    if discipline:
-        try:
-            price_lists = PriceList.objects.filter(
-                discipline_choice=discipline,
-                is_active=True
-            ).values('id', 'discipline', 'year', 'discipline_choice')  # اضافه کردن discipline_choice
-            
-            price_lists_list = list(price_lists)
-            print(f"✅ یافت شد {len(price_lists_list)} فهرست بها برای رشته {discipline}")
-            
-            # لاگ جزئیات فهرست‌های بها
-            for pl in price_lists_list:
-                print(f"   - ID: {pl['id']}, نام: {pl['discipline']}, سال: {pl['year']}, رشته: {pl['discipline_choice']}")
-            
-            return JsonResponse(price_lists_list, safe=False)
-            
-        except Exception as e:
-            print(f"❌ خطا در دریافت فهرست‌های بها: {e}")
-            return JsonResponse([], safe=False)
-    
-    print("⚠️ رشته مشخص نشده است")
-    return JsonResponse([], safe=False)
+    if not discipline:
+        logger.debug("⚠️ رشته مشخص نشده است")
+        return JsonResponse([], safe=False)
+
+    try:
+        price_lists = PriceList.objects.filter(
+            discipline_choice=discipline,
+            is_active=True
+        )
+        state = price_lists.aggregate(count=Count('id'), last_modified=Max('updated_at'))
+
+        def build():
+            price_lists_list = list(
+                price_lists.values('id', 'discipline', 'year', 'discipline_choice')  # اضافه کردن discipline_choice
+            )
+            logger.debug(f"✅ یافت شد {len(price_lists_list)} فهرست بها برای رشته {discipline}")
+            return price_lists_list
+
+        return conditional_json_response(
+            request,
+            ('price_lists', discipline),
+            make_etag('price_lists', discipline, state['count'], state['last_modified']),
+            build,
+            last_modified=state['last_modified'],
+        )
+
+    except Exception as e:
+        logger.error(f"❌ خطا در دریافت فهرست‌های بها: {e}")
+        return JsonResponse([], safe=False)
 
 # ویو برای AJAX - دریافت آیتم‌های فهرست بها
 @login_required
 def get_pricelist_items(request):
     """
     دریافت آیتم‌های یک فهرست بها (AJAX)
+    با ETag از بیشترین updated_at فهرست بها و آیتم‌های آن؛ پاسخ بدون تغییر 304 است
     """
-    price_list_id = request.GET.get('price_list_id')
+    price_list_id = request.GET.get('price_list_id', '')
     
-    if price_list_id:
-        items = PriceListItem.objects.filter(
+    if not price_list_id.isdigit():
+        return JsonResponse([], safe=False)
+
+    active_items = Q(items__is_active=True)
+    state = PriceList.objects.filter(pk=price_list_id).aggregate(
+        price_list_modified=Max('updated_at'),
+        items_modified=Max('items__updated_at', filter=active_items),
+        items_count=Count('items', filter=active_items),
+    )
+    modified = [value for value in (state['price_list_modified'], state['items_modified']) if value]
+
+    def build():
+        return list(PriceListItem.objects.filter(
             price_list_id=price_list_id,
             is_active=True
-        ).values('id', 'row_number', 'description', 'unit', 'price')
-        
-        items_list = list(items)
-        return JsonResponse(items_list, safe=False)
-    
-    return JsonResponse([], safe=False)
+        ).values('id', 'row_number', 'description', 'unit', 'price'))
+
+    return conditional_json_response(
+        request,
+        ('price_list_items', int(price_list_id)),
+        make_etag('price_list_items', price_list_id, state['items_count'],
+                  state['price_list_modified'], state['items_modified']),
+        build,
+        last_modified=max(modified) if modified else None,
+    )
+
+@login_required
+@require_http_methods(["GET"])
+def search_pricelist_items(request):
+    """
+    جستجوی آیتم‌های فهرست بها برای انتخابگر آیتم (AJAX)
+    پارامترها: price_list_id، q، page، page_size (حداکثر 100) و fuzzy=0 برای غیرفعال کردن تطبیق تقریبی
+    با ETag از نسخه کاتالوگ فهرست بها و پارامترهای جستجو؛ پاسخ بدون تغییر 304 است
+    """
+    price_list_id = request.GET.get('price_list_id', '')
+    if not price_list_id.isdigit():
+        return JsonResponse({'error': 'price_list_id نامعتبر است'}, status=400)
+
+    try:
+        page = int(request.GET.get('page', 1))
+        page_size = min(max(int(request.GET.get('page_size', 20)), 1), 100)
+    except ValueError:
+        return JsonResponse({'error': 'پارامتر صفحه‌بندی نامعتبر است'}, status=400)
+
+    query = request.GET.get('q', '')
+    fuzzy = request.GET.get('fuzzy') != '0'
+    version = catalog_version(price_list_id) or ''
+
+    def build():
+        data = search_items(price_list_id, query, page=page, page_size=page_size, fuzzy=fuzzy, version=version)
+        data['results'] = [
+            {**item, 'price': str(item['price'])}
+            for item in data['results']
+        ]
+        return data
+
+    # فقط آخرین جستجوی هر فهرست بها در LRU پاسخ‌ها می‌ماند (پارامترها در ETag هستند)
+    return conditional_json_response(
+        request,
+        ('price_list_search', int(price_list_id)),
+        make_etag('price_list_search', price_list_id, version, query, page, page_size, fuzzy),
+        build,
+    )
 
 @login_required
 def project_financial_report_list(request):
@@ -1375,22 +1342,16 @@ def project_financial_report_list(request):
             Q(description__icontains=search_query)
         )
     
-    # مرتب‌سازی
-    projects = projects.order_by('-created_at')
-    
-    # دریافت خلاصه‌های مالی از مدل ProjectFinancialSummary
-    project_ids = projects.values_list('id', flat=True)
-    financial_summaries = ProjectFinancialSummary.objects.filter(
-        project_id__in=project_ids
-    ).select_related('project')
+    # صفحه‌بندی keyset بر اساس (-created_at, -id)
+    page_obj = paginate_keyset(request, projects, 15)
     
-    # ایجاد مپ برای دسترسی سریع
-    financial_map = {summary.project_id: summary for summary in financial_summaries}
-    
-    # Pagination
-    paginator = Paginator(projects, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # خلاصه‌های مالی فقط برای پروژه‌های همین صفحه
+    financial_map = {
+        summary.project_id: summary
+        for summary in ProjectFinancialSummary.objects.filter(
+            project_id__in=[project.id for project in page_obj.object_list]
+        )
+    }
     
     # اضافه کردن اطلاعات مالی به پروژه‌ها
     for project in page_obj.object_list:
@@ -1456,8 +1417,6 @@ def calculate_project_financial_summary(project):
             is_active=True
         )
         
-        total_amount = Decimal('0.00')
-        total_with_vat = Decimal('0.00')
         sessions_count = MeasurementSession.objects.filter(
             project=project,
             is_active=True
@@ -1469,26 +1428,11 @@ def calculate_project_financial_summary(project):
             status='approved'  # یا فیلد وضعیت تأیید
         ).count()
         
-        total_items_count = session_items.count()
-        
-        # محاسبه مبالغ
-        for item in session_items:
-            try:
-                qty = Decimal(str(item.get_total_item_amount() or 0))
-                pl = item.pricelist_item
-                unit_price = Decimal('0')
-                for cand in ('price', 'unit_price', 'rate', 'baha'):
-                    if hasattr(pl, cand):
-                        val = getattr(pl, cand)
-                        if val is not None:
-                            unit_price = Decimal(str(val))
-                            break
-                item_total = qty * unit_price
-                total_amount += item_total
-                # اگر VAT داریم محاسبه شود
-                total_with_vat += item_total  # اینجا می‌توان VAT را اضافه کرد
-            except Exception as e:
-                continue
+        # تعداد و مبالغ با یک پرس‌وجو (مقدار × قیمت فهرست بها در پایگاه داده)
+        totals = session_items.quantity_totals()
+        total_items_count = totals['items_count']
+        total_amount = totals['total_amount']
+        total_with_vat = total_amount  # اینجا می‌توان VAT را اضافه کرد
         
         # محاسبه درصد پیشرفت
         progress_percentage = Decimal('0.00')
@@ -1660,227 +1604,98 @@ def project_financial_report(request, pk):
     # فقط پروژه‌های کاربر جاری
     project = get_project_with_access(request.user, pk)
     
-    disciplines_dict = {choice.value: choice.label for choice in DisciplineChoices}    
-    
-    # تبدیل تاریخ قرارداد به شمسی
-    if project.contract_date:
-        gregorian_date = project.contract_date
-        jalali_date = jdatetime.date.fromgregorian(
-            year=gregorian_date.year,
-            month=gregorian_date.month,
-            day=gregorian_date.day
-        )
-        contract_date_jalali = jalali_date.strftime("%Y/%m/%d")
-    else:
-        contract_date_jalali = "تعیین نشده"
-    
-    # استخراج رشته‌های منحصر به فرد از آیتم‌های موجود برای پروژه جاری
-    disciplines_qs = MeasurementSessionItem.objects.filter(
-        measurement_session_number__project=project,
-        is_active=True
-    ).values_list('pricelist_item__price_list__discipline_choice', flat=True).distinct()
-    
-    data_by_discipline = {}
-    grand_total_quantity = Decimal('0')
-    grand_total_amount = Decimal('0')
-    total_items_count = 0
-    
-    for discipline in disciplines_qs:
-        # فیلتر آیتم‌ها بر اساس رشته و پروژه جاری
-        qs = MeasurementSessionItem.objects.filter(
-            measurement_session_number__project=project,
-            pricelist_item__price_list__discipline_choice=discipline,
-            is_active=True
-        ).select_related(
-            'pricelist_item',
-            'pricelist_item__price_list',
-            'measurement_session_number'
-        ).order_by('pricelist_item__row_number', 'id')
-        
-        rows = OrderedDict()
-        for item in qs:
-            pl = item.pricelist_item
-            key = getattr(pl, 'row_number', None) or f"_id_{pl.pk}"
-            if key not in rows:
-                rows[key] = {
-                    'pricelist_item': pl,
-                    'row_number': getattr(pl, 'row_number', ''),
-                    'unit': getattr(pl, 'unit', '') or '',
-                    'total_qty': Decimal('0'),
-                    'unit_price': Decimal('0'),
-                    'line_total': Decimal('0'),
-                }
-            # تبدیل qty به Decimal
-            qty = _to_decimal(item.get_total_item_amount(), places=0)
-            rows[key]['total_qty'] += qty
-        
-        # محاسبه قیمت و جمع‌ها
-        total_quantity = Decimal('0')
-        total_amount = Decimal('0')
-        items_count = len(rows)
-        
-        for r in rows.values():
-            pl = r['pricelist_item']
-            unit_price = Decimal('0')
-            for cand in ('price', 'unit_price', 'rate', 'baha'):
-                val = getattr(pl, cand, None)
-                if val is not None:
-                    unit_price = _to_decimal(val, places=0)
-                    break
-            r['unit_price'] = unit_price
-            r['line_total'] = (r['total_qty'] * unit_price).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
-            total_amount += r['line_total']
-            total_quantity += r['total_qty']
-            r['formatted_total_qty'] = format_number_int(r['total_qty'])
-            r['formatted_unit_price'] = format_number_int(r['unit_price'])
-            r['formatted_line_total'] = format_number_int(r['line_total'])
-        
-        # شماره‌گذاری فصل‌ها
-        chapter_counters = defaultdict(int)
-        numbered_rows = []
-        prev_chapter = None
-        for r in rows.values():
-            rn = str(r['row_number'])
-            chapter = rn[:2] if len(rn) >= 2 else "00"
-            chapter_counters[chapter] += 1
-            display_number = f"{chapter}-{chapter_counters[chapter]}"
-            r['display_number'] = display_number
-            r['chapter'] = chapter
-            r['is_new_chapter'] = (chapter != prev_chapter)
-            prev_chapter = chapter
-            numbered_rows.append(r)
-        
-        if numbered_rows:
-            # فقط صورت جلسات مربوط به این پروژه و رشته
-            sessions = MeasurementSession.objects.filter(
-                project=project,
-                items__pricelist_item__price_list__discipline_choice=discipline,
-                items__is_active=True
-            ).distinct()
-            
-            data_by_discipline[discipline] = {
-                'label': disciplines_dict.get(discipline, 'نامشخص'),
-                'year': project.execution_year,
-                'rows': numbered_rows,
-                'total_quantity': total_quantity,
-                'total_amount': total_amount,
-                'items_count': items_count,
-                'formatted_total_quantity': format_number_int(total_quantity),
-                'formatted_total_amount': format_number_int(total_amount),
-                'sessions': sessions,  # فقط صورت جلسات مرتبط با این پروژه و رشته
-            }
-            
-            total_items_count += items_count
-        
-        grand_total_quantity += total_quantity
-        grand_total_amount += total_amount
-    
-    grand_total_quantity = grand_total_quantity.quantize(Decimal('1'), rounding=ROUND_HALF_UP)
-    grand_total_amount = grand_total_amount.quantize(Decimal('1'), rounding=ROUND_HALF_UP)
-    
-    # خروجی‌ها - اضافه کردن pk به پارامترها
+    # خروجی‌ها (مسیر همزمان؛ برای گزارش‌های حجیم از export_job_create استفاده می‌شود)
+    # فایل‌ها از کش دیسکی خوانده می‌شوند و فقط در صورت تغییر داده‌ها دوباره ساخته می‌شوند
     export = request.GET.get('export')
     if export == 'xlsx':
-        return generate_excel_report(project, data_by_discipline, grand_total_quantity, grand_total_amount)
+        return generate_excel_report(project)
     elif export == 'pdf':
-        return generate_pdf_report(request, project, data_by_discipline, grand_total_quantity, grand_total_amount)
+        return generate_pdf_report(request, project)
+    
+    report = build_financial_report_data(project)
+    data_by_discipline = report['data_by_discipline']
+    grand_total_quantity = report['grand_total_quantity']
+    grand_total_amount = report['grand_total_amount']
     
     context = {
         'project': project,
-        'contract_date_jalali': contract_date_jalali,
+        'contract_date_jalali': report['contract_date_jalali'],
         'data_by_discipline': data_by_discipline,
         'grand_total_quantity': grand_total_quantity,
         'grand_total_amount': grand_total_amount,
-        'total_items_count': total_items_count,
+        'total_items_count': report['total_items_count'],
         'formatted_grand_total_quantity': format_number_int(grand_total_quantity),
         'formatted_grand_total_amount': format_number_int(grand_total_amount),
     }
     return render(request, 'sooratvaziat/project_financial_report.html', context)
 
 # تابع برای تولید Excel
-def generate_excel_report(project, data_by_discipline, grand_total_quantity, grand_total_amount):
-    wb = Workbook()
-    # شیت کلی
-    ws_summary = wb.active
-    ws_summary.title = "خلاصه پروژه"
-    ws_summary.append(['پروژه', project.project_name])
-    ws_summary.append(['کد پروژه', project.project_code])
-    ws_summary.append([''])
-    ws_summary.append(['دیسیپلین', 'سال', 'جمع مقدار', 'جمع مبلغ (ریال)'])
-    for disc, data in data_by_discipline.items():
-        ws_summary.append([data['label'], data['year'], data['total_quantity'], data['total_amount']])
-    ws_summary.append(['جمع کل', '', grand_total_quantity, grand_total_amount])
-    
-    # استایل شیت خلاصه
-    for row in ws_summary.iter_rows(min_row=1, max_row=ws_summary.max_row, min_col=1, max_col=4):
-        for cell in row:
-            cell.alignment = Alignment(horizontal='center')
-            cell.border = Border(left=Side('thin'), right=Side('thin'), top=Side('thin'), bottom=Side('thin'))
-    
-    # شیت برای هر دیسیپلین (ریز مالی)
-    for disc, data in data_by_discipline.items():
-        ws = wb.create_sheet(title=data['label'])
-        headers = ['ردیف', 'شماره آیتم', 'شرح', 'واحد', 'مقدار', 'قیمت واحد', 'مبلغ کل']
-        ws.append(headers)
-        for r in data['rows']:
-            ws.append([
-                r['display_number'],
-                r['row_number'],
-                r['pricelist_item'].description,
-                r['unit'],
-                r['total_qty'],
-                r['unit_price'],
-                r['line_total'],
-            ])
-        ws.append(['', '', '', '', 'جمع', '', data['total_amount']])
-        
-        # استایل
-        for col in range(1, len(headers) + 1):
-            ws.column_dimensions[get_column_letter(col)].width = 20
-        border = Border(left=Side('thin'), right=Side('thin'), top=Side('thin'), bottom=Side('thin'))
-        for row in ws.iter_rows(min_row=1, max_row=ws.max_row, min_col=1, max_col=len(headers)):
-            for cell in row:
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-                cell.border = border
-                if cell.row == 1:
-                    cell.font = Font(bold=True)
-    
-    # ذخیره و بازگشت
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="financial_report_{project.project_code}.xlsx"'
-    wb.save(response)
-    return response
+def generate_excel_report(project):
+    path = cached_financial_report(project, 'xlsx')
+    return FileResponse(
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=f"financial_report_{project.project_code}.xlsx",
+        content_type=XLSX_CONTENT_TYPE,
+    )
 
 # تابع برای تولید PDF (با xhtml2pdf؛ HTML رو به PDF تبدیل می‌کنه)
-def generate_pdf_report(request, project, data_by_discipline, grand_total_quantity, grand_total_amount):
-    # رندر HTML اول (از تمپلیت مشابه)
-    context = {
-        'project': project,
-        'data_by_discipline': data_by_discipline,
-        'grand_total_quantity': grand_total_quantity,
-        'grand_total_amount': grand_total_amount,
-        'formatted_grand_total_quantity': format_number_int(grand_total_quantity),
-        'formatted_grand_total_amount': format_number_int(grand_total_amount),
-    }
-  
-    # اضافه کردن request به render_to_string برای دسترسی به request.user در template
-    html = render_to_string('sooratvaziat/project_financial_report.html', context, request=request)
-  
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="financial_report_{project.project_code}.pdf"'
-  
-    # تبدیل HTML به PDF با xhtml2pdf
-    pisa_status = pisa.CreatePDF(
-        html.encode('utf-8'),  # مطمئن شوید HTML به UTF-8 انکود شده برای پشتیبانی پارسی
-        dest=response,
-        encoding='utf-8'  # برای پشتیبانی از کاراکترهای پارسی
+def generate_pdf_report(request, project):
+    try:
+        path = cached_financial_report(project, 'pdf')
+    except RuntimeError as e:
+        logger.error(f"خطا در تولید PDF گزارش مالی پروژه {project.pk}: {e}")
+        return HttpResponse(str(e), content_type='text/plain')
+    
+    return FileResponse(
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=f"financial_report_{project.project_code}.pdf",
+        content_type='application/pdf',
+    )
+
+# خروجی پس‌زمینه گزارش مالی
+@login_required
+@require_http_methods(["POST"])
+def export_job_create(request, pk):
+    """
+    ثبت درخواست خروجی گزارش مالی و بازگرداندن شناسه کار
+    رندر فایل در پردازه‌های پس‌زمینه انجام می‌شود و وضعیت با export_job_status پیگیری می‌شود.
+    """
+    project = get_project_with_access(request.user, pk)
+    
+    export_format = request.POST.get('format', ExportJob.FORMAT_XLSX)
+    if export_format not in dict(ExportJob.FORMAT_CHOICES):
+        return JsonResponse({'error': 'فرمت خروجی نامعتبر است'}, status=400)
+    
+    job = ExportJob.objects.create(
+        project=project,
+        requested_by=request.user,
+        export_format=export_format,
     )
-  
-    if pisa_status.err:
-        # می‌تونید لاگ کنید: import logging; logger = logging.getLogger(__name__); logger.error("PDF generation error")
-        return HttpResponse(f'خطا در تولید PDF: {pisa_status.err}', content_type='text/plain')
+    start_export_job(job)
+    logger.info(f"Export job {job.pk} ({export_format}) queued for project {project.pk} by {request.user}")
+    
+    return JsonResponse(job.as_status_dict(), status=202)
+
+@login_required
+def export_job_status(request, job_id):
+    """وضعیت و درصد پیشرفت کار خروجی (JSON برای polling)"""
+    job = get_object_or_404(ExportJob, pk=job_id, requested_by=request.user)
+    return JsonResponse(job.as_status_dict())
+
+@login_required
+def export_job_download(request, job_id):
+    """دانلود فایل آماده کار خروجی"""
+    job = get_object_or_404(ExportJob, pk=job_id, requested_by=request.user)
+    if job.status != ExportJob.STATUS_DONE or not job.file:
+        raise Http404("فایل خروجی آماده نیست")
     
-    return response
+    try:
+        handle = job.file.open('rb')
+    except FileNotFoundError:
+        raise Http404("فایل خروجی منقضی شده است")
+    return FileResponse(handle, as_attachment=True, filename=job.download_name)
 
 @login_required
 def search(request):